@@ -0,0 +1,27 @@
+"""Add semantic model to data sources
+
+Revision ID: 9c2f1e7a4b3d
+Revises: 4eb3d03ed491
+Create Date: 2026-10-19 09:12:31.418220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy import Text
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2f1e7a4b3d'
+down_revision: Union[str, None] = '4eb3d03ed491'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('data_sources', sa.Column('semantic_model', postgresql.JSONB(astext_type=Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('data_sources', 'semantic_model')
@@ -0,0 +1,27 @@
+"""Add progress to queries
+
+Revision ID: b71d3e5a9f20
+Revises: 9c2f1e7a4b3d
+Create Date: 2026-10-19 10:04:52.731904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy import Text
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71d3e5a9f20'
+down_revision: Union[str, None] = '9c2f1e7a4b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('queries', sa.Column('progress', postgresql.JSONB(astext_type=Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('queries', 'progress')
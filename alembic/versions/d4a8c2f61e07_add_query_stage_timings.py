@@ -0,0 +1,27 @@
+"""Add stage timings to queries
+
+Revision ID: d4a8c2f61e07
+Revises: b71d3e5a9f20
+Create Date: 2026-10-19 11:26:08.514377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy import Text
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c2f61e07'
+down_revision: Union[str, None] = 'b71d3e5a9f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('queries', sa.Column('stage_timings', postgresql.JSONB(astext_type=Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('queries', 'stage_timings')
@@ -0,0 +1,30 @@
+"""Add keyset pagination indexes
+
+Revision ID: e93b7d1f4c52
+Revises: d4a8c2f61e07
+Create Date: 2026-10-19 13:41:17.206835
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e93b7d1f4c52'
+down_revision: Union[str, None] = 'd4a8c2f61e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_queries_created_at_id', 'queries', ['created_at', 'id'], unique=False)
+    op.create_index('ix_data_sources_created_at_id', 'data_sources', ['created_at', 'id'], unique=False)
+    op.create_index('ix_alerts_created_at_id', 'alerts', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_alerts_created_at_id', table_name='alerts')
+    op.drop_index('ix_data_sources_created_at_id', table_name='data_sources')
+    op.drop_index('ix_queries_created_at_id', table_name='queries')
@@ -0,0 +1,25 @@
+"""Add insight cache staleness window to data sources
+
+Revision ID: f2c6a9d81b37
+Revises: e93b7d1f4c52
+Create Date: 2026-10-19 16:05:48.913402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6a9d81b37'
+down_revision: Union[str, None] = 'e93b7d1f4c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('data_sources', sa.Column('cache_stale_seconds', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('data_sources', 'cache_stale_seconds')
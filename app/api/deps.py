@@ -0,0 +1,120 @@
+"""
+Cached providers for service objects used by the API.
+
+Services are built on first request rather than at import time, so the API
+starts without importing pandas, the LLM SDKs or plotly. Each provider
+returns one shared instance per process; endpoints take them through
+Depends() and tests can swap them with app.dependency_overrides.
+"""
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.services.analysis.narrative_generator import NarrativeGenerator
+    from app.services.analysis.pipeline import AnalysisPipeline
+    from app.services.analysis.query_processor import QueryProcessor
+    from app.services.analysis.stats_engine import StatsEngine
+    from app.services.data.executor import QueryExecutor
+    from app.services.data.sql_generator import SQLGenerator
+    from app.services.reporting.report_generator import ReportGenerator
+    from app.services.semantic.compiler import SemanticCompiler
+    from app.services.storage.insight_store import InsightStore
+    from app.services.storage.result_store import ResultStore
+    from app.services.visualization.chart_generator import ChartGenerator
+
+
+@lru_cache
+def get_query_processor() -> "QueryProcessor":
+    from app.services.analysis.query_processor import QueryProcessor
+    return QueryProcessor()
+
+
+@lru_cache
+def get_sql_generator() -> "SQLGenerator":
+    from app.services.data.sql_generator import SQLGenerator
+    return SQLGenerator()
+
+
+@lru_cache
+def get_query_executor() -> "QueryExecutor":
+    from app.services.data.executor import QueryExecutor
+    return QueryExecutor()
+
+
+@lru_cache
+def get_stats_engine() -> "StatsEngine":
+    from app.services.analysis.stats_engine import StatsEngine
+    return StatsEngine()
+
+
+@lru_cache
+def get_narrative_generator() -> "NarrativeGenerator":
+    from app.services.analysis.narrative_generator import NarrativeGenerator
+    return NarrativeGenerator()
+
+
+@lru_cache
+def get_semantic_compiler() -> "SemanticCompiler":
+    from app.services.semantic.compiler import SemanticCompiler
+    return SemanticCompiler()
+
+
+@lru_cache
+def get_result_store() -> "ResultStore":
+    from app.services.storage.result_store import ResultStore
+    return ResultStore()
+
+
+@lru_cache
+def get_insight_store() -> "InsightStore":
+    from app.services.storage.insight_store import InsightStore
+    return InsightStore()
+
+
+@lru_cache
+def get_chart_generator() -> "ChartGenerator":
+    from app.services.visualization.chart_generator import ChartGenerator
+    return ChartGenerator()
+
+
+@lru_cache
+def get_report_generator() -> "ReportGenerator":
+    from app.services.reporting.report_generator import ReportGenerator
+    return ReportGenerator()
+
+
+def build_pipeline(query_executor=None, background_refresh: bool = True) -> "AnalysisPipeline":
+    """
+    An analysis pipeline on the shared services.
+
+    Args:
+        query_executor: Optional executor replacing the shared one (e.g. a
+            per-batch SharedQueryExecutor)
+        background_refresh: Refresh stale insights in background tasks (only
+            where the event loop keeps running between requests)
+    """
+    from app.services.analysis.pipeline import AnalysisPipeline
+    return AnalysisPipeline(
+        query_processor=get_query_processor(),
+        sql_generator=get_sql_generator(),
+        query_executor=query_executor or get_query_executor(),
+        stats_engine=get_stats_engine(),
+        narrative_generator=get_narrative_generator(),
+        semantic_compiler=get_semantic_compiler(),
+        chart_generator=get_chart_generator(),
+        result_store=get_result_store(),
+        insight_store=get_insight_store(),
+        background_refresh=background_refresh
+    )
+
+
+@lru_cache
+def get_pipeline() -> "AnalysisPipeline":
+    return build_pipeline()
+
+
+@lru_cache
+def get_worker_pipeline() -> "AnalysisPipeline":
+    """Pipeline for Celery tasks, whose event loop only runs while a task does."""
+    return build_pipeline(background_refresh=False)
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, Query as QueryParam
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from app.api.deps import get_insight_store
+from app.models.database import get_db
+from app.models.query import Query
+from app.services.llm.router import route_stats
+from app.services.analysis.intent_classifier import intent_stats
+
+router = APIRouter()
+
+# Operational endpoints. In a real app, these should be restricted to admins.
+
+@router.get("/llm/routes")
+def get_llm_route_stats() -> Dict[str, Any]:
+    """Per-route, per-tier call counts, success rates and latencies for this worker."""
+    return route_stats.snapshot()
+
+@router.get("/intent/fast-path")
+def get_intent_fast_path_stats() -> Dict[str, Any]:
+    """Rule-based intent classification hits and LLM fallback rate for this worker."""
+    return intent_stats.snapshot()
+
+@router.get("/insight-cache")
+def get_insight_cache_stats() -> Dict[str, Any]:
+    """Insight cache hit ratios per tier, memory tier usage and pending write-behind for this worker."""
+    return get_insight_store().snapshot()
+
+# Most recent queries considered by /stages
+STAGE_SAMPLE_LIMIT = 10000
+
+@router.get("/stages")
+def get_stage_latency_percentiles(
+    window_minutes: int = QueryParam(60, ge=1, le=7 * 24 * 60),
+    db: Session = Depends(get_db)
+) -> Dict[str, Any]:
+    """p50/p95/p99 analysis pipeline stage durations (ms) over the last `window_minutes`."""
+    since = datetime.utcnow() - timedelta(minutes=window_minutes)
+    rows = (
+        db.query(Query.stage_timings)
+        .filter(Query.created_at >= since, Query.stage_timings.isnot(None))
+        .order_by(Query.created_at.desc())
+        .limit(STAGE_SAMPLE_LIMIT)
+        .all()
+    )
+
+    import numpy as np
+
+    samples: Dict[str, list] = {}
+    for (timings,) in rows:
+        if not isinstance(timings, dict):
+            continue
+        for stage, ms in timings.items():
+            if isinstance(ms, (int, float)):
+                samples.setdefault(stage, []).append(ms)
+
+    return {
+        "window_minutes": window_minutes,
+        "queries": len(rows),
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99)),
+            }
+            for stage, values in samples.items()
+        }
+    }
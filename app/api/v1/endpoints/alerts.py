@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response, Query as QueryParam
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.models.database import get_db
 from app.models.alert import Alert, AlertType
 from app.models.alert_execution import ExecutionStatus
+from app.utils.pagination import NEXT_CURSOR_HEADER, keyset_paginate
 from pydantic import BaseModel, Field
 
 router = APIRouter()
@@ -46,8 +47,19 @@ def create_alert(alert_in: AlertCreate, db: Session = Depends(get_db)):
     return db_alert
 
 @router.get("/alerts", response_model=List[AlertResponse])
-def list_alerts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    alerts = db.query(Alert).offset(skip).limit(limit).all()
+def list_alerts(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = QueryParam(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    # Newest first; pass the X-Next-Cursor header back as `cursor` for the next page
+    try:
+        alerts, next_cursor = keyset_paginate(db.query(Alert), Alert, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return alerts
 
 @router.get("/alerts/{alert_id}", response_model=AlertResponse)
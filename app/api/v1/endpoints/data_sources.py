@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query as QueryParam
+from sqlalchemy.orm import Session, load_only
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel, Field
 import json
@@ -7,6 +7,8 @@ import json
 from app.models.database import get_db
 from app.models.data_source import DataSource, SourceType
 from app.utils.encryption import encrypt_credentials
+from app.utils.pagination import NEXT_CURSOR_HEADER, keyset_paginate
+from app.services.semantic.layer import SemanticLayer
 from app.models.user import User
 
 router = APIRouter()
@@ -18,6 +20,8 @@ class DataSourceCreate(BaseModel):
     source_type: SourceType
     connection_config: Dict[str, Any]  # Plaintext credentials from client
     refresh_schedule: Optional[str] = None
+    semantic_model: Optional[Dict[str, Any]] = None  # Declared metrics and dimensions
+    cache_stale_seconds: Optional[int] = Field(None, ge=0)  # Stale-while-revalidate window for cached insights
     user_id: str = "mock-user-id"  # Placeholder until auth
 
 class DataSourceUpdate(BaseModel):
@@ -26,6 +30,8 @@ class DataSourceUpdate(BaseModel):
     connection_config: Optional[Dict[str, Any]] = None
     is_active: Optional[bool] = None
     refresh_schedule: Optional[str] = None
+    semantic_model: Optional[Dict[str, Any]] = None
+    cache_stale_seconds: Optional[int] = Field(None, ge=0)
 
 class DataSourceResponse(BaseModel):
     id: str
@@ -35,6 +41,7 @@ class DataSourceResponse(BaseModel):
     is_active: bool
     last_connected_at: Optional[str]
     last_refreshed_at: Optional[str]
+    cache_stale_seconds: Optional[int] = None
     created_at: str
     
     # We deliberately exclude connection_config for security
@@ -57,6 +64,9 @@ def create_data_source(ds_in: DataSourceCreate, db: Session = Depends(get_db)):
     # The model expects JSONB. We'll store: {"encrypted": "base64_string"}
     encrypted_config_str = encrypt_credentials(ds_in.connection_config)
     stored_config = {"encrypted": encrypted_config_str}
+    
+    if ds_in.semantic_model is not None:
+        _validate_semantic_model(ds_in.semantic_model)
 
     db_ds = DataSource(
         name=ds_in.name,
@@ -64,6 +74,8 @@ def create_data_source(ds_in: DataSourceCreate, db: Session = Depends(get_db)):
         source_type=ds_in.source_type,
         connection_config=stored_config,
         refresh_schedule=ds_in.refresh_schedule,
+        semantic_model=ds_in.semantic_model,
+        cache_stale_seconds=ds_in.cache_stale_seconds,
         created_by=ds_in.user_id
     )
     
@@ -74,9 +86,28 @@ def create_data_source(ds_in: DataSourceCreate, db: Session = Depends(get_db)):
     return _format_response(db_ds)
 
 @router.get("/", response_model=List[DataSourceResponse])
-def list_data_sources(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """List all data sources."""
-    data_sources = db.query(DataSource).offset(skip).limit(limit).all()
+def list_data_sources(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = QueryParam(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    List data sources, newest first.
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page.
+    """
+    # Only the summary columns; schema, semantic model and credentials stay unloaded
+    query = db.query(DataSource).options(load_only(
+        DataSource.id, DataSource.name, DataSource.description, DataSource.source_type,
+        DataSource.is_active, DataSource.last_connected_at, DataSource.last_refreshed_at,
+        DataSource.cache_stale_seconds, DataSource.created_at
+    ))
+    try:
+        data_sources, next_cursor = keyset_paginate(query, DataSource, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [_format_response(ds) for ds in data_sources]
 
 @router.get("/{ds_id}", response_model=DataSourceResponse)
@@ -111,6 +142,13 @@ def update_data_source(ds_id: str, ds_in: DataSourceUpdate, db: Session = Depend
     if ds_in.refresh_schedule is not None:
         ds.refresh_schedule = ds_in.refresh_schedule
         
+    if ds_in.semantic_model is not None:
+        _validate_semantic_model(ds_in.semantic_model)
+        ds.semantic_model = ds_in.semantic_model
+        
+    if ds_in.cache_stale_seconds is not None:
+        ds.cache_stale_seconds = ds_in.cache_stale_seconds
+        
     if ds_in.connection_config:
         encrypted_config_str = encrypt_credentials(ds_in.connection_config)
         ds.connection_config = {"encrypted": encrypted_config_str}
@@ -139,5 +177,12 @@ def _format_response(ds: DataSource) -> DataSourceResponse:
         is_active=ds.is_active,
         last_connected_at=str(ds.last_connected_at) if ds.last_connected_at else None,
         last_refreshed_at=str(ds.last_refreshed_at) if ds.last_refreshed_at else None,
+        cache_stale_seconds=ds.cache_stale_seconds,
         created_at=str(ds.created_at)
     )
+
+def _validate_semantic_model(semantic_model: Dict[str, Any]) -> None:
+    try:
+        SemanticLayer.from_dict(semantic_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid semantic model: {e}")
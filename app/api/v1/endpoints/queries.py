@@ -1,189 +1,467 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Header, Request, Response, Query as QueryParam
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, load_only
+from typing import TYPE_CHECKING, List, Optional, Dict, Any
 from pydantic import BaseModel, Field
-import pandas as pd
+import asyncio
 import json
+import time
 import uuid
 
-from app.models.database import get_db
+from app.api.deps import build_pipeline, get_pipeline, get_query_executor, get_result_store
+from app.core.config import settings
+from app.models.database import get_db, get_async_db, AsyncSessionLocal
 from app.models.query import Query, QueryStatus
 from app.models.data_source import DataSource
-from app.services.analysis.query_processor import QueryProcessor
-from app.services.data.sql_generator import SQLGenerator
-from app.services.data.executor import QueryExecutor
-from app.services.analysis.stats_engine import StatsEngine
-from app.services.analysis.narrative_generator import NarrativeGenerator
+from app.utils.http_cache import conditional_response, query_cache_control
+from app.utils.pagination import NEXT_CURSOR_HEADER, keyset_paginate
+from app.utils.serialization import (
+    RESULT_FORMAT_COLUMNAR, RESULT_FORMAT_PATTERN, ArrowResponse, ORJSONResponse,
+    accepts_arrow, arrow_to_columnar, dumps, rows_to_arrow, rows_to_columnar
+)
+
+if TYPE_CHECKING:
+    from app.services.analysis.pipeline import AnalysisPipeline
+    from app.services.storage.result_store import ResultStore
 
 router = APIRouter()
 
-# Services
-query_processor = QueryProcessor()
-sql_generator = SQLGenerator()
-query_executor = QueryExecutor()
-stats_engine = StatsEngine()
-narrative_generator = NarrativeGenerator()
+# Largest page served by /{query_id}/results
+MAX_RESULTS_PAGE_SIZE = 1000
 
 # Pydantic Schemas
 class QueryRequest(BaseModel):
     natural_language_query: str
     data_source_id: str
+    asynchronous: bool = False  # Queue the pipeline and return 202 immediately
+    parent_query_id: Optional[str] = None  # Query this one refines (answered from its results when possible)
     user_id: str = "mock-user-id"  # Placeholder until auth is fully integrated
 
 class QueryResponse(BaseModel):
     query_id: str
     natural_language_query: str
     generated_sql: Optional[str]
-    results: Optional[List[Dict[str, Any]]]
+    results: Optional[List[Dict[str, Any]]]  # None when offloaded; page through results_url
     narrative: Optional[Dict[str, Any]]
     status: str
     execution_time_ms: Optional[int]
     error_message: Optional[str]
+    progress: Optional[Dict[str, Any]] = None
+    stage_timings: Optional[Dict[str, float]] = None
+    row_count: Optional[int] = None
+    results_url: Optional[str] = None
+    parent_query_id: Optional[str] = None
+
+class QuerySummary(BaseModel):
+    query_id: str
+    natural_language_query: str
+    intent: Optional[str]
+    status: str
+    execution_time_ms: Optional[int]
+    error_message: Optional[str]
+    created_at: str
+
+class BatchQueryItem(BaseModel):
+    natural_language_query: str
+    data_source_id: str
+
+class BatchQueryRequest(BaseModel):
+    queries: List[BatchQueryItem] = Field(..., min_length=1)
+    user_id: str = "mock-user-id"  # Placeholder until auth is fully integrated
+
+class BatchItemResult(BaseModel):
+    index: int  # Position in the request
+    query: Optional[QueryResponse] = None  # None if no query could be created
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchItemResult]
+    sql_executions: int  # Distinct SQL statements run for the batch
+
+class QueryResultsPage(BaseModel):
+    query_id: str
+    offset: int
+    limit: int
+    row_count: int
+    rows: List[Dict[str, Any]]
 
 # Endpoints
 
 @router.post("/analyze", response_model=QueryResponse)
-async def analyze_query(request: QueryRequest, db: Session = Depends(get_db)):
+async def analyze_query(
+    request: QueryRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+    pipeline: "AnalysisPipeline" = Depends(get_pipeline)
+):
     """
     Process a natural language query:
+    0. For follow-ups (parent_query_id set), refine the parent's result
+       locally when it covers the question, skipping steps 1-3 and the LLM
     1. Analyze intent
     2. Generate SQL
     3. Execute SQL
     4. Generate Statistics
     5. Generate Narrative
+    
+    With `asynchronous` set, the query is queued for a Celery worker and a
+    202 response with the PENDING query is returned right away. Poll
+    GET /queries/{id} or subscribe to GET /queries/{id}/events for completion.
     """
+    _validate_user_id(request.user_id)
+    
     # 1. Fetch Data Source
-    data_source = db.query(DataSource).filter(DataSource.id == request.data_source_id).first()
+    data_source = await _get_data_source(db, request.data_source_id)
     if not data_source:
         raise HTTPException(status_code=404, detail="Data source not found")
+    await _validate_parent_query(db, request.parent_query_id, data_source)
 
     # Create Query Record
+    db_query = await _create_query(db, request, data_source)
+
+    if request.asynchronous:
+        # Imported here so the API does not load the Celery app at startup
+        from app.tasks.analysis_tasks import run_analysis
+        run_analysis.delay(str(db_query.id))
+        response.status_code = 202
+        return _format_response(db_query)
+
+    try:
+        narrative = await pipeline.run(db, db_query, data_source)
+        return _format_response(db_query, narrative)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/analyze/stream")
+async def analyze_query_stream(
+    request: QueryRequest,
+    db: AsyncSession = Depends(get_async_db),
+    pipeline: "AnalysisPipeline" = Depends(get_pipeline)
+):
+    """
+    Streaming variant of /analyze. Emits a server-sent event as each stage
+    completes: query (id), intent, sql, data (first rows), stats, chart,
+    narrative, then complete. Disconnecting cancels the remaining stages.
+    """
+    _validate_user_id(request.user_id)
+    data_source = await _get_data_source(db, request.data_source_id)
+    if not data_source:
+        raise HTTPException(status_code=404, detail="Data source not found")
+    await _validate_parent_query(db, request.parent_query_id, data_source)
+
+    return StreamingResponse(
+        _stage_events(pipeline, request, data_source.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _stage_events(pipeline: "AnalysisPipeline", request: QueryRequest, data_source_id: uuid.UUID):
+    """Run the pipeline in its own session (the request session closes before streaming)."""
+    async with AsyncSessionLocal() as db:
+        data_source = await db.get(DataSource, data_source_id)
+        db_query = await _create_query(db, request, data_source)
+        yield _sse("query", {"query_id": str(db_query.id)})
+
+        try:
+            async for event in pipeline.stream(db, db_query, data_source, include_chart=True):
+                yield _sse(event.stage, event.data)
+        except Exception as e:
+            yield _sse("error", {"error_message": str(e)})
+
+        yield _sse("complete", {"query_id": str(db_query.id), "status": db_query.status.value})
+
+@router.post("/analyze/batch", response_model=BatchQueryResponse)
+async def analyze_batch(request: BatchQueryRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Analyze several questions in one request, against one or more data sources.
+
+    Each data source is loaded once for the batch, identical SQL is executed
+    once, and up to BATCH_MAX_CONCURRENCY questions run at a time. Results
+    come back in request order; a failed question is reported in its own
+    item without failing the batch.
+    """
+    _validate_user_id(request.user_id)
+    if len(request.queries) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_ITEMS} queries per batch")
+
+    data_sources = {}
+    for data_source_id in {item.data_source_id for item in request.queries}:
+        data_sources[data_source_id] = await _get_data_source(db, data_source_id)
+
+    from app.services.data.executor import SharedQueryExecutor
+    executor = SharedQueryExecutor(get_query_executor())
+    batch_pipeline = build_pipeline(query_executor=executor)
+    semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+    # Items run concurrently, so each gets its own session on the request's engine
+    session_factory = async_sessionmaker(db.bind, class_=AsyncSession, expire_on_commit=False)
+
+    async def run_item(index: int, item: BatchQueryItem) -> BatchItemResult:
+        data_source = data_sources.get(item.data_source_id)
+        if data_source is None:
+            return BatchItemResult(index=index, error="Data source not found")
+        async with semaphore, session_factory() as item_db:
+            item_request = QueryRequest(
+                natural_language_query=item.natural_language_query,
+                data_source_id=item.data_source_id,
+                user_id=request.user_id
+            )
+            db_query = await _create_query(item_db, item_request, data_source)
+            try:
+                narrative = await batch_pipeline.run(item_db, db_query, data_source)
+            except Exception as e:
+                return BatchItemResult(index=index, query=_format_response(db_query), error=str(e))
+            return BatchItemResult(index=index, query=_format_response(db_query, narrative))
+
+    results = await asyncio.gather(*(run_item(i, item) for i, item in enumerate(request.queries)))
+    return BatchQueryResponse(results=list(results), sql_executions=executor.executions)
+
+def _validate_user_id(user_id: str) -> None:
+    try:
+        uuid.UUID(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid user id")
+
+async def _validate_parent_query(db: AsyncSession, parent_query_id: Optional[str], data_source: DataSource) -> None:
+    if parent_query_id is None:
+        return
+    try:
+        parent = await db.get(Query, uuid.UUID(parent_query_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid parent query id")
+    if not parent:
+        raise HTTPException(status_code=404, detail="Parent query not found")
+    # Follow-ups refine the parent's rows, which only answer questions about the same source
+    if not parent.used_data_source(data_source.id):
+        raise HTTPException(status_code=400, detail="Parent query used a different data source")
+
+async def _get_data_source(db: AsyncSession, data_source_id: str) -> Optional[DataSource]:
+    try:
+        return await db.get(DataSource, uuid.UUID(str(data_source_id)))
+    except ValueError:
+        return None
+
+async def _create_query(db: AsyncSession, request: QueryRequest, data_source: DataSource) -> Query:
     db_query = Query(
-        user_id=request.user_id,
+        user_id=uuid.UUID(request.user_id),
         natural_language_query=request.natural_language_query,
         data_sources_used=[str(data_source.id)],
-        status=QueryStatus.PENDING
+        status=QueryStatus.PENDING,
+        parent_query_id=uuid.UUID(request.parent_query_id) if request.parent_query_id else None
     )
     db.add(db_query)
-    db.commit()
-    db.refresh(db_query)
+    await db.commit()
+    await db.refresh(db_query)
+    return db_query
 
+@router.get("/", response_model=List[QuerySummary])
+def list_queries(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = QueryParam(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    Query history, newest first, without results (fetch GET /queries/{id} for those).
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page.
+    """
+    query = db.query(Query).options(load_only(
+        Query.id, Query.natural_language_query, Query.intent, Query.status,
+        Query.execution_time_ms, Query.error_message, Query.created_at
+    ))
     try:
-        # 2. Analyze Intent
-        intent_result = await query_processor.analyze_query(request.natural_language_query)
-        db_query.intent = intent_result.intent
-        db_query.entities = {
-            "metrics": intent_result.metrics,
-            "dimensions": intent_result.dimensions,
-            "time_range": intent_result.time_range,
-            "filters": intent_result.filters
-        }
-
-        # 3. Generate SQL
-        # We need schema context. For now, let's assume we can get it from the data source.
-        # In a real app, we might cache this or fetch it dynamically.
-        # For this implementation, we'll assume the data source has a 'schema_metadata' field 
-        # or we fetch it. Since DataSource model doesn't strictly enforce schema storage,
-        # we might need to fetch it or use a placeholder if not present.
-        
-        schema_context = data_source.schema_metadata if data_source.schema_metadata else {}
-        if not schema_context:
-            # Fallback or error if no schema is known
-            # For now, let's proceed, assuming the LLM might hallucinate or fail gracefully
-            pass
-
-        sql_result = await sql_generator.generate_sql(request.natural_language_query, schema_context)
-        
-        if not sql_result.get("can_answer"):
-            db_query.status = QueryStatus.FAILED
-            db_query.error_message = sql_result.get("explanation", "Cannot answer query with available schema")
-            db.commit()
-            return _format_response(db_query)
-
-        generated_sql = sql_result["sql"]
-        db_query.generated_sql = generated_sql
-
-        # 4. Execute SQL
-        df = await query_executor.execute_query(generated_sql, data_source)
-        
-        # Convert DF to dict for JSON storage
-        results_dict = df.to_dict(orient="records")
-        db_query.results = results_dict
-        
-        # 5. Generate Stats & Narrative
-        # We need to determine the value column for stats. 
-        # Heuristic: use the first numeric column or the first column.
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        value_col = numeric_cols[0] if not numeric_cols.empty else df.columns[0]
-        
-        stats = stats_engine.calculate_summary_stats(df)
-        # Add specific analysis based on intent if needed
-        
-        narrative = await narrative_generator.generate_narrative(
-            user_query=request.natural_language_query,
-            df=df,
-            analysis_results=stats
+        queries, next_cursor = keyset_paginate(query, Query, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [
+        QuerySummary(
+            query_id=str(q.id),
+            natural_language_query=q.natural_language_query,
+            intent=q.intent,
+            status=q.status.value,
+            execution_time_ms=q.execution_time_ms,
+            error_message=q.error_message,
+            created_at=str(q.created_at)
         )
-        
-        # Store narrative in results or a separate field? 
-        # The Query model doesn't have a specific 'narrative' column, but 'results' is JSONB.
-        # We can wrap results.
-        # Actually, let's look at the Query model again. It has 'results'.
-        # We can store the narrative in the response but maybe not persist it structurally 
-        # unless we add a column or put it in results.
-        # Let's put it in a 'narrative' key within the results JSON for now, or just return it.
-        # Wait, the QueryResponse has a 'narrative' field.
-        # Let's update the DB results to include metadata.
-        
-        final_results = {
-            "data": results_dict,
-            "stats": stats,
-            "narrative": narrative
-        }
-        db_query.results = final_results
-        db_query.status = QueryStatus.COMPLETED
-        db.commit()
+        for q in queries
+    ]
 
-        return _format_response(db_query, narrative)
+@router.get("/{query_id}", response_model=QueryResponse)
+def get_query(
+    query_id: str,
+    request: Request,
+    format: str = QueryParam("rows", pattern=RESULT_FORMAT_PATTERN),
+    db: Session = Depends(get_db)
+):
+    """
+    Fetch a query. With format=columnar, inline results are returned as
+    {"columns", "row_count", "data"} (one value array per column).
 
-    except Exception as e:
-        db_query.status = QueryStatus.FAILED
-        db_query.error_message = str(e)
-        db.commit()
-        raise HTTPException(status_code=500, detail=str(e))
+    Responses carry a content-hash ETag; send it back in If-None-Match to get
+    a 304 while nothing has changed. Completed queries are marked immutable.
+    """
+    query = db.query(Query).filter(Query.id == query_id).first()
+    if not query:
+        raise HTTPException(status_code=404, detail="Query not found")
+    if format == RESULT_FORMAT_COLUMNAR:
+        # Rows skip Pydantic validation and are serialized column by column
+        payload = _format_response(query, include_results=False).model_dump()
+        rows = _inline_rows(query)
+        payload["results"] = rows_to_columnar(rows) if rows is not None else None
+        body = dumps(payload)
+    else:
+        body = _format_response(query).model_dump_json().encode()
+    return conditional_response(request, body, "application/json", query_cache_control(query.status))
 
-@router.get("/", response_model=List[QueryResponse])
-def list_queries(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
-    queries = db.query(Query).order_by(Query.created_at.desc()).offset(skip).limit(limit).all()
-    return [_format_response(q) for q in queries]
+@router.get("/{query_id}/events")
+async def query_events(query_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Server-sent events for a query: a 'progress' event whenever a stage
+    completes, then a final 'complete' event with the full query response.
+    """
+    try:
+        query = await db.get(Query, uuid.UUID(query_id))
+    except ValueError:
+        query = None
+    if not query:
+        raise HTTPException(status_code=404, detail="Query not found")
 
-@router.get("/{query_id}", response_model=QueryResponse)
-def get_query(query_id: str, db: Session = Depends(get_db)):
-    query = db.query(Query).filter(Query.id == query_id).first()
+    return StreamingResponse(
+        _progress_events(query.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _progress_events(query_id: uuid.UUID):
+    """Poll the query row and emit SSE messages until it leaves PENDING."""
+    async with AsyncSessionLocal() as db:
+        deadline = time.monotonic() + settings.QUERY_EVENTS_TIMEOUT_SECONDS
+        last_progress = None
+        while True:
+            query = await db.get(Query, query_id, populate_existing=True)
+            if query is None:
+                return
+            if query.progress and query.progress != last_progress:
+                last_progress = query.progress
+                yield _sse("progress", query.progress)
+            if query.status != QueryStatus.PENDING:
+                yield _sse("complete", _format_response(query).model_dump())
+                return
+            if time.monotonic() >= deadline:
+                yield _sse("timeout", {"query_id": str(query_id)})
+                return
+            # Release the connection while waiting
+            await db.rollback()
+            await asyncio.sleep(settings.QUERY_EVENTS_POLL_INTERVAL_SECONDS)
+
+@router.get("/{query_id}/results", response_model=QueryResultsPage)
+async def get_query_results(
+    query_id: str,
+    offset: int = QueryParam(0, ge=0),
+    limit: int = QueryParam(100, ge=1, le=MAX_RESULTS_PAGE_SIZE),
+    format: str = QueryParam("rows", pattern=RESULT_FORMAT_PATTERN),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+    result_store: "ResultStore" = Depends(get_result_store)
+):
+    """
+    Page through a query's result rows. Offloaded results are read from the
+    result store one row range at a time rather than loaded whole.
+
+    Response formats:
+    - default: QueryResultsPage with one dict per row
+    - format=columnar: the page metadata plus {"columns", "data"}, one value
+      array per column
+    - Accept: application/vnd.apache.arrow.stream: the page as an Arrow IPC
+      stream (row_count in the X-Row-Count header)
+    """
+    try:
+        query = await db.get(Query, uuid.UUID(query_id))
+    except ValueError:
+        query = None
     if not query:
         raise HTTPException(status_code=404, detail="Query not found")
-    return _format_response(query)
 
-def _format_response(query: Query, narrative: Optional[Dict] = None) -> QueryResponse:
+    want_arrow = accepts_arrow(accept)
+    columnar = want_arrow or format == RESULT_FORMAT_COLUMNAR
+    results = query.results
+    if isinstance(results, dict) and "data_ref" in results:
+        data_ref = results["data_ref"]
+        # Offloaded pages stay in Arrow form for the columnar formats
+        read = result_store.read_table if columnar else result_store.read_rows
+        try:
+            rows = await asyncio.to_thread(read, data_ref, offset, limit)
+        except FileNotFoundError:
+            raise HTTPException(status_code=410, detail="Stored results are no longer available")
+        row_count = data_ref["row_count"]
+    else:
+        all_rows = _inline_rows(query) or []
+        rows = all_rows[offset:offset + limit]
+        row_count = len(all_rows)
+
+    if want_arrow:
+        # Offloaded pages are already Arrow tables; inline pages are lists of dicts
+        table = rows_to_arrow(rows) if isinstance(rows, list) else rows
+        return ArrowResponse(table, headers={"X-Row-Count": str(row_count)})
+    if columnar:
+        page = rows_to_columnar(rows) if isinstance(rows, list) else arrow_to_columnar(rows)
+        return ORJSONResponse({
+            "query_id": str(query.id),
+            "offset": offset,
+            "limit": limit,
+            "row_count": row_count,
+            "columns": page["columns"],
+            "data": page["data"]
+        })
+    return QueryResultsPage(query_id=str(query.id), offset=offset, limit=limit, row_count=row_count, rows=rows)
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _inline_rows(query: Query) -> Optional[List[Dict[str, Any]]]:
+    """Result rows stored on the row itself, or None if there are none (or they were offloaded)."""
+    if isinstance(query.results, dict):
+        return query.results.get("data")
+    if isinstance(query.results, list):
+        return query.results
+    return None
+
+def _format_response(query: Query, narrative: Optional[Dict] = None, include_results: bool = True) -> QueryResponse:
     # Extract narrative from results if stored there
     narrative_data = narrative
     results_data = []
+    row_count = None
     
     if query.results:
-        if isinstance(query.results, dict) and "data" in query.results:
+        if isinstance(query.results, dict) and "data_ref" in query.results:
+            # Offloaded to the result store; rows are served by /{query_id}/results
+            results_data = None
+            row_count = query.results["data_ref"].get("row_count")
+            if not narrative_data:
+                narrative_data = query.results.get("narrative")
+        elif isinstance(query.results, dict) and "data" in query.results:
             results_data = query.results["data"]
+            row_count = len(results_data)
             if not narrative_data:
                 narrative_data = query.results.get("narrative")
         elif isinstance(query.results, list):
             results_data = query.results
+            row_count = len(results_data)
 
     return QueryResponse(
         query_id=str(query.id),
         natural_language_query=query.natural_language_query,
         generated_sql=query.generated_sql,
-        results=results_data,
+        results=results_data if include_results else None,
+        row_count=row_count,
+        results_url=f"{settings.API_V1_STR}/queries/{query.id}/results" if row_count is not None else None,
         narrative=narrative_data,
         status=query.status.value,
         execution_time_ms=query.execution_time_ms,
-        error_message=query.error_message
+        error_message=query.error_message,
+        progress=query.progress if isinstance(query.progress, dict) else None,
+        stage_timings=query.stage_timings if isinstance(query.stage_timings, dict) else None,
+        parent_query_id=str(query.parent_query_id) if query.parent_query_id else None
     )
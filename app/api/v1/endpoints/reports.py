@@ -1,16 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
 from fastapi.responses import HTMLResponse
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, List
 from pydantic import BaseModel
-from app.services.reporting.report_generator import ReportGenerator
-from app.services.visualization.chart_generator import ChartGenerator
+from app.api.deps import get_report_generator
 from app.models.database import get_db
+from app.utils.http_cache import conditional_response
 from sqlalchemy.orm import Session
 # In a real app, we'd import the actual Report model and schemas
 
+
+if TYPE_CHECKING:
+    from app.services.reporting.report_generator import ReportGenerator
+
 router = APIRouter()
-report_generator = ReportGenerator()
-chart_generator = ChartGenerator()
 
 class ReportRequest(BaseModel):
     title: str
@@ -43,10 +45,16 @@ async def generate_report(
     }
 
 @router.get("/{report_id}/render", response_class=HTMLResponse)
-async def render_report(report_id: str):
+async def render_report(
+    report_id: str,
+    request: Request,
+    report_generator: "ReportGenerator" = Depends(get_report_generator)
+):
     """
     Render a report as HTML.
     For demonstration, this returns a mock report.
+
+    The HTML carries a content-hash ETag; a matching If-None-Match gets a 304.
     """
     # Mock data
     sections = [
@@ -73,4 +81,4 @@ async def render_report(report_id: str):
         sections=sections
     )
     
-    return html_content
+    return conditional_response(request, html_content.encode(), "text/html; charset=utf-8")
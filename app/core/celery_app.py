@@ -4,7 +4,8 @@ from app.core.config import settings
 celery_app = Celery(
     "worker",
     broker=settings.CELERY_BROKER_URL,
-    backend=settings.CELERY_RESULT_BACKEND
+    backend=settings.CELERY_RESULT_BACKEND,
+    include=["app.tasks.monitoring_tasks", "app.tasks.analysis_tasks"]
 )
 
 celery_app.conf.update(
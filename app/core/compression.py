@@ -0,0 +1,36 @@
+"""
+Response compression.
+
+Gzip for responses above GZIP_MINIMUM_SIZE_BYTES. Server-sent event streams
+are left uncompressed: the gzip encoder buffers output, which would hold
+events back until the stream ends.
+"""
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+# Content types passed through untouched
+UNCOMPRESSED_MEDIA_TYPES = ("text/event-stream",)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that skips streaming media types."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _SelectiveGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+class _SelectiveGZipResponder(GZipResponder):
+
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith(UNCOMPRESSED_MEDIA_TYPES):
+                # Treated like an already-encoded body: forwarded as is
+                self.content_encoding_set = True
@@ -37,31 +37,95 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://localhost:6379/0"
     CACHE_TTL: int = 3600
     CACHE_TTL_SECONDS: int = 3600  # Default TTL for insight cache
+    INSIGHT_CACHE_ENABLED: bool = True  # Answer repeated analyze questions from insight_cache
+    INSIGHT_CACHE_MEMORY_MAX_BYTES: int = 64 * 1024 * 1024  # Per-worker LRU budget (serialized insight size)
+    INSIGHT_CACHE_MEMORY_MAX_ENTRIES: int = 1000
+    INSIGHT_CACHE_REDIS_ENABLED: bool = True  # Share insights between workers through REDIS_URL
+    INSIGHT_CACHE_REDIS_TIMEOUT_SECONDS: float = 0.1  # Redis calls slower than this skip the tier
+    INSIGHT_CACHE_REDIS_RETRY_SECONDS: float = 5.0  # How long to skip Redis after a failure
+    INSIGHT_CACHE_WRITE_BEHIND_SECONDS: float = 2.0  # API database write batching interval; 0 writes through
+    INSIGHT_CACHE_STALE_SECONDS: int = 300  # Expired insights served while one task refreshes them; per source via cache_stale_seconds
+    INSIGHT_CACHE_EARLY_REFRESH_BETA: float = 1.0  # Probabilistic refresh before expiry; higher is earlier, 0 disables
+    INSIGHT_CACHE_LOCK_SECONDS: float = 60.0  # Recompute lock lifetime, and the longest other requests wait on it
     
     # LLM Configuration
-    LLM_PROVIDER: str = "openai"  # openai or anthropic
+    LLM_PROVIDER: str = "openai"  # openai, anthropic or fake (local, for load testing)
+    LLM_ROUTING_ENABLED: bool = True  # Send simple work to the fast model tier
     
     # OpenAI
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4-turbo-preview"
+    OPENAI_FAST_MODEL: str = "gpt-3.5-turbo"
     OPENAI_MAX_TOKENS: int = 4096
     OPENAI_TEMPERATURE: float = 0.7
     
     # Anthropic
     ANTHROPIC_API_KEY: Optional[str] = None
     ANTHROPIC_MODEL: str = "claude-3-opus-20240229"
+    ANTHROPIC_FAST_MODEL: str = "claude-3-haiku-20240307"
     ANTHROPIC_MAX_TOKENS: int = 4096
+    ANTHROPIC_PROMPT_CACHING: bool = True  # Send cache_control hints for static prompts
+    
+    # Rule-based intent classification before the LLM
+    INTENT_FAST_PATH_ENABLED: bool = True
+    INTENT_FAST_PATH_MIN_CONFIDENCE: float = 0.9
+    
+    # Fake LLM (LLM_PROVIDER=fake)
+    FAKE_LLM_LATENCY_MS: float = 0.0  # Fixed latency per call
+    FAKE_LLM_JITTER_MS: float = 0.0  # Uniform random latency added per call
+    FAKE_LLM_TOKENS_PER_SECOND: float = 0.0  # Output throughput, 0 disables
+    FAKE_LLM_FAILURE_RATE: float = 0.0  # Probability of an injected failure
+    FAKE_LLM_FAILURE_MODE: str = "error"  # error or malformed
+    FAKE_LLM_SEED: int = 0
     
     # Celery
     CELERY_BROKER_URL: str = "redis://localhost:6379/1"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/2"
     
+    # Asynchronous analyze jobs
+    QUERY_EVENTS_POLL_INTERVAL_SECONDS: float = 1.0  # How often /queries/{id}/events checks the row
+    QUERY_EVENTS_TIMEOUT_SECONDS: int = 300  # Longest a completion subscription stays open
+    
+    # Batch analyze (/queries/analyze/batch)
+    BATCH_MAX_ITEMS: int = 30  # Questions accepted per request (fewer if a batch would overdraw a rate-limit bucket)
+    BATCH_MAX_CONCURRENCY: int = 5  # Questions analyzed at once (bounds concurrent LLM calls)
+    
+    # Startup warm-up (readiness is reported on /ready)
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT_SECONDS: float = 30.0  # Workers report ready after this even if warm-up is unfinished
+    WARMUP_MAX_DATA_SOURCES: int = 50  # Active data sources whose engines and schema prompts are prepared
+    WARMUP_LLM_CONNECTIONS: bool = True  # Open keep-alive connections to the configured LLM provider
+    
+    # Request profiling (pyinstrument), per request with the X-Profile-Token header
+    PROFILING_TOKEN: Optional[str] = None  # Admin secret that enables profiling; off when unset
+    PROFILING_OUTPUT_DIR: str = "./data/profiles"  # Saved flamegraphs and speedscope files
+    PROFILING_INTERVAL_SECONDS: float = 0.001  # Sampling interval
+    
+    # Analyze trace recording, replayed offline with python -m loadtest.replay
+    TRACE_RECORDING_ENABLED: bool = False  # Traces include prompts, schemas and data samples
+    TRACE_SAMPLE_RATE: float = 1.0  # Fraction of analyze runs recorded when enabled
+    TRACE_DIR: str = "./data/traces"
+    
+    # HTTP caching and compression
+    GZIP_MINIMUM_SIZE_BYTES: int = 1024  # Smaller responses are sent uncompressed
+    GZIP_COMPRESS_LEVEL: int = 6  # 1 (fastest) to 9 (smallest)
+    COMPLETED_QUERY_MAX_AGE_SECONDS: int = 86400  # Client cache lifetime for finished query responses
+    
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000"
     CORS_ALLOW_CREDENTIALS: bool = True
     
-    # Rate Limiting
-    RATE_LIMIT_PER_MINUTE: int = 100
+    # Rate Limiting (token buckets, refilled continuously)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "redis"  # redis (shared by all workers) or memory (per process)
+    RATE_LIMIT_PER_MINUTE: int = 100  # Tokens per client address (until requests are authenticated)
+    RATE_LIMIT_ANALYZE_PER_MINUTE: int = 60  # Tokens per client address for analyze and batch calls
+    RATE_LIMIT_SOURCE_PER_MINUTE: int = 300  # Tokens per data source, across all users
+    RATE_LIMIT_COST_READ: int = 1
+    RATE_LIMIT_COST_WRITE: int = 2
+    RATE_LIMIT_COST_ANALYZE: int = 5  # Per analyze call, and per question in a batch
+    RATE_LIMIT_REDIS_TIMEOUT_SECONDS: float = 0.1  # Redis calls slower than this fail open
+    RATE_LIMIT_REDIS_RETRY_SECONDS: float = 5.0  # How long to skip Redis after a failure
     
     # File Upload
     MAX_UPLOAD_SIZE_MB: int = 50
@@ -84,6 +148,15 @@ class Settings(BaseSettings):
     AWS_S3_BUCKET: Optional[str] = None
     AWS_REGION: str = "us-east-1"
     
+    # Result storage (large query results are kept out of Query.results)
+    RESULT_STORE_BACKEND: str = "local"  # local or s3
+    RESULT_STORE_PATH: str = "./data/results"
+    RESULT_STORE_S3_BUCKET: Optional[str] = None  # Defaults to AWS_S3_BUCKET
+    RESULT_STORE_S3_PREFIX: str = "query-results"
+    RESULT_STORE_S3_ENDPOINT_URL: Optional[str] = None  # S3-compatible endpoint (MinIO, LocalStack)
+    RESULT_OFFLOAD_THRESHOLD_BYTES: int = 1_000_000  # In-memory frame size; 0 disables offloading
+    RESULT_ROW_GROUP_SIZE: int = 10_000  # Parquet rows per group (smallest unit read per page)
+    
     @property
     def cors_origins_list(self) -> List[str]:
         """Get CORS origins as a list."""
@@ -0,0 +1,22 @@
+"""
+Prometheus metrics exported at /metrics.
+"""
+
+from prometheus_client import Histogram
+
+# Seconds; spans fast SQL execution up to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+analysis_stage_seconds = Histogram(
+    "analysis_stage_duration_seconds",
+    "Duration of each analysis pipeline stage",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+
+analysis_total_seconds = Histogram(
+    "analysis_duration_seconds",
+    "End-to-end analysis pipeline duration",
+    ["status"],
+    buckets=LATENCY_BUCKETS
+)
@@ -0,0 +1,135 @@
+"""
+On-demand profiling of single requests.
+
+A request carrying the admin profiling token is run under pyinstrument's
+sampling profiler. The token goes in the X-Profile-Token header or the
+profile_token query parameter. The rendered profile is written to
+PROFILING_OUTPUT_DIR, and its id is returned in the X-Profile-Id header.
+Profiles are pyinstrument's flamegraph HTML by default, or speedscope JSON
+when X-Profile-Format (or profile_format) is "speedscope".
+
+Requests without the token cost a header scan; pyinstrument is only
+imported when a profile is taken. Profiling is off unless PROFILING_TOKEN
+is set.
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+import time
+import uuid
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+PROFILE_FORMAT_HEADER = b"x-profile-format"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+FORMAT_HTML = "html"
+FORMAT_SPEEDSCOPE = "speedscope"
+FILE_EXTENSIONS = {FORMAT_HTML: "html", FORMAT_SPEEDSCOPE: "speedscope.json"}
+
+
+class ProfilingMiddleware:
+    """Profiles requests that present the admin profiling token."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.PROFILING_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        token, output_format = _profile_request(scope)
+        if token is None:
+            await self.app(scope, receive, send)
+            return
+        if not hmac.compare_digest(token.encode(), settings.PROFILING_TOKEN.encode()):
+            logger.warning(f"Ignoring invalid profiling token for {scope['path']}")
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("Profiling requested but pyinstrument is not installed")
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.lower().encode(), profile_id.encode())
+                ]
+            await send(message)
+
+        # async_mode="enabled" samples only this request's task, not other requests on the loop
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL_SECONDS, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            try:
+                path = await asyncio.to_thread(save_profile, profiler, profile_id, output_format)
+                logger.info(f"Profiled {scope['method']} {scope['path']} ({duration_ms:.0f}ms): {path}")
+            except Exception as e:
+                logger.error(f"Could not save profile {profile_id}: {e}")
+
+
+def save_profile(profiler, profile_id: str, output_format: str) -> str:
+    """
+    Render a stopped profiler and write it to PROFILING_OUTPUT_DIR.
+
+    Returns:
+        Path of the written file
+    """
+    if output_format == FORMAT_SPEEDSCOPE:
+        from pyinstrument.renderers import SpeedscopeRenderer
+        content = profiler.output(SpeedscopeRenderer())
+    else:
+        content = profiler.output_html()
+
+    os.makedirs(settings.PROFILING_OUTPUT_DIR, exist_ok=True)
+    path = profile_path(profile_id, output_format)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return path
+
+
+def profile_path(profile_id: str, output_format: str = FORMAT_HTML) -> str:
+    """Where a profile with this id and format is stored."""
+    return os.path.join(settings.PROFILING_OUTPUT_DIR, f"{profile_id}.{FILE_EXTENSIONS[output_format]}")
+
+
+def _profile_request(scope: Scope) -> Tuple[Optional[str], str]:
+    """The profiling token (None if absent) and the requested output format."""
+    token = None
+    output_format = FORMAT_HTML
+    for name, value in scope.get("headers", []):
+        if name == PROFILE_TOKEN_HEADER:
+            token = value.decode("latin-1")
+        elif name == PROFILE_FORMAT_HEADER:
+            output_format = value.decode("latin-1").strip().lower()
+
+    query_string = scope.get("query_string", b"")
+    if b"profile_" in query_string:
+        params = parse_qs(query_string.decode("latin-1"))
+        token = token or (params.get("profile_token") or [None])[0]
+        output_format = (params.get("profile_format") or [output_format])[0].lower()
+
+    if output_format not in FILE_EXTENSIONS:
+        output_format = FORMAT_HTML
+    return token, output_format
@@ -0,0 +1,381 @@
+"""
+Token-bucket rate limiting for the API.
+
+Every request takes tokens from a per-user bucket; analyze and batch calls
+also draw on a per-user analyze bucket and on a bucket per data source they
+touch, shared by all users. Costs depend on the endpoint class, so one
+analyze call weighs as much as several plain reads. A batch pays the analyze
+cost for every question in it, and each data source for every question
+aimed at it; a batch that would cost more than a full bucket is refused
+with 400 (see RateLimiter.max_batch_questions).
+
+Until requests are authenticated, "user" means client address: bearer
+tokens and body user ids are not verified, and a client could rotate them
+to get fresh buckets. Buckets live in Redis
+(updated atomically by a Lua script) so every worker shares them; an
+in-memory backend serves single-process deployments and tests.
+
+The limiter fails open: if Redis is unreachable, requests are let through
+and Redis is not retried for RATE_LIMIT_REDIS_RETRY_SECONDS.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Endpoint classes
+CLASS_READ = "read"
+CLASS_WRITE = "write"
+CLASS_ANALYZE = "analyze"
+CLASS_BATCH = "batch"
+
+# Atomically refill every bucket in KEYS and take its cost, or take from none.
+# ARGV: (capacity, refill per second, cost) for each key.
+# Returns {allowed, remaining of the tightest bucket, seconds until all can pay, its capacity}.
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = {}
+local allowed = 1
+local remaining = -1
+local limit = 0
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local cost = tonumber(ARGV[i * 3])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    level = math.min(capacity, level + math.max(0, now - ts) * rate)
+    tokens[i] = level
+    if level < cost then
+        allowed = 0
+        retry_after = math.max(retry_after, (cost - level) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 2])
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local level = tokens[i]
+    if allowed == 1 then
+        level = level - tonumber(ARGV[i * 3])
+    end
+    redis.call('HSET', key, 'tokens', level, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+    if remaining < 0 or level < remaining then
+        remaining = level
+        limit = capacity
+    end
+end
+return {allowed, tostring(remaining), tostring(retry_after), limit}
+"""
+
+
+@dataclass
+class Bucket:
+    """A token bucket: `capacity` tokens, refilled continuously over a minute, and what a request takes from it."""
+    key: str
+    capacity: int
+    cost: int
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / 60.0
+
+
+@dataclass
+class Decision:
+    """Outcome of taking tokens from a set of buckets."""
+    allowed: bool
+    limit: int
+    remaining: float
+    retry_after: float
+
+
+class TokenBucketBackend(ABC):
+    """Storage for bucket levels."""
+
+    @abstractmethod
+    async def take(self, buckets: List[Bucket]) -> Decision:
+        """Take each bucket's cost from it, or take from none if any is short."""
+        pass
+
+
+class MemoryTokenBucketBackend(TokenBucketBackend):
+    """Buckets kept in process memory (per worker)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def take(self, buckets: List[Bucket]) -> Decision:
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for bucket in buckets:
+                level, ts = self._buckets.get(bucket.key, (bucket.capacity, now))
+                levels.append(min(bucket.capacity, level + (now - ts) * bucket.refill_per_second))
+
+            short = [(b.cost - level) / b.refill_per_second for b, level in zip(buckets, levels) if level < b.cost]
+            allowed = not short
+            if allowed:
+                levels = [level - b.cost for b, level in zip(buckets, levels)]
+            for bucket, level in zip(buckets, levels):
+                self._buckets[bucket.key] = (level, now)
+
+        tightest = min(range(len(buckets)), key=lambda i: levels[i])
+        return Decision(
+            allowed=allowed,
+            limit=buckets[tightest].capacity,
+            remaining=levels[tightest],
+            retry_after=max(short, default=0.0)
+        )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RedisTokenBucketBackend(TokenBucketBackend):
+    """Buckets shared by every worker through Redis."""
+
+    def __init__(self, url: Optional[str] = None, client: Optional[Any] = None):
+        self.url = url or settings.REDIS_URL
+        self._client = client
+        self._script = None
+
+    async def take(self, buckets: List[Bucket]) -> Decision:
+        if self._script is None:
+            if self._client is None:
+                import redis.asyncio as redis
+                timeout = settings.RATE_LIMIT_REDIS_TIMEOUT_SECONDS
+                self._client = redis.from_url(self.url, socket_timeout=timeout, socket_connect_timeout=timeout)
+            self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+        args: List[Any] = []
+        for bucket in buckets:
+            args.extend([bucket.capacity, bucket.refill_per_second, bucket.cost])
+        allowed, remaining, retry_after, limit = await self._script(keys=[b.key for b in buckets], args=args)
+        return Decision(
+            allowed=bool(int(allowed)),
+            limit=int(limit),
+            remaining=float(remaining),
+            retry_after=float(retry_after)
+        )
+
+
+class RateLimiter:
+    """Chooses buckets and costs for a request and consults the backend."""
+
+    def __init__(self, backend: Optional[TokenBucketBackend] = None):
+        self._backend = backend
+        self._disabled_until = 0.0
+
+    @property
+    def backend(self) -> TokenBucketBackend:
+        if self._backend is None:
+            if settings.RATE_LIMIT_BACKEND == "memory":
+                self._backend = MemoryTokenBucketBackend()
+            else:
+                self._backend = RedisTokenBucketBackend()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend: TokenBucketBackend) -> None:
+        self._backend = backend
+        self._disabled_until = 0.0
+
+    @staticmethod
+    def cost(endpoint_class: str, questions: int = 1) -> int:
+        """Tokens a request takes; batches pay the analyze cost per question."""
+        if endpoint_class == CLASS_BATCH:
+            return settings.RATE_LIMIT_COST_ANALYZE * questions
+        return {
+            CLASS_READ: settings.RATE_LIMIT_COST_READ,
+            CLASS_WRITE: settings.RATE_LIMIT_COST_WRITE,
+            CLASS_ANALYZE: settings.RATE_LIMIT_COST_ANALYZE
+        }[endpoint_class]
+
+    @classmethod
+    def max_batch_questions(cls) -> int:
+        """Most questions a batch may ask: its cost must fit in every bucket it draws from."""
+        capacity = min(
+            settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_ANALYZE_PER_MINUTE, settings.RATE_LIMIT_SOURCE_PER_MINUTE
+        )
+        return capacity // cls.cost(CLASS_ANALYZE)
+
+    @classmethod
+    def buckets(cls, identity: str, endpoint_class: str, data_source_ids: List[str]) -> List[Bucket]:
+        """
+        Buckets a request draws from, with what it takes from each.
+
+        Args:
+            identity: Client identity (see _identity)
+            endpoint_class: Class from classify()
+            data_source_ids: Data source of each question in the request
+        """
+        cost = cls.cost(endpoint_class, max(1, len(data_source_ids)))
+        buckets = [Bucket(f"ratelimit:user:{identity}", settings.RATE_LIMIT_PER_MINUTE, cost)]
+        if endpoint_class in (CLASS_ANALYZE, CLASS_BATCH):
+            buckets.append(Bucket(f"ratelimit:analyze:{identity}", settings.RATE_LIMIT_ANALYZE_PER_MINUTE, cost))
+        for data_source_id, count in sorted(Counter(data_source_ids).items()):
+            buckets.append(Bucket(
+                f"ratelimit:source:{data_source_id}", settings.RATE_LIMIT_SOURCE_PER_MINUTE,
+                settings.RATE_LIMIT_COST_ANALYZE * count
+            ))
+        return buckets
+
+    async def check(self, identity: str, endpoint_class: str, data_source_ids: List[str]) -> Optional[Decision]:
+        """
+        Take tokens for a request.
+
+        Returns:
+            The decision, or None if the backend is unavailable (fail open)
+        """
+        if time.monotonic() < self._disabled_until:
+            return None
+        try:
+            return await self.backend.take(self.buckets(identity, endpoint_class, data_source_ids))
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, allowing requests: {e}")
+            self._disabled_until = time.monotonic() + settings.RATE_LIMIT_REDIS_RETRY_SECONDS
+            return None
+
+
+# Process-wide limiter used by the middleware
+rate_limiter = RateLimiter()
+
+
+class RateLimitMiddleware:
+    """
+    Enforces rate limits on API routes (health checks and /metrics are not limited).
+
+    Responses carry X-RateLimit-Limit and X-RateLimit-Remaining for the
+    tightest bucket; rejected requests get 429 with Retry-After. Batches
+    too large for any bucket to pay for get 400.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter or rate_limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not settings.RATE_LIMIT_ENABLED
+            or not scope["path"].startswith(settings.API_V1_STR)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        endpoint_class = classify(scope["method"], scope["path"])
+        body: Dict[str, Any] = {}
+        if endpoint_class in (CLASS_ANALYZE, CLASS_BATCH):
+            # Data sources are in the JSON body; buffer it and replay it to the app
+            receive, body = await _buffer_json_body(receive)
+
+        data_source_ids = _data_source_ids(body)
+        if endpoint_class == CLASS_BATCH:
+            max_questions = self.limiter.max_batch_questions()
+            if len(data_source_ids) > max_questions:
+                response = JSONResponse({"detail": f"At most {max_questions} queries per batch"}, status_code=400)
+                await response(scope, receive, send)
+                return
+
+        identity = _identity(scope)
+        decision = await self.limiter.check(identity, endpoint_class, data_source_ids)
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            "X-RateLimit-Limit": str(decision.limit),
+            "X-RateLimit-Remaining": str(max(0, math.floor(decision.remaining)))
+        }
+        if not decision.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(decision.retry_after)))
+            response = JSONResponse({"detail": "Rate limit exceeded"}, status_code=429, headers=headers)
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (name.lower().encode(), value.encode()) for name, value in headers.items()
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+def classify(method: str, path: str) -> str:
+    """Endpoint class of a request."""
+    if method == "POST" and path.endswith("/queries/analyze/batch"):
+        return CLASS_BATCH
+    if method == "POST" and (path.endswith("/queries/analyze") or path.endswith("/queries/analyze/stream")):
+        return CLASS_ANALYZE
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return CLASS_READ
+    return CLASS_WRITE
+
+
+def _identity(scope: Scope) -> str:
+    """
+    The client address.
+
+    Bearer tokens and body user ids are not verified yet, so they are not
+    used: a client could send a new one per request for a fresh bucket.
+    """
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def _data_source_ids(body: Dict[str, Any]) -> List[str]:
+    """Data sources an analyze or batch request queries."""
+    ids = []
+    if isinstance(body.get("data_source_id"), str):
+        ids.append(body["data_source_id"])
+    for item in body.get("queries") or []:
+        if isinstance(item, dict) and isinstance(item.get("data_source_id"), str):
+            ids.append(item["data_source_id"])
+    return ids
+
+
+async def _buffer_json_body(receive: Receive) -> Tuple[Receive, Dict[str, Any]]:
+    """Read the whole request body; return a receive that replays it, and the parsed JSON."""
+    messages = []
+    chunks = []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+
+    async def replay() -> Message:
+        if messages:
+            return messages.pop(0)
+        # Later calls (e.g. disconnect detection while streaming) go to the server
+        return await receive()
+
+    try:
+        body = json.loads(b"".join(chunks) or b"{}")
+    except ValueError:
+        body = {}
+    return replay, body if isinstance(body, dict) else {}
@@ -0,0 +1,192 @@
+"""
+Opt-in recording of analyze runs for offline replay.
+
+With TRACE_RECORDING_ENABLED, a sampled fraction (TRACE_SAMPLE_RATE) of
+pipeline runs are recorded as traces. Each trace holds:
+
+- every LLM call, with its prompts, response and latency
+- the generated SQL
+- the result schema and size
+- the stage timings
+
+Traces are appended as JSON lines to a per-process file in TRACE_DIR.
+`python -m loadtest.replay` re-runs them offline against the recorded
+responses and a synthetic dataset of the same shape.
+
+Traces contain prompts, and prompts contain schemas and data samples. Only
+enable recording where those may be written to disk.
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar, Token
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACE_FORMAT_VERSION = 1
+
+_current_trace: ContextVar[Optional["AnalysisTrace"]] = ContextVar("analysis_trace", default=None)
+
+
+class AnalysisTrace:
+    """Everything needed to replay one analyze run."""
+
+    def __init__(self, question: str, data_source: Any):
+        self.trace_id = uuid.uuid4().hex
+        self.recorded_at = datetime.utcnow().isoformat()
+        self.question = question
+        self.data_source = {
+            "id": str(data_source.id),
+            "source_type": getattr(data_source.source_type, "value", data_source.source_type),
+            "schema_version": data_source.schema_version,
+            "schema_metadata": data_source.schema_metadata,
+            "semantic_model": data_source.semantic_model
+        }
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.sql: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.stage_timings: Dict[str, Any] = {}
+        self.status: Optional[str] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._token: Optional[Token] = None
+
+    def record_llm_call(
+        self,
+        route: str,
+        tier: str,
+        method: str,
+        request: Dict[str, Any],
+        response: Any = None,
+        latency_ms: float = 0.0,
+        error: Optional[BaseException] = None
+    ) -> None:
+        """Record one provider call made by the router."""
+        call = {
+            "route": route,
+            "tier": tier,
+            "method": method,
+            "request": {k: v for k, v in request.items() if v is not None},
+            "response": response,
+            "latency_ms": round(latency_ms, 2)
+        }
+        if error is not None:
+            call["error"] = {"type": type(error).__name__, "message": str(error)}
+        with self._lock:
+            self.llm_calls.append(call)
+
+    def record_result(self, sql: Optional[str], df) -> None:
+        """Record the executed SQL and the shape of its result."""
+        self.sql = sql
+        self.result = {
+            "row_count": len(df),
+            "memory_bytes": int(df.memory_usage(deep=True).sum()),
+            "columns": [
+                {
+                    "name": str(name),
+                    "dtype": str(df[name].dtype),
+                    "null_count": int(df[name].isna().sum()),
+                    "unique_count": int(df[name].nunique())
+                }
+                for name in df.columns
+            ]
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": TRACE_FORMAT_VERSION,
+            "trace_id": self.trace_id,
+            "recorded_at": self.recorded_at,
+            "question": self.question,
+            "data_source": self.data_source,
+            "llm_calls": self.llm_calls,
+            "sql": self.sql,
+            "result": self.result,
+            "stage_timings": self.stage_timings,
+            "status": self.status,
+            "error": self.error
+        }
+
+
+class TraceRecorder:
+    """Samples pipeline runs and appends finished traces to TRACE_DIR."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def start(self, db_query: Any, data_source: Any) -> Optional[AnalysisTrace]:
+        """
+        Begin recording a run if recording is on and the run is sampled.
+
+        The trace becomes the current trace for this task and the tasks it
+        starts. Pass it to finish() when the run ends.
+
+        Returns:
+            The trace, or None when this run is not recorded
+        """
+        if not settings.TRACE_RECORDING_ENABLED or random.random() >= settings.TRACE_SAMPLE_RATE:
+            return None
+        trace = AnalysisTrace(db_query.natural_language_query, data_source)
+        trace._token = _current_trace.set(trace)
+        return trace
+
+    def finish(self, trace: AnalysisTrace, db_query: Any, stage_timings: Dict[str, Any]) -> None:
+        """Stop recording and write the trace. Failures are logged, never raised."""
+        try:
+            _current_trace.reset(trace._token)
+        except ValueError:
+            # Finished from a different context than it started in (e.g. a closed stream)
+            _current_trace.set(None)
+        trace.stage_timings = stage_timings
+        trace.status = getattr(db_query.status, "value", db_query.status)
+        trace.error = db_query.error_message
+        try:
+            self.write(trace)
+        except Exception as e:
+            logger.error(f"Could not write analysis trace {trace.trace_id}: {e}")
+
+    def write(self, trace: AnalysisTrace) -> str:
+        """Append a trace to this process's trace file and return its path."""
+        os.makedirs(settings.TRACE_DIR, exist_ok=True)
+        path = trace_path()
+        line = json.dumps(trace.to_dict(), default=str)
+        with self._lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        return path
+
+
+def current_trace() -> Optional[AnalysisTrace]:
+    """The trace being recorded for the current run, if any."""
+    return _current_trace.get()
+
+
+def trace_path() -> str:
+    """This process's trace file for today; one file per process keeps appends whole."""
+    return os.path.join(settings.TRACE_DIR, f"traces-{time.strftime('%Y%m%d')}-{os.getpid()}.jsonl")
+
+
+def load_traces(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    """Read traces from JSON-lines files, or from every .jsonl file in a directory."""
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".jsonl"))
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+
+# Process-wide recorder used by the analysis pipeline
+trace_recorder = TraceRecorder()
@@ -0,0 +1,202 @@
+"""
+Startup warm-up and readiness.
+
+A freshly started worker pays for cold imports, engine and pool creation,
+credential decryption, Jinja template compilation, schema prompt formatting
+and TLS handshakes with the LLM provider. The application lifespan runs
+warm_up() in the background, before traffic arrives. /ready answers 503
+until it has finished, while /health stays a plain liveness check.
+
+Warm-up is best effort. A failing step is recorded and reported on /ready,
+but it does not keep the worker out of rotation. Readiness also flips once
+WARMUP_TIMEOUT_SECONDS have passed.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+STEP_OK = "ok"
+STEP_FAILED = "failed"
+
+
+@dataclass
+class WarmupStep:
+    """Outcome of one warm-up step."""
+    status: str
+    duration_ms: float
+    detail: Optional[str] = None
+
+
+class Readiness:
+    """Whether this worker has finished warming up, and how each step went."""
+
+    def __init__(self):
+        self.ready = False
+        self.steps: Dict[str, WarmupStep] = {}
+        self.duration_ms: Optional[float] = None
+
+    def record(self, name: str, status: str, duration_ms: float, detail: Optional[str] = None) -> None:
+        self.steps[name] = WarmupStep(status=status, duration_ms=round(duration_ms, 1), detail=detail)
+
+    def mark_ready(self, duration_ms: Optional[float] = None) -> None:
+        self.ready = True
+        self.duration_ms = None if duration_ms is None else round(duration_ms, 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "warmup_ms": self.duration_ms,
+            "steps": {name: asdict(step) for name, step in self.steps.items()}
+        }
+
+    def reset(self) -> None:
+        self.ready = False
+        self.steps.clear()
+        self.duration_ms = None
+
+
+# Process-wide readiness reported by /ready
+readiness = Readiness()
+
+
+async def warm_up(session_factory: Optional[Callable[[], Any]] = None) -> None:
+    """
+    Prepare this worker for traffic, then mark it ready.
+
+    Args:
+        session_factory: Async session factory for the metadata database
+            (defaults to AsyncSessionLocal)
+    """
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(_run_steps(session_factory), timeout=settings.WARMUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"Warm-up did not finish within {settings.WARMUP_TIMEOUT_SECONDS}s, reporting ready")
+    duration_ms = (time.perf_counter() - started) * 1000
+    readiness.mark_ready(duration_ms)
+    logger.info(f"Warm-up finished in {duration_ms:.0f}ms: {readiness.snapshot()['steps']}")
+
+
+async def _run_steps(session_factory: Optional[Callable[[], Any]]) -> None:
+    from app.api import deps
+
+    await _step("services", lambda: asyncio.to_thread(_build_services))
+    await _step("templates", lambda: asyncio.to_thread(
+        deps.get_report_generator().env.get_template, "report_base.html"
+    ))
+
+    data_sources = await _step("metadata_db", lambda: _load_data_sources(session_factory))
+    if data_sources:
+        await _step("schema_prompts", lambda: asyncio.to_thread(_cache_schema_prompts, data_sources))
+        await _step("engines", lambda: asyncio.to_thread(_connect_engines, data_sources))
+
+    if settings.WARMUP_LLM_CONNECTIONS:
+        await _step("llm", _open_llm_connections)
+
+
+async def _step(name: str, run: Callable[[], Any]) -> Any:
+    """Run one step, record its outcome and return its result (None on failure)."""
+    started = time.perf_counter()
+    try:
+        result = await run()
+    except Exception as e:
+        readiness.record(name, STEP_FAILED, (time.perf_counter() - started) * 1000, str(e))
+        logger.warning(f"Warm-up step {name} failed: {e}")
+        return None
+    detail = f"{len(result)} prepared" if isinstance(result, list) else None
+    readiness.record(name, STEP_OK, (time.perf_counter() - started) * 1000, detail)
+    return result
+
+
+def _build_services() -> None:
+    """Construct the shared services and load the modules they import lazily."""
+    from app.api import deps
+
+    deps.get_pipeline()
+    deps.get_report_generator()
+    import plotly.express  # noqa: F401
+    from scipy import stats  # noqa: F401
+
+
+async def _load_data_sources(session_factory: Optional[Callable[[], Any]]) -> List[Any]:
+    """Active data sources; the query also opens the first pooled metadata connection."""
+    from app.models.data_source import DataSource
+
+    if session_factory is None:
+        from app.models.database import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+
+    async with session_factory() as db:
+        result = await db.execute(
+            select(DataSource)
+            .where(DataSource.is_active == True)  # noqa: E712
+            .order_by(DataSource.updated_at.desc())
+            .limit(settings.WARMUP_MAX_DATA_SOURCES)
+        )
+        return list(result.scalars().all())
+
+
+def _cache_schema_prompts(data_sources: List[Any]) -> List[Any]:
+    """Format and memoize the schema prompt and intent vocabulary of each source."""
+    from app.api import deps
+
+    sql_generator = deps.get_sql_generator()
+    classifier = deps.get_query_processor().classifier
+    prepared = []
+    for data_source in data_sources:
+        if not data_source.schema_metadata:
+            continue
+        sql_generator.get_schema_prompt(data_source.schema_metadata, data_source.schema_version)
+        classifier.get_vocabulary(data_source.schema_metadata, data_source.schema_version, data_source.semantic_model)
+        prepared.append(data_source.id)
+    return prepared
+
+
+def _connect_engines(data_sources: List[Any]) -> List[Any]:
+    """Decrypt credentials, create each source's engine and open one pooled connection."""
+    from app.api import deps
+
+    executor = deps.get_query_executor()
+    connected = []
+    for data_source in data_sources:
+        try:
+            connection_string = executor.get_connection_string(data_source)
+        except ValueError:
+            # Files, APIs and other sources that are not queried over SQL
+            continue
+        try:
+            with executor.get_engine(connection_string).connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception as e:
+            logger.warning(f"Warm-up could not connect to data source {data_source.id}: {e}")
+            continue
+        connected.append(data_source.id)
+    return connected
+
+
+async def _open_llm_connections() -> None:
+    """Open keep-alive connections for every LLM client the pipeline calls."""
+    from app.api import deps
+
+    providers = {}
+    for service in (deps.get_query_processor(), deps.get_sql_generator(), deps.get_narrative_generator()):
+        providers[id(service.llm)] = service.llm
+    await asyncio.gather(*(provider.warm_up() for provider in providers.values()))
+
+
+def shutdown() -> None:
+    """Close data source pools opened by this worker."""
+    # Only if something loaded the executor; shutting down should not import pandas
+    executor = sys.modules.get("app.services.data.executor")
+    if executor is not None:
+        executor.QueryExecutor.dispose_engines()
@@ -1,13 +1,50 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import make_asgi_app
 from app.core.config import settings
-from app.api.v1.endpoints import reports, alerts, queries, data_sources, users, auth
+from app.core.compression import CompressionMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.rate_limit import RateLimitMiddleware
+from app.core.warmup import readiness, shutdown, warm_up
+from app.api.v1.endpoints import reports, alerts, queries, data_sources, users, auth, admin
+# Register every model so relationships resolve (services that import the rest load lazily)
+from app.models import user, report, report_version, alert, alert_execution, insight_cache, audit_log  # noqa: F401
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background; /ready reports 503 until it finishes
+    warmup_task = None
+    if settings.WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(warm_up())
+    else:
+        readiness.mark_ready()
+    # Batch insight cache writes to the database instead of writing on every analyze call
+    flusher_task = None
+    if settings.INSIGHT_CACHE_ENABLED and settings.INSIGHT_CACHE_WRITE_BEHIND_SECONDS > 0:
+        from app.api.deps import get_insight_store
+        flusher_task = asyncio.create_task(get_insight_store().run_flusher())
+    yield
+    for task in (warmup_task, flusher_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
+# Innermost, so a profile covers the routed request itself
+app.add_middleware(ProfilingMiddleware)
+
+# Added before CORS so rejected requests still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
@@ -18,6 +55,12 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE_BYTES,
+    compresslevel=settings.GZIP_COMPRESS_LEVEL
+)
+
 # Include Routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
@@ -25,6 +68,10 @@ app.include_router(data_sources.router, prefix=f"{settings.API_V1_STR}/data_sour
 app.include_router(queries.router, prefix=f"{settings.API_V1_STR}/queries", tags=["queries"])
 app.include_router(reports.router, prefix=f"{settings.API_V1_STR}/reports", tags=["reports"])
 app.include_router(alerts.router, prefix=f"{settings.API_V1_STR}/alerts", tags=["alerts"])
+app.include_router(admin.router, prefix=f"{settings.API_V1_STR}/admin", tags=["admin"])
+
+# Prometheus scrape endpoint
+app.mount("/metrics", make_asgi_app())
 
 @app.get("/")
 def root():
@@ -33,3 +80,10 @@ def root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/ready")
+def readiness_check(response: Response):
+    """Readiness for load balancers: 503 until this worker has warmed up."""
+    if not readiness.ready:
+        response.status_code = 503
+    return readiness.snapshot()
@@ -4,7 +4,7 @@ Alert model for proactive monitoring.
 
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, Boolean, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, String, Text, Boolean, ForeignKey, Enum as SQLEnum, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB, TIMESTAMP
 from sqlalchemy.orm import relationship
 import enum
@@ -67,3 +67,8 @@ class Alert(Base):
     
     def __repr__(self):
         return f"<Alert(id={self.id}, name={self.name}, type={self.alert_type})>"
+    
+    # Composite index for keyset pagination (newest first)
+    __table_args__ = (
+        Index('ix_alerts_created_at_id', 'created_at', 'id'),
+    )
@@ -4,7 +4,7 @@ DataSource model for managing connected data sources.
 
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, Boolean, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, String, Text, Integer, Boolean, ForeignKey, Enum as SQLEnum, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB, TIMESTAMP
 from sqlalchemy.orm import relationship
 import enum
@@ -38,10 +38,13 @@ class DataSource(Base):
         source_type: Type of data source (csv, postgresql, api, etc.)
         connection_config: Encrypted connection details (credentials, host, etc.)
         schema_metadata: Table/column information, data types
+        semantic_model: Declared business metrics and dimensions (semantic layer)
         is_active: Whether this data source is currently active
         last_connected_at: Last successful connection timestamp
         last_refreshed_at: Last data refresh timestamp
         refresh_schedule: Cron expression for scheduled refreshes
+        cache_stale_seconds: How long expired insights are still served while
+            being refreshed (None uses INSIGHT_CACHE_STALE_SECONDS)
         created_by: User who created this data source
         created_at: Creation timestamp
         updated_at: Last modification timestamp
@@ -54,10 +57,12 @@ class DataSource(Base):
     source_type = Column(SQLEnum(SourceType), nullable=False, index=True)
     connection_config = Column(JSONB, nullable=False)  # Encrypted credentials stored here
     schema_metadata = Column(JSONB, nullable=True, default=dict)
+    semantic_model = Column(JSONB, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False, index=True)
     last_connected_at = Column(TIMESTAMP, nullable=True)
     last_refreshed_at = Column(TIMESTAMP, nullable=True)
     refresh_schedule = Column(String(100), nullable=True)  # Cron expression
+    cache_stale_seconds = Column(Integer, nullable=True)
     
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     created_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False)
@@ -67,5 +72,16 @@ class DataSource(Base):
     creator = relationship("User", back_populates="data_sources")
     alerts = relationship("Alert", back_populates="data_source", cascade="all, delete-orphan")
     
+    @property
+    def schema_version(self) -> str:
+        """Version key for caches derived from this source's schema (changes on every update)."""
+        updated = self.updated_at.isoformat() if self.updated_at else "new"
+        return f"{self.id}:{updated}"
+    
     def __repr__(self):
         return f"<DataSource(id={self.id}, name={self.name}, type={self.source_type})>"
+    
+    # Composite index for keyset pagination (newest first)
+    __table_args__ = (
+        Index('ix_data_sources_created_at_id', 'created_at', 'id'),
+    )
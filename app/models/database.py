@@ -1,13 +1,18 @@
 """
 Database connection and session management.
 
-Provides SQLAlchemy engine, session factory, and base class for ORM models.
+Provides SQLAlchemy engines, session factories, and base class for ORM models.
+Async endpoints use the AsyncSession from get_async_db; synchronous endpoints
+and Celery tasks use the Session from get_db / SessionLocal.
 """
 
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 from app.core.config import settings
 
@@ -30,6 +35,47 @@ engine = create_engine(settings.DATABASE_URL, **engine_args)
 # Session factory for creating database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def get_async_database_url(url: str) -> str:
+    """
+    Map a synchronous database URL to its asyncio driver.
+
+    postgresql:// (or postgresql+psycopg2://) becomes postgresql+asyncpg://
+    and sqlite:// becomes sqlite+aiosqlite://. URLs that already name an
+    async driver are returned unchanged.
+    """
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}" if scheme != "postgresql+asyncpg" else url
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}" if scheme != "sqlite+aiosqlite" else url
+    return url
+
+
+# Async engine for the metadata database, sized from the same pool settings
+async_engine = create_async_engine(get_async_database_url(settings.DATABASE_URL), **engine_args)
+
+# Async session factory. Objects stay loaded after commit so endpoints can
+# keep reading them without an implicit (blocking) refresh.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+
+# Render PostgreSQL-only column types when the metadata database is SQLite (tests, local runs)
+@compiles(JSONB, "sqlite")
+def _compile_jsonb_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(UUID, "sqlite")
+def _compile_uuid_sqlite(type_, compiler, **kw):
+    return "CHAR(32)"
+
 # Base class for all ORM models
 Base = declarative_base()
 
@@ -53,6 +99,23 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency function for async FastAPI endpoints to get a database session.
+    
+    Yields:
+        Async database session that will be automatically closed after use.
+        
+    Example:
+        @app.get("/users")
+        async def get_users(db: AsyncSession = Depends(get_async_db)):
+            result = await db.execute(select(User))
+            return result.scalars().all()
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db() -> None:
     """
     Initialize the database by creating all tables.
@@ -4,7 +4,7 @@ Query model for tracking user query history.
 
 import uuid
 from datetime import datetime
-from sqlalchemy import Column, String, Text, Integer, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, String, Text, Integer, ForeignKey, Enum as SQLEnum, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB, TIMESTAMP
 from sqlalchemy.orm import relationship
 import enum
@@ -36,9 +36,11 @@ class Query(Base):
         data_sources_used: Array of data source IDs used
         generated_sql: LLM-generated SQL query
         results: Query execution results (for caching)
-        execution_time_ms: Query execution time in milliseconds
+        execution_time_ms: Total analysis time in milliseconds
+        stage_timings: Per-stage durations in milliseconds
         status: Query status (pending, completed, failed, cached)
         error_message: Error message if query failed
+        progress: Last completed pipeline stage (for background runs)
         parent_query_id: Parent query for follow-up questions
         created_at: Query submission timestamp
     """
@@ -53,8 +55,10 @@ class Query(Base):
     generated_sql = Column(Text, nullable=True)
     results = Column(JSONB, nullable=True)
     execution_time_ms = Column(Integer, nullable=True)
+    stage_timings = Column(JSONB, nullable=True)
     status = Column(SQLEnum(QueryStatus), nullable=False, default=QueryStatus.PENDING, index=True)
     error_message = Column(Text, nullable=True)
+    progress = Column(JSONB, nullable=True)
     parent_query_id = Column(UUID(as_uuid=True), ForeignKey("queries.id"), nullable=True)
     created_at = Column(TIMESTAMP, default=datetime.utcnow, nullable=False, index=True)
     
@@ -65,5 +69,14 @@ class Query(Base):
     # Self-referential for follow-up queries
     follow_ups = relationship("Query", backref="parent_query", remote_side=[id])
     
+    def used_data_source(self, data_source_id) -> bool:
+        """Whether this query ran against the given data source."""
+        return str(data_source_id) in (self.data_sources_used or [])
+    
     def __repr__(self):
         return f"<Query(id={self.id}, status={self.status}, user_id={self.user_id})>"
+    
+    # Composite index for keyset pagination (newest first)
+    __table_args__ = (
+        Index('ix_queries_created_at_id', 'created_at', 'id'),
+    )
@@ -0,0 +1,310 @@
+"""
+Follow-up questions answered from the parent query's result set.
+
+Refinements such as "now just the West region", "sort by margin" or "top 5
+by revenue" are parsed into filter, sort and top-N operations and applied
+with pandas to the parent's stored rows, without an LLM call or a warehouse
+round trip. A follow-up is only answered locally when every part of it
+resolves against the parent frame (known columns, values present in the
+data) and the parent's rows are complete (not cut off by a LIMIT);
+otherwise the caller runs the full pipeline.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from app.models.query import Query, QueryStatus
+from app.services.semantic.compiler import DEFAULT_ROW_LIMIT
+from app.services.storage.result_store import ResultStore
+
+# Parent statuses whose results can be refined
+ANSWERABLE_STATUSES = (QueryStatus.COMPLETED, QueryStatus.CACHED)
+
+LEAD_IN_PATTERN = re.compile(
+    r"^(?:(?:ok|okay|now|then|and|also|please|can you|could you)\s+)*"
+    r"(?:(?:show|give|list|display)(?: me)?\s+)?(?:the\s+)?"
+)
+
+CLAUSE_SPLIT_PATTERN = re.compile(r",|;| and then | then | and (?=(?:sort|order|rank|top|bottom|first|just|only|exclude|without)\b)")
+
+TOP_PATTERN = re.compile(
+    r"^(?P<direction>top|bottom|first) (?P<n>\d+)(?: [a-z_ ]+?)??(?: (?:by|on) (?P<column>.+))?$"
+)
+SORT_PATTERN = re.compile(
+    r"^(?:sort|sorted|order|ordered|rank|ranked) by (?P<column>.+?)"
+    r"(?: (?P<direction>asc|ascending|desc|descending|highest first|lowest first|low to high|high to low))?$"
+)
+COMPARE_PATTERN = re.compile(
+    r"^(?:where |with |only )?(?P<column>.+?) "
+    r"(?P<op>>=|<=|>|<|=|is above|above|over|more than|greater than|is below|below|under|less than|is|equals)"
+    r" (?P<value>.+)$"
+)
+EXCLUDE_PATTERN = re.compile(r"^(?:exclude|excluding|without|except|remove|drop|not) (?:the )?(?P<value>.+)$")
+FILTER_PATTERN = re.compile(
+    r"^(?:just|only|filter to|filtered to|limit to|restrict to|focus on|for) (?:the )?(?P<value>.+)$"
+)
+
+DESCENDING_WORDS = ("desc", "descending", "highest first", "high to low")
+ASCENDING_WORDS = ("asc", "ascending", "lowest first", "low to high")
+
+COMPARISON_OPERATORS = {
+    ">": "gt", "over": "gt", "above": "gt", "is above": "gt", "more than": "gt", "greater than": "gt",
+    "<": "lt", "under": "lt", "below": "lt", "is below": "lt", "less than": "lt",
+    ">=": "ge", "<=": "le",
+    "=": "eq", "is": "eq", "equals": "eq"
+}
+OPERATOR_SYMBOLS = {"gt": ">", "lt": "<", "ge": ">=", "le": "<=", "eq": "="}
+
+# Row caps in the parent's SQL; rows past them were never fetched
+ROW_CAP_PATTERN = re.compile(r"\b(?:LIMIT|TOP|FETCH\s+(?:FIRST|NEXT))\s+\(?\d+", re.IGNORECASE)
+
+
+@dataclass
+class FollowUpOperation:
+    """One transformation of the parent frame."""
+    kind: str  # filter, exclude, compare, sort or top
+    column: Optional[str] = None
+    values: List[Any] = field(default_factory=list)
+    operator: Optional[str] = None
+    descending: bool = True
+    n: Optional[int] = None
+
+    def describe(self) -> str:
+        if self.kind == "filter":
+            return f"filtered {self.column} to {', '.join(map(str, self.values))}"
+        if self.kind == "exclude":
+            return f"excluded {self.column} {', '.join(map(str, self.values))}"
+        if self.kind == "compare":
+            return f"kept rows where {self.column} {OPERATOR_SYMBOLS[self.operator]} {self.values[0]}"
+        if self.kind == "sort":
+            return f"sorted by {self.column} {'descending' if self.descending else 'ascending'}"
+        if self.column:
+            return f"{'top' if self.descending else 'bottom'} {self.n} by {self.column}"
+        return f"first {self.n} rows"
+
+
+@dataclass
+class FollowUpResult:
+    """A follow-up answered from the parent's data."""
+    df: pd.DataFrame
+    operations: List[FollowUpOperation]
+
+    @property
+    def summary(self) -> str:
+        steps = "; ".join(op.describe() for op in self.operations)
+        return f"Refined the previous result ({steps}): {len(self.df)} rows."
+
+
+class FollowUpEngine:
+    """Answers refinement questions by transforming the parent query's result locally."""
+
+    def __init__(self, result_store: Optional[ResultStore] = None):
+        self.result_store = result_store or ResultStore()
+
+    def answer(self, question: str, parent: Query) -> Optional[FollowUpResult]:
+        """
+        Try to answer a follow-up from the parent's stored result.
+
+        Returns:
+            FollowUpResult, or None if the parent data cannot cover the question
+        """
+        if parent is None or parent.status not in ANSWERABLE_STATUSES:
+            return None
+        df = self.load_parent_frame(parent)
+        if df is None or df.empty or self.may_be_truncated(parent, df):
+            return None
+        operations = self.plan(question, df)
+        if not operations:
+            return None
+        return FollowUpResult(df=self.apply(df, operations), operations=operations)
+
+    @staticmethod
+    def may_be_truncated(parent: Query, df: pd.DataFrame) -> bool:
+        """Whether the parent's rows may be a cut-off subset of its answer."""
+        return len(df) >= DEFAULT_ROW_LIMIT or bool(ROW_CAP_PATTERN.search(parent.generated_sql or ""))
+
+    def load_parent_frame(self, parent: Query) -> Optional[pd.DataFrame]:
+        """The parent's full result as a DataFrame (inline rows or the offloaded blob)."""
+        results = parent.results
+        if isinstance(results, dict) and "data_ref" in results:
+            try:
+                return self.result_store.read_frame(results["data_ref"])
+            except FileNotFoundError:
+                return None
+        if isinstance(results, dict) and isinstance(results.get("data"), list):
+            return pd.DataFrame(results["data"])
+        if isinstance(results, list):
+            return pd.DataFrame(results)
+        return None
+
+    def plan(self, question: str, df: pd.DataFrame) -> Optional[List[FollowUpOperation]]:
+        """
+        Parse a follow-up into operations on df.
+
+        Returns:
+            Operations in the order given, or None if any clause is not understood
+        """
+        # Keep decimal points ("margin above 0.3")
+        text = re.sub(r"[?!;:\"']|\.(?!\d)", " ", question.lower())
+        text = re.sub(r"\s+", " ", text).strip()
+        clauses = [LEAD_IN_PATTERN.sub("", c.strip()).strip() for c in CLAUSE_SPLIT_PATTERN.split(text)]
+        clauses = [c for c in clauses if c]
+        if not clauses:
+            return None
+
+        columns = _ColumnResolver(df)
+        operations = []
+        for clause in clauses:
+            operation = self._parse_clause(clause, df, columns)
+            if operation is None:
+                return None
+            operations.append(operation)
+        return operations
+
+    @staticmethod
+    def apply(df: pd.DataFrame, operations: List[FollowUpOperation]) -> pd.DataFrame:
+        """Apply operations to df in order."""
+        for op in operations:
+            if op.kind == "filter":
+                df = df[df[op.column].isin(op.values)]
+            elif op.kind == "exclude":
+                df = df[~df[op.column].isin(op.values)]
+            elif op.kind == "compare":
+                df = df[getattr(df[op.column], op.operator)(op.values[0])]
+            elif op.kind == "sort":
+                df = df.sort_values(op.column, ascending=not op.descending, kind="stable")
+            elif op.kind == "top":
+                if op.column:
+                    df = df.nlargest(op.n, op.column) if op.descending else df.nsmallest(op.n, op.column)
+                else:
+                    df = df.head(op.n)
+        return df.reset_index(drop=True)
+
+    def _parse_clause(self, clause: str, df: pd.DataFrame, columns: "_ColumnResolver") -> Optional[FollowUpOperation]:
+        match = TOP_PATTERN.match(clause)
+        if match:
+            n = int(match.group("n"))
+            if match.group("direction") == "first" and not match.group("column"):
+                return FollowUpOperation(kind="top", n=n)
+            column = columns.numeric(match.group("column")) if match.group("column") else columns.default_metric()
+            if column is None:
+                return None
+            return FollowUpOperation(kind="top", column=column, n=n, descending=match.group("direction") != "bottom")
+
+        match = SORT_PATTERN.match(clause)
+        if match:
+            column = columns.resolve(match.group("column"))
+            if column is None:
+                return None
+            direction = match.group("direction")
+            if direction in DESCENDING_WORDS:
+                descending = True
+            elif direction in ASCENDING_WORDS:
+                descending = False
+            else:
+                # Numbers read best largest first; labels alphabetically
+                descending = pd.api.types.is_numeric_dtype(df[column])
+            return FollowUpOperation(kind="sort", column=column, descending=descending)
+
+        match = EXCLUDE_PATTERN.match(clause)
+        if match:
+            return _value_filter("exclude", match.group("value"), df, columns)
+
+        match = FILTER_PATTERN.match(clause)
+        if match:
+            return _value_filter("filter", match.group("value"), df, columns)
+
+        match = COMPARE_PATTERN.match(clause)
+        if match:
+            column = columns.resolve(match.group("column"))
+            if column is None:
+                return None
+            operator = COMPARISON_OPERATORS[match.group("op")]
+            if pd.api.types.is_numeric_dtype(df[column]):
+                try:
+                    value = float(match.group("value").replace(",", ""))
+                except ValueError:
+                    return None
+                return FollowUpOperation(kind="compare", column=column, values=[value], operator=operator)
+            if operator == "eq":
+                values = _resolve_values(df[column], match.group("value"))
+                if values:
+                    return FollowUpOperation(kind="filter", column=column, values=values)
+            return None
+
+        # A bare value ("west region") is read as a filter
+        return _value_filter("filter", clause, df, columns)
+
+
+class _ColumnResolver:
+    """Maps user phrases to frame columns."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.phrases: Dict[str, str] = {}
+        for column in df.columns:
+            base = str(column).lower()
+            spaced = base.replace("_", " ")
+            for phrase in (base, spaced, f"{spaced}s", spaced[:-1] if spaced.endswith("s") else spaced):
+                self.phrases.setdefault(phrase, column)
+
+    def resolve(self, phrase: str) -> Optional[str]:
+        phrase = re.sub(r"^(?:the|total|sum of|highest|lowest) ", "", phrase.strip())
+        return self.phrases.get(phrase)
+
+    def numeric(self, phrase: str) -> Optional[str]:
+        column = self.resolve(phrase)
+        if column is not None and pd.api.types.is_numeric_dtype(self.df[column]):
+            return column
+        return None
+
+    def default_metric(self) -> Optional[str]:
+        """The only numeric column, if there is exactly one."""
+        numeric = [c for c in self.df.columns if pd.api.types.is_numeric_dtype(self.df[c])]
+        return numeric[0] if len(numeric) == 1 else None
+
+    def split_trailing_column(self, phrase: str) -> Optional[Tuple[str, str]]:
+        """'west region' -> ('west', 'region') when the last words name a column."""
+        words = phrase.split()
+        for i in range(1, len(words)):
+            column = self.resolve(" ".join(words[i:]))
+            if column is not None:
+                return " ".join(words[:i]), column
+        return None
+
+
+def _value_filter(kind: str, phrase: str, df: pd.DataFrame, columns: _ColumnResolver) -> Optional[FollowUpOperation]:
+    """Filter on values of a label column, which must all appear in the parent data."""
+    split = columns.split_trailing_column(phrase)
+    if split:
+        value_phrase, column = split
+        values = _resolve_values(df[column], value_phrase)
+        if values:
+            return FollowUpOperation(kind=kind, column=column, values=values)
+        return None
+
+    label_columns = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
+    matches = []
+    for column in label_columns:
+        values = _resolve_values(df[column], phrase)
+        if values:
+            matches.append(FollowUpOperation(kind=kind, column=column, values=values))
+    # Ambiguous or unknown values need the full pipeline
+    return matches[0] if len(matches) == 1 else None
+
+
+def _resolve_values(series: pd.Series, phrase: str) -> Optional[List[Any]]:
+    """Map 'west or east' to the matching distinct values of series; None if any is missing."""
+    if pd.api.types.is_numeric_dtype(series):
+        return None
+    known = {str(v).lower(): v for v in series.dropna().unique()}
+    values = []
+    for part in re.split(r" or |/| and ", phrase):
+        part = re.sub(r"^(?:the|in) ", "", part.strip())
+        if part not in known:
+            return None
+        values.append(known[part])
+    return values or None
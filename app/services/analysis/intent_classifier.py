@@ -0,0 +1,259 @@
+"""
+Rule-based intent classification for common, regularly phrased questions.
+
+Runs before the LLM: a compiled pattern grammar extracts the metric, dimension
+and time phrases, and a vocabulary built from the data source schema resolves
+them to known columns. Only fully resolved matches asking for plain or summed
+metrics are returned with high confidence; everything else (including
+averages and counts) falls back to the LLM.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+NUMERIC_TYPE_PATTERN = re.compile(r"INT|DEC|NUM|FLOAT|REAL|DOUBLE|MONEY", re.IGNORECASE)
+
+# Time phrases understood by the grammar (and by downstream compilers)
+TIME_PATTERN = (
+    r"(?:(?:in|for|during|over|from) )?(?:the )?"
+    r"(?P<time>(?:last|past|previous|this|current) (?:\d+ )?(?:day|week|month|quarter|year)s?"
+    r"|yesterday|today|ytd|year to date|q[1-4](?: \d{4})?|\d{4})"
+)
+
+# Leading filler that carries no meaning for classification
+LEAD_IN_PATTERN = re.compile(
+    r"^(?:please )?(?:show(?: me)?|give me|get|list|display|tell me|what (?:is|was|were|are)|how (?:much|many))\s+(?:the\s+)?"
+)
+
+# Questions that need reasoning the grammar cannot provide
+LLM_ONLY_PATTERN = re.compile(r"\b(?:why|forecast|predict|will|should|recommend|improve|cause|explain)\b")
+
+_TAIL = rf"(?: {TIME_PATTERN})?$"
+
+GRAMMAR = [
+    ("COMPARATIVE", re.compile(
+        rf"^compare (?P<metric>.+?) (?:by|across|between|per) (?P<dimension>.+?){_TAIL}")),
+    ("TREND", re.compile(
+        rf"^(?:the )?trend (?:of|in|for) (?P<metric>.+?)(?: (?:by|per) (?P<dimension>.+?))?{_TAIL}")),
+    ("TREND", re.compile(
+        rf"^(?P<metric>.+?) (?:trend|over time)(?: (?:by|per) (?P<dimension>.+?))?{_TAIL}")),
+    ("DESCRIPTIVE", re.compile(
+        rf"^(?P<aggregation>total|sum of|average|avg|mean|count of|number of) (?P<metric>.+?)"
+        rf"(?: (?:by|per|for each) (?P<dimension>.+?))?{_TAIL}")),
+    ("DESCRIPTIVE", re.compile(
+        rf"^(?P<metric>.+?) (?:by|per|for each) (?P<dimension>.+?){_TAIL}")),
+]
+
+# Aggregation words in questions, by the QueryIntent.aggregation they stand for
+AGGREGATIONS = {
+    "total": "sum", "sum of": "sum",
+    "average": "avg", "avg": "avg", "mean": "avg",
+    "count of": "count", "number of": "count"
+}
+
+# Confidence levels
+FULL_MATCH_CONFIDENCE = 0.95
+PARTIAL_MATCH_CONFIDENCE = 0.3
+
+
+@dataclass
+class SchemaVocabulary:
+    """Known metric and dimension phrases mapped to their canonical names."""
+    metrics: Dict[str, str] = field(default_factory=dict)
+    dimensions: Dict[str, str] = field(default_factory=dict)
+
+    def add_metric(self, name: str, synonyms: Optional[List[str]] = None) -> None:
+        for phrase in _phrases(name, synonyms):
+            self.metrics.setdefault(phrase, name)
+
+    def add_dimension(self, name: str, synonyms: Optional[List[str]] = None) -> None:
+        for phrase in _phrases(name, synonyms):
+            self.dimensions.setdefault(phrase, name)
+
+
+@dataclass
+class ClassificationResult:
+    """Outcome of a rule-based classification attempt (fields map onto QueryIntent)."""
+    fields: Dict[str, Any]
+    confidence: float
+
+
+class IntentStats:
+    """Thread-safe counters for fast-path hits and LLM fallbacks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.llm_fallback = 0
+
+    def record(self, fast_path: bool) -> None:
+        with self._lock:
+            if fast_path:
+                self.fast_path += 1
+            else:
+                self.llm_fallback += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.fast_path + self.llm_fallback
+            return {
+                "total": total,
+                "fast_path": self.fast_path,
+                "llm_fallback": self.llm_fallback,
+                "fallback_rate": self.llm_fallback / total if total else None
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.fast_path = 0
+            self.llm_fallback = 0
+
+
+# Process-wide statistics
+intent_stats = IntentStats()
+
+
+class RuleBasedIntentClassifier:
+    """Classifies regularly phrased questions without an LLM call."""
+
+    VOCABULARY_CACHE_MAX_ENTRIES = 256
+    _vocabulary_cache: "OrderedDict[str, SchemaVocabulary]" = OrderedDict()
+
+    def classify(
+        self,
+        user_query: str,
+        schema: Dict[str, Any],
+        schema_version: Optional[str] = None,
+        semantic_model: Optional[Dict[str, Any]] = None
+    ) -> Optional[ClassificationResult]:
+        """
+        Try to classify a question using the pattern grammar.
+
+        Args:
+            user_query: The user's natural language question
+            schema: Data source schema_metadata
+            schema_version: Optional cache key for the schema vocabulary
+            semantic_model: Optional semantic layer adding metric and dimension names
+
+        Returns:
+            ClassificationResult, or None if no pattern matched
+        """
+        question = _normalize(user_query)
+        if not question or LLM_ONLY_PATTERN.search(question):
+            return None
+
+        vocabulary = self.get_vocabulary(schema, schema_version, semantic_model)
+        for intent, pattern in GRAMMAR:
+            match = pattern.match(question)
+            if not match:
+                continue
+
+            metrics = _resolve(match.group("metric"), vocabulary.metrics)
+            dimension_phrase = match.groupdict().get("dimension")
+            dimensions = _resolve(dimension_phrase, vocabulary.dimensions) if dimension_phrase else []
+            aggregation = AGGREGATIONS.get(match.groupdict().get("aggregation"))
+            # Only totals keep a metric's own definition; other aggregations are left to the LLM
+            fully_resolved = metrics is not None and dimensions is not None and aggregation in (None, "sum")
+
+            return ClassificationResult(
+                fields={
+                    "intent": intent,
+                    "metrics": metrics or [],
+                    "dimensions": dimensions or [],
+                    "time_range": match.groupdict().get("time"),
+                    "filters": {},
+                    "complexity": "simple",
+                    "aggregation": aggregation
+                },
+                confidence=FULL_MATCH_CONFIDENCE if fully_resolved else PARTIAL_MATCH_CONFIDENCE
+            )
+        return None
+
+    def get_vocabulary(
+        self,
+        schema: Dict[str, Any],
+        schema_version: Optional[str] = None,
+        semantic_model: Optional[Dict[str, Any]] = None
+    ) -> SchemaVocabulary:
+        """Build (or fetch the cached) vocabulary for a schema."""
+        if schema_version is None:
+            return self.build_vocabulary(schema, semantic_model)
+
+        cache = RuleBasedIntentClassifier._vocabulary_cache
+        cached = cache.get(schema_version)
+        if cached is not None:
+            cache.move_to_end(schema_version)
+            return cached
+
+        vocabulary = self.build_vocabulary(schema, semantic_model)
+        cache[schema_version] = vocabulary
+        if len(cache) > self.VOCABULARY_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+        return vocabulary
+
+    @staticmethod
+    def build_vocabulary(schema: Dict[str, Any], semantic_model: Optional[Dict[str, Any]] = None) -> SchemaVocabulary:
+        """
+        Derive metric and dimension phrases from schema_metadata.
+
+        Semantic layer metrics and dimensions take precedence. Numeric columns
+        become metrics; all other columns become dimensions. Columns may list
+        extra phrases under a 'synonyms' key.
+        """
+        vocabulary = SchemaVocabulary()
+        if isinstance(semantic_model, dict):
+            for metric in semantic_model.get("metrics", []):
+                if isinstance(metric, dict) and metric.get("name"):
+                    vocabulary.add_metric(metric["name"], metric.get("synonyms"))
+            for dimension in semantic_model.get("dimensions", []):
+                if isinstance(dimension, dict) and dimension.get("name"):
+                    vocabulary.add_dimension(dimension["name"], dimension.get("synonyms"))
+        for table_info in schema.values():
+            if not isinstance(table_info, dict):
+                continue
+            for col in table_info.get("columns", []):
+                if NUMERIC_TYPE_PATTERN.search(str(col.get("type", ""))):
+                    vocabulary.add_metric(col["name"], col.get("synonyms"))
+                else:
+                    vocabulary.add_dimension(col["name"], col.get("synonyms"))
+        return vocabulary
+
+
+def _normalize(text: str) -> str:
+    """Lowercase, strip punctuation and lead-in filler."""
+    text = re.sub(r"[?!.;:\"']", " ", text.lower())
+    text = re.sub(r"\s*,\s*", ", ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return LEAD_IN_PATTERN.sub("", text).strip()
+
+
+def _phrases(name: str, synonyms: Optional[List[str]] = None) -> List[str]:
+    """Phrase variants for a column or metric name."""
+    base = name.lower()
+    spaced = base.replace("_", " ")
+    phrases = {base, spaced, f"{spaced}s"}
+    if spaced.endswith("s"):
+        phrases.add(spaced[:-1])
+    for synonym in synonyms or []:
+        phrases.add(synonym.lower())
+    return list(phrases)
+
+
+def _resolve(phrase: str, known: Dict[str, str]) -> Optional[List[str]]:
+    """
+    Resolve a phrase like 'revenue and units' to canonical names.
+
+    Returns:
+        List of canonical names, or None if any part is unknown
+    """
+    parts = [p.strip() for p in re.split(r",| and ", phrase) if p.strip()]
+    resolved = []
+    for part in parts:
+        part = re.sub(r"^(?:the|total|all) ", "", part)
+        if part not in known:
+            return None
+        resolved.append(known[part])
+    return resolved or None
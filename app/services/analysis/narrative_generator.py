@@ -1,20 +1,23 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import pandas as pd
 import json
 from app.services.llm.factory import LLMFactory
-from app.services.analysis.prompts import DATA_ANALYSIS_PROMPT
+from app.services.llm.router import ROUTE_NARRATIVE
+from app.services.analysis.prompts import DATA_ANALYSIS_SYSTEM_PROMPT, DATA_ANALYSIS_USER_PROMPT
 
 class NarrativeGenerator:
     """Service for generating narratives from data analysis."""
     
     def __init__(self):
-        self.llm = LLMFactory.get_provider()
+        self.llm = LLMFactory.get_router()
         
     async def generate_narrative(
         self, 
         user_query: str, 
         df: pd.DataFrame, 
-        analysis_results: Dict[str, Any]
+        analysis_results: Dict[str, Any],
+        complexity: Optional[str] = None,
+        intent: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate a narrative explanation of the data and analysis.
@@ -23,6 +26,8 @@ class NarrativeGenerator:
             user_query: The original user question
             df: The result DataFrame
             analysis_results: Dictionary of statistical analysis results
+            complexity: Optional QueryIntent.complexity used for model routing
+            intent: Optional QueryIntent.intent used for model routing
             
         Returns:
             Dictionary containing summary, narrative, key_points, etc.
@@ -34,7 +39,7 @@ class NarrativeGenerator:
         # Format analysis results as string
         analysis_str = json.dumps(analysis_results, indent=2, default=str)
         
-        prompt = DATA_ANALYSIS_PROMPT.format(
+        prompt = DATA_ANALYSIS_USER_PROMPT.format(
             user_query=user_query,
             analysis_results=analysis_str,
             row_limit=row_limit,
@@ -43,7 +48,13 @@ class NarrativeGenerator:
         
         response = await self.llm.generate_json(
             prompt=prompt,
-            temperature=0.3  # Slightly higher temperature for creative but grounded writing
+            system_prompt=DATA_ANALYSIS_SYSTEM_PROMPT,
+            temperature=0.3,  # Slightly higher temperature for creative but grounded writing
+            cache_system_prompt=True,
+            route=ROUTE_NARRATIVE,
+            complexity=complexity,
+            intent=intent,
+            validator=lambda r: isinstance(r, dict) and bool(r.get("summary"))
         )
         
         return response
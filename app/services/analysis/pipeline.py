@@ -0,0 +1,610 @@
+"""
+Analysis pipeline shared by the synchronous endpoint and background workers.
+
+Runs intent analysis, SQL generation, execution, statistics and narrative
+generation for a Query row, recording stage progress on the row as it goes.
+"""
+
+import asyncio
+import contextvars
+import inspect
+import logging
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Optional, Set, Union
+
+import anyio
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.tracing import current_trace, trace_recorder
+from app.models.data_source import DataSource
+from app.models.query import Query, QueryStatus
+from app.services.analysis.follow_up import FollowUpEngine, FollowUpResult
+from app.services.analysis.narrative_generator import NarrativeGenerator
+from app.services.analysis.query_processor import QueryProcessor
+from app.services.analysis.stats_engine import StatsEngine
+from app.services.data.executor import QueryExecutor
+from app.services.data.sql_generator import SQLGenerator
+from app.services.data.sql_validator import SQLValidator
+from app.services.semantic.compiler import SemanticCompiler
+from app.services.storage.insight_store import Insight, InsightStore
+from app.services.storage.result_store import ResultStore
+from app.utils.timing import StageTimer
+
+if TYPE_CHECKING:
+    from app.services.visualization.chart_generator import ChartGenerator
+
+logger = logging.getLogger(__name__)
+
+# The API passes an AsyncSession; Celery workers pass a synchronous Session
+DBSession = Union[AsyncSession, Session]
+
+# Stage names, in pipeline order
+STAGE_INTENT = "intent"
+STAGE_SQL = "sql"
+STAGE_DATA = "data"
+STAGE_STATS = "stats"
+STAGE_CHART = "chart"
+STAGE_NARRATIVE = "narrative"
+STAGE_FAILED = "failed"
+STAGE_CANCELLED = "cancelled"
+
+# Timed steps recorded in Query.stage_timings
+TIMING_INTENT = "intent"
+TIMING_FOLLOW_UP = "follow_up"
+TIMING_SQL_GENERATION = "sql_generation"
+TIMING_SQL_VALIDATION = "sql_validation"
+TIMING_EXECUTION = "execution"
+TIMING_RESULT_CONVERSION = "result_conversion"
+TIMING_RESULT_STORAGE = "result_storage"
+TIMING_STATS = "stats"
+TIMING_CHART = "chart"
+TIMING_NARRATIVE = "narrative"
+TIMING_CACHE_LOOKUP = "cache_lookup"
+TIMING_CACHE_WRITE = "cache_write"
+TIMING_CACHE_WAIT = "cache_wait"
+
+# Rows included in the data stage event
+PREVIEW_ROWS = 20
+
+# Intent recorded for follow-ups answered from the parent's result
+FOLLOW_UP_INTENT = "FOLLOW_UP"
+
+
+@dataclass
+class StageEvent:
+    """A completed pipeline stage and its output."""
+    stage: str
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+class AnalysisPipeline:
+    """Runs the analyze flow for a single Query row."""
+
+    def __init__(
+        self,
+        query_processor: Optional[QueryProcessor] = None,
+        sql_generator: Optional[SQLGenerator] = None,
+        query_executor: Optional[QueryExecutor] = None,
+        stats_engine: Optional[StatsEngine] = None,
+        narrative_generator: Optional[NarrativeGenerator] = None,
+        semantic_compiler: Optional[SemanticCompiler] = None,
+        chart_generator: Optional["ChartGenerator"] = None,
+        result_store: Optional[ResultStore] = None,
+        follow_up_engine: Optional[FollowUpEngine] = None,
+        insight_store: Optional[InsightStore] = None,
+        session_factory: Optional[Callable[[], Any]] = None,
+        background_refresh: bool = True
+    ):
+        self.query_processor = query_processor or QueryProcessor()
+        self.sql_generator = sql_generator or SQLGenerator()
+        self.query_executor = query_executor or QueryExecutor()
+        self.stats_engine = stats_engine or StatsEngine()
+        self.narrative_generator = narrative_generator or NarrativeGenerator()
+        self.semantic_compiler = semantic_compiler or SemanticCompiler()
+        self._chart_generator = chart_generator
+        self.result_store = result_store or ResultStore()
+        self.follow_up_engine = follow_up_engine or FollowUpEngine(self.result_store)
+        # Only pipelines given a store (the API's and workers') read and write the insight cache
+        self.insight_store = insight_store
+        # Async sessions for background insight refreshes (defaults to AsyncSessionLocal)
+        self.session_factory = session_factory
+        # Off where the event loop only runs during a call (Celery), which would strand the refresh
+        # task and its recompute lock; stale insights are then recomputed inline instead of served
+        self.background_refresh = background_refresh
+        self._refreshes: Set[asyncio.Task] = set()
+
+    @property
+    def chart_generator(self) -> "ChartGenerator":
+        # Built on first use so workers that never chart do not import plotly
+        if self._chart_generator is None:
+            from app.services.visualization.chart_generator import ChartGenerator
+            self._chart_generator = ChartGenerator()
+        return self._chart_generator
+
+    async def run(self, db: DBSession, db_query: Query, data_source: DataSource) -> Optional[Dict[str, Any]]:
+        """
+        Run every stage to completion.
+
+        Returns:
+            The narrative, or None if the query could not be answered
+
+        Raises:
+            Exception: Any stage failure (the row is marked FAILED first)
+        """
+        narrative = None
+        async for event in self.stream(db, db_query, data_source):
+            if event.stage == STAGE_NARRATIVE:
+                narrative = event.data
+        return narrative
+
+    async def stream(
+        self,
+        db: DBSession,
+        db_query: Query,
+        data_source: DataSource,
+        include_chart: bool = False
+    ) -> AsyncIterator[StageEvent]:
+        """
+        Run the pipeline, yielding an event as each stage completes.
+
+        Progress and per-step timings (Query.stage_timings, execution_time_ms)
+        are committed to the Query row after every stage. A question already
+        answered for the data source (see InsightStore) is served from the
+        insight cache and recorded with CACHED status; fresh answers are
+        written back. Stale insights are served too while a background
+        task refreshes them, and concurrent misses for the same question
+        wait for a single recompute. Follow-ups (rows with parent_query_id)
+        bypass the cache and are first tried against the parent's result
+        set, skipping SQL generation and the LLM when that succeeds. A query the
+        schema cannot answer ends with a single 'failed' event. Closing or
+        cancelling the iterator cancels the remaining stages and marks the
+        row as failed.
+
+        Args:
+            db: Database session owning db_query
+            db_query: Query row in PENDING status
+            data_source: Data source to analyze
+            include_chart: Also build a chart spec (emitted before the narrative)
+        """
+        timer = StageTimer()
+        trace = trace_recorder.start(db_query, data_source)
+        try:
+            async for event in self._stages(db, db_query, data_source, include_chart, timer):
+                yield event
+        except (asyncio.CancelledError, GeneratorExit):
+            if db_query.status == QueryStatus.PENDING:
+                logger.info(f"Analysis pipeline cancelled for query {db_query.id}")
+                db_query.status = QueryStatus.FAILED
+                db_query.error_message = "Cancelled by client"
+                # Shielded so the final write survives the cancellation in progress
+                with anyio.CancelScope(shield=True):
+                    await self._mark_progress(db, db_query, STAGE_CANCELLED, timer)
+            raise
+        except Exception as e:
+            logger.error(f"Analysis pipeline failed for query {db_query.id}: {e}")
+            db_query.status = QueryStatus.FAILED
+            db_query.error_message = str(e)
+            await self._mark_progress(db, db_query, STAGE_FAILED, timer)
+            raise
+        finally:
+            timer.finish(db_query.status.value if db_query.status else QueryStatus.FAILED.value)
+            if trace is not None:
+                trace_recorder.finish(trace, db_query, timer.as_dict())
+
+    async def _stages(
+        self,
+        db: DBSession,
+        db_query: Query,
+        data_source: DataSource,
+        include_chart: bool,
+        timer: StageTimer
+    ) -> AsyncIterator[StageEvent]:
+        user_query = db_query.natural_language_query
+
+        # 0. Follow-ups the parent's data can answer never reach the LLM or the warehouse
+        if db_query.parent_query_id is not None:
+            parent = await _get(db, Query, db_query.parent_query_id)
+            if parent is not None:
+                follow_up = None
+                # The parent's rows only answer follow-ups about the same data source
+                if parent.used_data_source(data_source.id):
+                    with timer.stage(TIMING_FOLLOW_UP):
+                        follow_up = await asyncio.to_thread(self.follow_up_engine.answer, user_query, parent)
+                if follow_up is not None:
+                    async for event in self._follow_up_stages(db, db_query, parent, follow_up, include_chart, timer):
+                        yield event
+                    return
+                # Give the LLM the question being refined
+                user_query = f"{parent.natural_language_query} (follow-up: {user_query})"
+
+        # Questions answered before come from the insight cache (follow-ups depend on their parent)
+        if self.insight_store is None or not self.insight_store.enabled or db_query.parent_query_id is not None:
+            async for event in self._fresh_stages(db, db_query, data_source, user_query, include_chart, timer):
+                yield event
+            return
+
+        store = self.insight_store
+        cache_key = store.cache_key(user_query, data_source)
+        stale_seconds = store.stale_seconds_for(data_source)
+        with timer.stage(TIMING_CACHE_LOOKUP):
+            insight = await store.get(db, cache_key, stale_seconds if self.background_refresh else 0)
+        if _answers(insight, include_chart):
+            if self.background_refresh and store.should_refresh(insight):
+                self._schedule_refresh(user_query, data_source.id, cache_key, include_chart)
+            async for event in self._cached_stages(db, db_query, insight, include_chart, timer):
+                yield event
+            return
+
+        # On a miss one request recomputes; concurrent ones wait for its answer
+        locked = await store.acquire(cache_key)
+        if not locked:
+            with timer.stage(TIMING_CACHE_WAIT):
+                insight = await store.wait_for(db, cache_key)
+            if _answers(insight, include_chart):
+                async for event in self._cached_stages(db, db_query, insight, include_chart, timer):
+                    yield event
+                return
+        try:
+            async for event in self._fresh_stages(
+                db, db_query, data_source, user_query, include_chart, timer, cache_key, stale_seconds
+            ):
+                yield event
+        finally:
+            if locked:
+                await store.release(cache_key)
+
+    async def _fresh_stages(
+        self,
+        db: DBSession,
+        db_query: Query,
+        data_source: DataSource,
+        user_query: str,
+        include_chart: bool,
+        timer: StageTimer,
+        cache_key: Optional[str] = None,
+        stale_seconds: int = 0
+    ) -> AsyncIterator[StageEvent]:
+        """Answer with the LLM and the warehouse, caching the insight under `cache_key` if given."""
+        schema_context = data_source.schema_metadata if data_source.schema_metadata else {}
+
+        # 1. Analyze intent (rule-based fast path first, LLM otherwise)
+        with timer.stage(TIMING_INTENT):
+            intent_result = await self.query_processor.analyze_query(
+                user_query,
+                schema_context=schema_context,
+                schema_version=data_source.schema_version,
+                semantic_model=data_source.semantic_model
+            )
+        db_query.intent = intent_result.intent
+        db_query.entities = {
+            "metrics": intent_result.metrics,
+            "dimensions": intent_result.dimensions,
+            "time_range": intent_result.time_range,
+            "filters": intent_result.filters
+        }
+        await self._mark_progress(db, db_query, STAGE_INTENT, timer)
+        yield StageEvent(STAGE_INTENT, {"intent": intent_result.intent, **db_query.entities})
+
+        # 2. Generate SQL. Intents fully covered by the semantic layer compile without the LLM
+        with timer.stage(TIMING_SQL_GENERATION):
+            compiled = self.semantic_compiler.compile(intent_result, data_source.semantic_model)
+            if compiled:
+                sql_result = {"sql": compiled.sql, "explanation": compiled.explanation, "can_answer": True}
+            else:
+                sql_result = await self.sql_generator.generate_sql(
+                    user_query,
+                    schema_context,
+                    schema_version=data_source.schema_version,
+                    complexity=intent_result.complexity,
+                    intent=intent_result.intent
+                )
+
+        # Final safety check on the SQL about to run, whichever path produced it
+        if sql_result.get("can_answer"):
+            with timer.stage(TIMING_SQL_VALIDATION):
+                if not SQLValidator.validate_sql(sql_result.get("sql")):
+                    sql_result = {
+                        "sql": "",
+                        "explanation": "Generated SQL was flagged as unsafe (contained forbidden keywords).",
+                        "can_answer": False
+                    }
+
+        if not sql_result.get("can_answer"):
+            db_query.status = QueryStatus.FAILED
+            db_query.error_message = sql_result.get("explanation", "Cannot answer query with available schema")
+            await self._mark_progress(db, db_query, STAGE_FAILED, timer)
+            yield StageEvent(STAGE_FAILED, {"error_message": db_query.error_message})
+            return
+
+        generated_sql = sql_result["sql"]
+        db_query.generated_sql = generated_sql
+        await self._mark_progress(db, db_query, STAGE_SQL, timer)
+        yield StageEvent(STAGE_SQL, {"sql": generated_sql, "explanation": sql_result.get("explanation")})
+
+        # 3. Execute SQL
+        with timer.stage(TIMING_EXECUTION):
+            df = await self.query_executor.execute_query(generated_sql, data_source)
+
+        data_ref, results_dict = await self._store_frame(db_query, df, timer)
+        await self._mark_progress(db, db_query, STAGE_DATA, timer)
+        yield _data_event(df, results_dict)
+
+        # 4. Statistics
+        with timer.stage(TIMING_STATS):
+            stats = self.stats_engine.calculate_summary_stats(df)
+        await self._mark_progress(db, db_query, STAGE_STATS, timer)
+        yield StageEvent(STAGE_STATS, stats)
+
+        # 5. Narrative, started now so the LLM call overlaps chart rendering
+        narrative_task = asyncio.create_task(timer.measure(
+            TIMING_NARRATIVE,
+            self.narrative_generator.generate_narrative(
+                user_query=user_query,
+                df=df,
+                analysis_results=stats,
+                complexity=intent_result.complexity,
+                intent=intent_result.intent
+            )
+        ))
+        try:
+            chart = None
+            if include_chart:
+                with timer.stage(TIMING_CHART):
+                    chart = await asyncio.to_thread(self._build_chart, df)
+                await self._mark_progress(db, db_query, STAGE_CHART, timer)
+                yield StageEvent(STAGE_CHART, chart)
+            narrative = await narrative_task
+        finally:
+            if not narrative_task.done():
+                narrative_task.cancel()
+
+        _set_results(db_query, stats, narrative, data_ref, results_dict, chart)
+        await self._mark_progress(db, db_query, STAGE_NARRATIVE, timer)
+        if cache_key is not None:
+            await self._cache_insight(
+                db, db_query, data_source, cache_key, sql_result, df, results_dict, timer, stale_seconds
+            )
+        yield StageEvent(STAGE_NARRATIVE, narrative)
+
+    def _schedule_refresh(self, question: str, data_source_id: Any, cache_key: str, include_chart: bool) -> None:
+        """Start refresh_insight in the background; the caller is answered from the cache meanwhile."""
+        # A fresh context, so the refresh is not recorded into the caller's trace
+        task = asyncio.create_task(
+            self.refresh_insight(question, data_source_id, cache_key, include_chart),
+            context=contextvars.Context()
+        )
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def refresh_insight(self, question: str, data_source_id: Any, cache_key: str, include_chart: bool = False) -> bool:
+        """
+        Recompute and store the insight for a question, unless another request already is.
+
+        Runs on its own session and an unsaved Query row, so it neither
+        touches the caller's session nor appears in query history.
+
+        Returns:
+            True if the insight was refreshed
+        """
+        store = self.insight_store
+        if not await store.acquire(cache_key):
+            return False
+        store.stats.record_refresh()
+        try:
+            session_factory = self.session_factory
+            if session_factory is None:
+                from app.models.database import AsyncSessionLocal
+                session_factory = AsyncSessionLocal
+            async with session_factory() as db:
+                data_source = await _get(db, DataSource, data_source_id)
+                # An edited source has a new schema version, and so a new key
+                if data_source is None or store.cache_key(question, data_source) != cache_key:
+                    return False
+                db_query = Query(id=uuid.uuid4(), natural_language_query=question, status=QueryStatus.PENDING)
+                async for _ in self._fresh_stages(
+                    db, db_query, data_source, question, include_chart, StageTimer(),
+                    cache_key, store.stale_seconds_for(data_source)
+                ):
+                    pass
+                return db_query.status == QueryStatus.COMPLETED
+        except Exception as e:
+            logger.warning(f"Background refresh of insight {cache_key[:16]} failed: {e}")
+            return False
+        finally:
+            await store.release(cache_key)
+
+    async def _cached_stages(
+        self,
+        db: DBSession,
+        db_query: Query,
+        insight: Insight,
+        include_chart: bool,
+        timer: StageTimer
+    ) -> AsyncIterator[StageEvent]:
+        """Answer from a cached insight, emitting the same events as a fresh run."""
+        payload = insight.payload
+        results = insight.results
+        db_query.intent = payload.get("intent")
+        db_query.entities = payload.get("entities")
+        db_query.generated_sql = payload.get("generated_sql")
+        # Shares the computing run's data_ref; result blobs are never deleted (see result_store)
+        db_query.results = results
+        db_query.status = QueryStatus.CACHED
+        await self._mark_progress(db, db_query, STAGE_NARRATIVE, timer)
+
+        yield StageEvent(STAGE_INTENT, {"intent": db_query.intent, **(db_query.entities or {})})
+        yield StageEvent(STAGE_SQL, {"sql": db_query.generated_sql, "explanation": payload.get("explanation")})
+        data_ref = results.get("data_ref")
+        yield StageEvent(STAGE_DATA, {
+            "columns": payload.get("columns", []),
+            "row_count": data_ref["row_count"] if data_ref else len(results.get("data") or []),
+            "rows": payload.get("preview", [])
+        })
+        yield StageEvent(STAGE_STATS, results.get("stats") or {})
+        if include_chart:
+            yield StageEvent(STAGE_CHART, results.get("chart") or {})
+        yield StageEvent(STAGE_NARRATIVE, results.get("narrative"))
+
+    async def _cache_insight(
+        self,
+        db: DBSession,
+        db_query: Query,
+        data_source: DataSource,
+        cache_key: str,
+        sql_result: Dict[str, Any],
+        df,
+        results_dict,
+        timer: StageTimer,
+        stale_seconds: int = 0
+    ) -> None:
+        """Store a completed run's answer; a failed write only costs the next run a recompute."""
+        payload = {
+            "intent": db_query.intent,
+            "entities": db_query.entities,
+            "generated_sql": db_query.generated_sql,
+            "explanation": sql_result.get("explanation"),
+            "columns": [str(c) for c in df.columns],
+            "preview": results_dict[:PREVIEW_ROWS],
+            "results": db_query.results
+        }
+        try:
+            with timer.stage(TIMING_CACHE_WRITE):
+                await self.insight_store.put(
+                    db, cache_key, db_query.natural_language_query, data_source, payload, timer.total_ms,
+                    stale_seconds
+                )
+        except Exception as e:
+            logger.warning(f"Could not cache insight for query {db_query.id}: {e}")
+
+    async def _follow_up_stages(
+        self,
+        db: DBSession,
+        db_query: Query,
+        parent: Query,
+        follow_up: FollowUpResult,
+        include_chart: bool,
+        timer: StageTimer
+    ) -> AsyncIterator[StageEvent]:
+        """Finish a follow-up answered from the parent's result set."""
+        df = follow_up.df
+        db_query.intent = FOLLOW_UP_INTENT
+        db_query.entities = {"operations": [op.describe() for op in follow_up.operations]}
+        await self._mark_progress(db, db_query, STAGE_INTENT, timer)
+        yield StageEvent(STAGE_INTENT, {"intent": FOLLOW_UP_INTENT, "parent_query_id": str(parent.id), **db_query.entities})
+
+        data_ref, results_dict = await self._store_frame(db_query, df, timer)
+        await self._mark_progress(db, db_query, STAGE_DATA, timer)
+        yield _data_event(df, results_dict)
+
+        with timer.stage(TIMING_STATS):
+            stats = self.stats_engine.calculate_summary_stats(df)
+        await self._mark_progress(db, db_query, STAGE_STATS, timer)
+        yield StageEvent(STAGE_STATS, stats)
+
+        chart = None
+        if include_chart:
+            with timer.stage(TIMING_CHART):
+                chart = await asyncio.to_thread(self._build_chart, df)
+            await self._mark_progress(db, db_query, STAGE_CHART, timer)
+            yield StageEvent(STAGE_CHART, chart)
+
+        narrative = {
+            "summary": follow_up.summary,
+            "key_points": [op.describe() for op in follow_up.operations]
+        }
+        _set_results(db_query, stats, narrative, data_ref, results_dict, chart)
+        await self._mark_progress(db, db_query, STAGE_NARRATIVE, timer)
+        yield StageEvent(STAGE_NARRATIVE, narrative)
+
+    async def _store_frame(self, db_query: Query, df, timer: StageTimer):
+        """
+        Convert a result frame for Query.results.
+
+        Large results go to the blob store; only a pointer stays on the row.
+
+        Returns:
+            (data_ref or None, rows to keep inline, or a preview when offloaded)
+        """
+        trace = current_trace()
+        if trace is not None:
+            trace.record_result(db_query.generated_sql, df)
+
+        data_ref = None
+        if self.result_store.should_offload(df):
+            with timer.stage(TIMING_RESULT_STORAGE):
+                data_ref = await asyncio.to_thread(self.result_store.save, str(db_query.id), df)
+        with timer.stage(TIMING_RESULT_CONVERSION):
+            results_dict = df.head(PREVIEW_ROWS).to_dict(orient="records") if data_ref else df.to_dict(orient="records")
+        return data_ref, results_dict
+
+    def _build_chart(self, df) -> Dict[str, Any]:
+        """Plot the first numeric column against the first other column."""
+        numeric_cols = list(df.select_dtypes(include=["number"]).columns)
+        other_cols = [c for c in df.columns if c not in numeric_cols]
+        if df.empty or not numeric_cols or not other_cols:
+            return {}
+        x_col, y_col = other_cols[0], numeric_cols[0]
+        chart_type = self.chart_generator.recommend_chart_type(df, x_col, y_col)
+        return self.chart_generator.generate_chart(df, chart_type, x_col, y_col)
+
+    @staticmethod
+    async def _mark_progress(db: DBSession, db_query: Query, stage: str, timer: StageTimer) -> None:
+        """Record a completed stage and the timings so far on the row, and commit."""
+        progress = db_query.progress if isinstance(db_query.progress, dict) else {}
+        completed = list(progress.get("completed", []))
+        if stage not in (STAGE_FAILED, STAGE_CANCELLED):
+            completed.append(stage)
+        db_query.progress = {
+            "stage": stage,
+            "completed": completed,
+            "updated_at": datetime.utcnow().isoformat()
+        }
+        db_query.stage_timings = timer.as_dict()
+        db_query.execution_time_ms = timer.total_ms
+        await _commit(db)
+
+
+def _answers(insight: Optional[Insight], include_chart: bool) -> bool:
+    """Whether a cached insight can answer the run; streams want a chart, so one cached without it is recomputed."""
+    return insight is not None and (not include_chart or "chart" in insight.results)
+
+
+def _data_event(df, results_dict) -> StageEvent:
+    return StageEvent(STAGE_DATA, {
+        "columns": [str(c) for c in df.columns],
+        "row_count": len(df),
+        "rows": results_dict[:PREVIEW_ROWS]
+    })
+
+
+def _set_results(db_query: Query, stats, narrative, data_ref, results_dict, chart) -> None:
+    """Store the final results on the row and mark it completed."""
+    db_query.results = {
+        "stats": stats,
+        "narrative": narrative
+    }
+    if data_ref:
+        db_query.results["data_ref"] = data_ref
+    else:
+        db_query.results["data"] = results_dict
+    if chart is not None:
+        db_query.results["chart"] = chart
+    db_query.status = QueryStatus.COMPLETED
+
+
+async def _get(db: DBSession, model: Any, ident: Any) -> Any:
+    """Load a row by primary key with either session type."""
+    result = db.get(model, ident)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+async def _commit(db: DBSession) -> None:
+    """Commit either session type."""
+    result = db.commit()
+    if inspect.isawaitable(result):
+        await result
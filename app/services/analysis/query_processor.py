@@ -1,7 +1,10 @@
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from app.core.config import settings
 from app.services.llm.factory import LLMFactory
+from app.services.llm.router import ROUTE_INTENT
 from app.services.analysis.prompts import QUERY_CLASSIFICATION_PROMPT
+from app.services.analysis.intent_classifier import RuleBasedIntentClassifier, intent_stats
 
 class QueryIntent(BaseModel):
     """Structured representation of user query intent."""
@@ -11,27 +14,61 @@ class QueryIntent(BaseModel):
     time_range: Optional[str] = None
     filters: Dict[str, Any] = {}
     complexity: str
+    aggregation: Optional[str] = None  # sum, avg, count, min or max when the question names one
 
 class QueryProcessor:
     """Service for processing and understanding user queries."""
     
     def __init__(self):
-        self.llm = LLMFactory.get_provider()
+        self.llm = LLMFactory.get_router()
+        self.classifier = RuleBasedIntentClassifier()
         
-    async def analyze_query(self, user_query: str) -> QueryIntent:
+    async def analyze_query(
+        self, 
+        user_query: str, 
+        schema_context: Optional[Dict[str, Any]] = None,
+        schema_version: Optional[str] = None,
+        semantic_model: Optional[Dict[str, Any]] = None
+    ) -> QueryIntent:
         """
         Analyze a natural language query to extract intent and entities.
         
+        When a schema is given, the rule-based classifier runs first and its
+        result is used directly if confident enough; otherwise the LLM is called.
+        
         Args:
             user_query: The user's natural language question
+            schema_context: Optional data source schema_metadata for the fast path
+            schema_version: Optional cache key for the schema vocabulary
+            semantic_model: Optional semantic layer whose metric and dimension
+                names extend the fast-path vocabulary
             
         Returns:
             QueryIntent object with structured analysis
         """
+        if schema_context and settings.INTENT_FAST_PATH_ENABLED:
+            result = self.classifier.classify(user_query, schema_context, schema_version, semantic_model)
+            if result and result.confidence >= settings.INTENT_FAST_PATH_MIN_CONFIDENCE:
+                intent_stats.record(fast_path=True)
+                return QueryIntent(**result.fields)
+            intent_stats.record(fast_path=False)
+        
         response = await self.llm.generate_json(
             prompt=f"Analyze this query: '{user_query}'",
             system_prompt=QUERY_CLASSIFICATION_PROMPT,
-            temperature=0.1  # Low temperature for consistent extraction
+            temperature=0.1,  # Low temperature for consistent extraction
+            cache_system_prompt=True,
+            route=ROUTE_INTENT,
+            validator=_is_valid_intent
         )
         
         return QueryIntent(**response)
+
+
+def _is_valid_intent(response: Dict[str, Any]) -> bool:
+    """Check that an LLM response parses into a QueryIntent."""
+    try:
+        QueryIntent(**response)
+        return True
+    except (ValidationError, TypeError):
+        return False
@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-from scipy import stats
 from typing import Dict, Any, List, Optional, Tuple
 
 class StatsEngine:
@@ -36,7 +35,8 @@ class StatsEngine:
             x = dates.map(pd.Timestamp.toordinal)
             y = df[value_col]
             
-            # Perform linear regression
+            # Perform linear regression (scipy is imported on first use)
+            from scipy import stats
             slope, intercept, r_value, p_value, std_err = stats.linregress(x, y)
             
             # Determine direction
@@ -92,6 +92,7 @@ class StatsEngine:
         values = df[value_col].dropna()
         
         if method == 'zscore':
+            from scipy import stats
             z_scores = np.abs(stats.zscore(values))
             anomaly_indices = np.where(z_scores > threshold)[0]
             
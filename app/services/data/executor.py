@@ -1,7 +1,11 @@
+import asyncio
+import threading
+from collections import OrderedDict
 import pandas as pd
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import SQLAlchemyError
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 from app.models.data_source import DataSource
 from app.utils.encryption import EncryptionService
 from app.core.config import settings
@@ -9,6 +13,13 @@ from app.core.config import settings
 class QueryExecutor:
     """Service for executing SQL queries against data sources."""
     
+    # Engines (and their connection pools) shared by every executor, keyed by connection string
+    ENGINE_CACHE_MAX_ENTRIES = 32
+    _engines: "OrderedDict[str, Engine]" = OrderedDict()
+    _engines_lock = threading.Lock()
+    # Decrypted connection strings keyed by data source version (id and updated_at)
+    _connection_strings: "OrderedDict[str, str]" = OrderedDict()
+    
     def __init__(self):
         self.encryption_service = EncryptionService()
         
@@ -16,6 +27,9 @@ class QueryExecutor:
         """
         Execute SQL query against a data source.
         
+        The query runs in a worker thread on a pooled engine for the source,
+        so concurrent queries do not block the event loop.
+        
         Args:
             sql: The SQL query to execute
             data_source: The DataSource model instance
@@ -24,37 +38,77 @@ class QueryExecutor:
             Pandas DataFrame with results
         """
         # Get connection string
-        connection_string = self._get_connection_string(data_source)
+        connection_string = self.get_connection_string(data_source)
         
         try:
-            # Create engine for this specific data source
-            # Note: In a production environment, we should cache these engines
-            # or use a connection pool manager
-            engine = create_engine(connection_string)
-            
-            # Execute query using pandas
-            with engine.connect() as connection:
-                df = pd.read_sql_query(text(sql), connection)
-                
-            return df
+            engine = self.get_engine(connection_string)
+            return await asyncio.to_thread(self._read_sql, engine, sql)
             
         except SQLAlchemyError as e:
             raise Exception(f"Database execution error: {str(e)}")
         except Exception as e:
             raise Exception(f"Query execution failed: {str(e)}")
+    
+    @staticmethod
+    def _read_sql(engine: Engine, sql: str) -> pd.DataFrame:
+        with engine.connect() as connection:
+            return pd.read_sql_query(text(sql), connection)
+    
+    @classmethod
+    def get_engine(cls, connection_string: str) -> Engine:
+        """Return the cached engine for a connection string, creating it on first use."""
+        with cls._engines_lock:
+            engine = cls._engines.get(connection_string)
+            if engine is not None:
+                cls._engines.move_to_end(connection_string)
+                return engine
+            engine = create_engine(connection_string, pool_pre_ping=True)
+            cls._engines[connection_string] = engine
+            if len(cls._engines) > cls.ENGINE_CACHE_MAX_ENTRIES:
+                _, evicted = cls._engines.popitem(last=False)
+                evicted.dispose()
+            return engine
+    
+    @classmethod
+    def dispose_engines(cls) -> None:
+        """Close every cached engine's pool."""
+        with cls._engines_lock:
+            for engine in cls._engines.values():
+                engine.dispose()
+            cls._engines.clear()
+            cls._connection_strings.clear()
+    
+    def get_connection_string(self, data_source: DataSource) -> str:
+        """Connection string for a data source, decrypted once per source version."""
+        if data_source.id is None or data_source.updated_at is None:
+            return self._get_connection_string(data_source)
+        
+        key = data_source.schema_version
+        cache = QueryExecutor._connection_strings
+        with self._engines_lock:
+            cached = cache.get(key)
+            if cached is not None:
+                cache.move_to_end(key)
+                return cached
+        
+        connection_string = self._get_connection_string(data_source)
+        with self._engines_lock:
+            cache[key] = connection_string
+            if len(cache) > self.ENGINE_CACHE_MAX_ENTRIES:
+                cache.popitem(last=False)
+        return connection_string
             
     def _get_connection_string(self, data_source: DataSource) -> str:
         """Construct SQLAlchemy connection string from data source config."""
-        config = data_source.connection_config
+        # Copy so merged credentials never end up on the model
+        config = dict(data_source.connection_config or {})
         
         # Check if credentials are encrypted
         if "encrypted" in config:
-            decrypted = self.encryption_service.decrypt_credentials(config["encrypted"])
+            decrypted = self.encryption_service.decrypt(config["encrypted"])
             # Merge decrypted credentials with config
             # This assumes decrypted is a dict of credentials
-            # In reality, we might need to parse the decrypted string
-            # For this implementation, let's assume decrypt_credentials returns a dict
-            # But wait, the encryption service returns a string (JSON dump likely)
+            # The encryption service returns a string (a JSON dump, or a bare connection string)
             import json
             try:
                 creds = json.loads(decrypted)
@@ -76,3 +130,34 @@ class QueryExecutor:
             return f"sqlite:///{config.get('path')}"
         
         raise ValueError(f"Unsupported data source type for direct SQL execution: {source_type}")
+
+
+class SharedQueryExecutor:
+    """
+    Wraps a QueryExecutor so identical SQL against the same source runs once.
+
+    Used for one batch of questions: the first caller executes, concurrent and
+    later callers with the same (source, SQL) get a copy of its result.
+    """
+    
+    def __init__(self, executor: QueryExecutor):
+        self.executor = executor
+        self._results: Dict[Tuple[str, str], "asyncio.Future[pd.DataFrame]"] = {}
+        self.executions = 0
+        
+    async def execute_query(self, sql: str, data_source: DataSource) -> pd.DataFrame:
+        key = (str(data_source.id), _normalize_sql(sql))
+        future = self._results.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.executor.execute_query(sql, data_source))
+            self._results[key] = future
+            self.executions += 1
+        # Shielded so one cancelled caller does not cancel the shared execution
+        df = await asyncio.shield(future)
+        return df.copy()
+
+
+def _normalize_sql(sql: str) -> str:
+    """Deduplication key for a query: as written, minus outer whitespace and a trailing semicolon."""
+    # Inner whitespace is kept; it may be part of a string literal
+    return sql.strip().rstrip(";").strip()
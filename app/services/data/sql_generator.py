@@ -1,36 +1,59 @@
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 from app.services.llm.factory import LLMFactory
-from app.services.analysis.prompts import SQL_GENERATION_PROMPT
+from app.services.llm.router import ROUTE_SQL
+from app.services.analysis.prompts import SQL_GENERATION_SYSTEM_PROMPT, SQL_GENERATION_USER_PROMPT
 from app.services.data.sql_validator import SQLValidator
 
 class SQLGenerator:
     """Service for generating SQL from natural language."""
     
+    # Formatted schema strings keyed by data source version. Shared by all
+    # instances so the cacheable prompt prefix is built once per version.
+    SCHEMA_CACHE_MAX_ENTRIES = 256
+    _schema_cache: "OrderedDict[str, str]" = OrderedDict()
+    
     def __init__(self):
-        self.llm = LLMFactory.get_provider()
+        self.llm = LLMFactory.get_router()
         
-    async def generate_sql(self, user_query: str, schema_context: Dict[str, Any]) -> Dict[str, Any]:
+    async def generate_sql(
+        self, 
+        user_query: str, 
+        schema_context: Dict[str, Any],
+        schema_version: Optional[str] = None,
+        complexity: Optional[str] = None,
+        intent: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Generate SQL query from natural language.
         
         Args:
             user_query: The user's question
             schema_context: Dictionary describing tables and columns
+            schema_version: Optional data source version used to memoize the
+                formatted schema (see DataSource.schema_version)
+            complexity: Optional QueryIntent.complexity used for model routing
+            intent: Optional QueryIntent.intent used for model routing
             
         Returns:
             Dictionary with 'sql', 'explanation', and 'can_answer'
         """
-        # Format schema context as string for prompt
-        schema_str = self._format_schema(schema_context)
-        
-        prompt = SQL_GENERATION_PROMPT.format(
-            schema_context=schema_str,
-            user_query=user_query
+        # Static prefix (rules + schema) goes in the system prompt so it is
+        # identical for every question against the same data source version
+        system_prompt = SQL_GENERATION_SYSTEM_PROMPT.format(
+            schema_context=self.get_schema_prompt(schema_context, schema_version)
         )
+        prompt = SQL_GENERATION_USER_PROMPT.format(user_query=user_query)
         
         response = await self.llm.generate_json(
             prompt=prompt,
-            temperature=0.1  # Low temperature for precise SQL
+            system_prompt=system_prompt,
+            temperature=0.1,  # Low temperature for precise SQL
+            cache_system_prompt=True,
+            route=ROUTE_SQL,
+            complexity=complexity,
+            intent=intent,
+            validator=_is_usable_sql
         )
         
         # Validate generated SQL
@@ -44,6 +67,32 @@ class SQLGenerator:
                 }
                 
         return response
+    
+    def get_schema_prompt(self, schema: Dict[str, Any], schema_version: Optional[str] = None) -> str:
+        """
+        Return the formatted schema, memoized per data source version.
+        
+        Args:
+            schema: Dictionary describing tables and columns
+            schema_version: Cache key for this schema; formatting is not cached without one
+            
+        Returns:
+            Formatted schema string
+        """
+        if schema_version is None:
+            return self._format_schema(schema)
+        
+        cache = SQLGenerator._schema_cache
+        cached = cache.get(schema_version)
+        if cached is not None:
+            cache.move_to_end(schema_version)
+            return cached
+        
+        formatted = self._format_schema(schema)
+        cache[schema_version] = formatted
+        if len(cache) > self.SCHEMA_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+        return formatted
         
     def _format_schema(self, schema: Dict[str, Any]) -> str:
         """Format schema dictionary into a readable string for the LLM."""
@@ -66,3 +115,12 @@ class SQLGenerator:
             output.append("")
             
         return "\n".join(output)
+
+
+def _is_usable_sql(response: Dict[str, Any]) -> bool:
+    """Check that an LLM response contains answerable, safe SQL."""
+    return (
+        isinstance(response, dict)
+        and bool(response.get("can_answer"))
+        and SQLValidator.validate_sql(response.get("sql"))
+    )
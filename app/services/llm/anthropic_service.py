@@ -1,24 +1,51 @@
 import json
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 import anthropic
+import httpx
 from app.core.config import settings
 from app.services.llm.base import LLMProvider
 
 class AnthropicService(LLMProvider):
     """Anthropic implementation of LLMProvider."""
 
-    def __init__(self):
-        """Initialize Anthropic client."""
+    def __init__(self, model: Optional[str] = None):
+        """
+        Initialize Anthropic client.
+        
+        Args:
+            model: Optional model override (defaults to ANTHROPIC_MODEL)
+        """
         self.client = anthropic.AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
-        self.model = settings.ANTHROPIC_MODEL
+        self.model = model or settings.ANTHROPIC_MODEL
         self.default_max_tokens = settings.ANTHROPIC_MAX_TOKENS
+        self.prompt_caching = settings.ANTHROPIC_PROMPT_CACHING
+
+    async def warm_up(self) -> None:
+        """List models once so the client pool holds an open TLS connection."""
+        await self.client.with_options(max_retries=0).get("/v1/models", cast_to=httpx.Response)
+
+    def _system_param(self, system_prompt: str, cache: bool) -> Union[str, List[Dict[str, Any]]]:
+        """
+        Build the `system` parameter, adding a cache breakpoint when requested.
+        
+        Anthropic caches everything up to and including a block marked with
+        `cache_control`, so the static system prompt is sent as a single block.
+        """
+        if not (cache and self.prompt_caching):
+            return system_prompt
+        return [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"}
+        }]
 
     async def generate_text(
         self, 
         prompt: str, 
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
     ) -> str:
         """Generate text using Anthropic Claude."""
         kwargs = {
@@ -28,7 +55,7 @@ class AnthropicService(LLMProvider):
         }
         
         if system_prompt:
-            kwargs["system"] = system_prompt
+            kwargs["system"] = self._system_param(system_prompt, cache_system_prompt)
             
         if temperature is not None:
             kwargs["temperature"] = temperature
@@ -41,7 +68,8 @@ class AnthropicService(LLMProvider):
         prompt: str, 
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
     ) -> Dict[str, Any]:
         """Generate JSON using Anthropic."""
         # Append instruction to ensure JSON output
@@ -54,7 +82,7 @@ class AnthropicService(LLMProvider):
         }
         
         if system_prompt:
-            kwargs["system"] = system_prompt
+            kwargs["system"] = self._system_param(system_prompt, cache_system_prompt)
             
         if temperature is not None:
             kwargs["temperature"] = temperature
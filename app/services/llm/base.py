@@ -10,7 +10,8 @@ class LLMProvider(ABC):
         prompt: str, 
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
     ) -> str:
         """
         Generate text response from the LLM.
@@ -20,6 +21,8 @@ class LLMProvider(ABC):
             system_prompt: Optional system instruction
             temperature: Optional temperature override
             max_tokens: Optional max tokens override
+            cache_system_prompt: Mark the system prompt as a cacheable prefix
+                where the provider supports explicit cache hints
             
         Returns:
             Generated text string
@@ -32,7 +35,8 @@ class LLMProvider(ABC):
         prompt: str, 
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
     ) -> Dict[str, Any]:
         """
         Generate structured JSON response from the LLM.
@@ -42,6 +46,8 @@ class LLMProvider(ABC):
             system_prompt: Optional system instruction
             temperature: Optional temperature override
             max_tokens: Optional max tokens override
+            cache_system_prompt: Mark the system prompt as a cacheable prefix
+                where the provider supports explicit cache hints
             
         Returns:
             Parsed JSON dictionary
@@ -67,3 +73,7 @@ class LLMProvider(ABC):
             Generated text response
         """
         pass
+
+    async def warm_up(self) -> None:
+        """Open a connection to the provider ahead of the first call (no-op by default)."""
+        return None
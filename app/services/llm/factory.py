@@ -1,24 +1,48 @@
 from app.core.config import settings
 from app.services.llm.base import LLMProvider
-from app.services.llm.openai_service import OpenAIService
-from app.services.llm.anthropic_service import AnthropicService
+from app.services.llm.router import ModelRouter, TIER_FAST, TIER_STRONG
 
 class LLMFactory:
     """Factory for creating LLM provider instances."""
     
     @staticmethod
-    def get_provider() -> LLMProvider:
+    def get_provider(tier: str = TIER_STRONG) -> LLMProvider:
         """
         Get the configured LLM provider instance.
         
+        Args:
+            tier: Model tier, 'strong' (default) or 'fast'
+            
         Returns:
-            Instance of LLMProvider (OpenAI or Anthropic)
+            Instance of LLMProvider (OpenAI, Anthropic or the local fake)
         """
         provider = settings.LLM_PROVIDER.lower()
         
+        # SDKs are imported only for the provider in use
         if provider == "openai":
-            return OpenAIService()
+            from app.services.llm.openai_service import OpenAIService
+            model = settings.OPENAI_FAST_MODEL if tier == TIER_FAST else settings.OPENAI_MODEL
+            return OpenAIService(model=model)
         elif provider == "anthropic":
-            return AnthropicService()
+            from app.services.llm.anthropic_service import AnthropicService
+            model = settings.ANTHROPIC_FAST_MODEL if tier == TIER_FAST else settings.ANTHROPIC_MODEL
+            return AnthropicService(model=model)
+        elif provider == "fake":
+            from app.services.llm.fake_service import FakeLLMService
+            return FakeLLMService(model=f"fake-{tier}")
         else:
             raise ValueError(f"Unsupported LLM provider: {provider}")
+    
+    @staticmethod
+    def get_router() -> ModelRouter:
+        """
+        Get a router that picks the fast or strong model per call.
+        
+        Returns:
+            ModelRouter wrapping a fast and a strong provider instance
+        """
+        return ModelRouter(
+            fast=LLMFactory.get_provider(TIER_FAST),
+            strong=LLMFactory.get_provider(TIER_STRONG),
+            enabled=settings.LLM_ROUTING_ENABLED
+        )
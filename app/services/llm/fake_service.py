@@ -0,0 +1,246 @@
+import asyncio
+import json
+import random
+import re
+from typing import Dict, Any, Optional, List
+from app.core.config import settings
+from app.services.llm.base import LLMProvider
+from app.services.analysis.prompts import (
+    QUERY_CLASSIFICATION_PROMPT,
+    SQL_GENERATION_SYSTEM_PROMPT,
+    DATA_ANALYSIS_SYSTEM_PROMPT
+)
+
+# Schema the rule-based responses are designed around. Load tests should seed
+# their data source with this schema_metadata.
+FAKE_FIXTURE_SCHEMA = {
+    "sales": {
+        "description": "One row per order line",
+        "columns": [
+            {"name": "order_date", "type": "DATE"},
+            {"name": "region", "type": "TEXT"},
+            {"name": "product", "type": "TEXT"},
+            {"name": "channel", "type": "TEXT"},
+            {"name": "revenue", "type": "DECIMAL"},
+            {"name": "units", "type": "INTEGER"}
+        ]
+    }
+}
+
+NUMERIC_TYPE_PATTERN = re.compile(r"INT|DEC|NUM|FLOAT|REAL|DOUBLE|MONEY", re.IGNORECASE)
+
+# Everything before the schema in the SQL system prompt is constant
+_SQL_PROMPT_PREFIX = SQL_GENERATION_SYSTEM_PROMPT.split("{schema_context}")[0].replace("{{", "{").replace("}}", "}")
+
+
+class FakeLLMError(RuntimeError):
+    """Injected provider failure."""
+
+
+class FakeLLMService(LLMProvider):
+    """
+    Deterministic local LLMProvider for load testing and offline profiling.
+
+    Produces rule-generated intent, SQL and narrative JSON shaped like the real
+    providers' output, with a configurable latency/throughput model and
+    injectable failures. Select it with LLM_PROVIDER=fake.
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        latency_ms: Optional[float] = None,
+        jitter_ms: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        failure_rate: Optional[float] = None,
+        failure_mode: Optional[str] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the fake provider. Unset arguments fall back to FAKE_LLM_* settings.
+
+        Args:
+            model: Model name reported for this instance
+            latency_ms: Fixed latency before the first token
+            jitter_ms: Upper bound of uniform random latency added per call
+            tokens_per_second: Output throughput; 0 disables the throughput term
+            failure_rate: Probability (0-1) that a call fails
+            failure_mode: 'error' raises FakeLLMError, 'malformed' returns unparseable output
+            seed: Seed for the jitter and failure random stream
+        """
+        self.model = model or "fake"
+        self.latency_ms = settings.FAKE_LLM_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = settings.FAKE_LLM_JITTER_MS if jitter_ms is None else jitter_ms
+        self.tokens_per_second = settings.FAKE_LLM_TOKENS_PER_SECOND if tokens_per_second is None else tokens_per_second
+        self.failure_rate = settings.FAKE_LLM_FAILURE_RATE if failure_rate is None else failure_rate
+        self.failure_mode = failure_mode or settings.FAKE_LLM_FAILURE_MODE
+        self.rng = random.Random(settings.FAKE_LLM_SEED if seed is None else seed)
+
+    async def generate_text(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
+    ) -> str:
+        """Generate the JSON response as text."""
+        content = json.dumps(self._respond(prompt, system_prompt))
+        return await self._deliver(content)
+
+    async def generate_json(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
+    ) -> Dict[str, Any]:
+        """Generate a rule-based JSON response."""
+        content = await self._deliver(json.dumps(self._respond(prompt, system_prompt)))
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            raise ValueError(f"Failed to parse JSON response: {content}")
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Generate chat completion from the last user message."""
+        system_prompt = next((m["content"] for m in messages if m["role"] == "system"), None)
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] != "system"), "")
+        return await self.generate_text(prompt, system_prompt=system_prompt)
+
+    async def _deliver(self, content: str) -> str:
+        """Apply the latency model and failure injection to a response."""
+        delay_ms = self.latency_ms
+        if self.jitter_ms:
+            delay_ms += self.rng.uniform(0, self.jitter_ms)
+        if self.tokens_per_second:
+            # Rough token estimate: ~4 characters per token
+            delay_ms += (len(content) / 4) / self.tokens_per_second * 1000
+        fail = self.failure_rate > 0 and self.rng.random() < self.failure_rate
+
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+
+        if fail:
+            if self.failure_mode == "malformed":
+                return content[: len(content) // 2]
+            raise FakeLLMError(f"Injected failure from fake LLM provider ({self.model})")
+        return content
+
+    def _respond(self, prompt: str, system_prompt: Optional[str]) -> Dict[str, Any]:
+        """Dispatch to a rule-based responder based on which pipeline prompt was used."""
+        system_prompt = system_prompt or ""
+        if system_prompt == QUERY_CLASSIFICATION_PROMPT:
+            return self._classify(_extract_question(prompt))
+        if system_prompt.startswith(_SQL_PROMPT_PREFIX):
+            return self._generate_sql(_extract_question(prompt), system_prompt[len(_SQL_PROMPT_PREFIX):])
+        if system_prompt == DATA_ANALYSIS_SYSTEM_PROMPT:
+            return self._narrate(_extract_question(prompt))
+        return {"response": f"Fake response from {self.model}"}
+
+    def _classify(self, question: str) -> Dict[str, Any]:
+        """Keyword-based intent classification against the fixture schema."""
+        q = question.lower()
+        if q.startswith("why") or " why " in q:
+            intent = "DIAGNOSTIC"
+        elif any(word in q for word in ("forecast", "predict", "will ")):
+            intent = "PREDICTIVE"
+        elif any(word in q for word in ("should", "improve", "recommend")):
+            intent = "PRESCRIPTIVE"
+        elif any(word in q for word in ("compare", " vs ", "versus")):
+            intent = "COMPARATIVE"
+        elif any(word in q for word in ("trend", "over time", "changing")):
+            intent = "TREND"
+        else:
+            intent = "DESCRIPTIVE"
+
+        columns = FAKE_FIXTURE_SCHEMA["sales"]["columns"]
+        metrics = [c["name"] for c in columns if NUMERIC_TYPE_PATTERN.search(c["type"]) and c["name"] in q]
+        dimensions = [c["name"] for c in columns if not NUMERIC_TYPE_PATTERN.search(c["type"]) and c["name"] in q]
+        time_match = re.search(r"\b(last|this|previous) (week|month|quarter|year)\b", q)
+
+        if intent == "DIAGNOSTIC":
+            complexity = "complex"
+        elif len(dimensions) <= 1:
+            complexity = "simple"
+        else:
+            complexity = "moderate"
+
+        return {
+            "intent": intent,
+            "metrics": metrics or ["revenue"],
+            "dimensions": dimensions,
+            "time_range": time_match.group(0) if time_match else None,
+            "filters": {},
+            "complexity": complexity
+        }
+
+    def _generate_sql(self, question: str, schema_text: str) -> Dict[str, Any]:
+        """Build a single-table aggregate query from the formatted schema in the prompt."""
+        tables = _parse_schema(schema_text)
+        if not tables:
+            return {"sql": "", "explanation": "No tables in schema", "can_answer": False}
+
+        q = question.lower()
+        table, columns = next(iter(tables.items()))
+        numeric = [name for name, col_type in columns if NUMERIC_TYPE_PATTERN.search(col_type)]
+        other = [name for name, _ in columns if name not in numeric]
+        if not numeric:
+            return {"sql": "", "explanation": f"No numeric columns in {table}", "can_answer": False}
+
+        metric = next((c for c in numeric if c in q), numeric[0])
+        by_match = re.search(r"\bby (\w+)", q)
+        dimension = next((c for c in other if by_match and c == by_match.group(1)), None)
+        dimension = dimension or next((c for c in other if c in q), None)
+
+        if dimension:
+            sql = (
+                f"SELECT {dimension}, SUM({metric}) AS total_{metric} FROM {table} "
+                f"GROUP BY {dimension} ORDER BY total_{metric} DESC LIMIT 100"
+            )
+            explanation = f"Sum of {metric} grouped by {dimension}"
+        else:
+            sql = f"SELECT SUM({metric}) AS total_{metric} FROM {table}"
+            explanation = f"Total {metric}"
+        return {"sql": sql, "explanation": explanation, "can_answer": True}
+
+    def _narrate(self, question: str) -> Dict[str, Any]:
+        """Canned narrative that echoes the question."""
+        return {
+            "summary": f"Synthetic answer to: {question}",
+            "narrative": "This narrative was generated by the fake LLM provider for load testing.",
+            "key_points": ["Synthetic key point"],
+            "recommendation": None
+        }
+
+
+def _extract_question(prompt: str) -> str:
+    """Pull the user question out of a pipeline user prompt."""
+    match = re.search(r"User Question: (.*)", prompt)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r"Analyze this query: '(.*)'", prompt, re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    return prompt.strip()
+
+
+def _parse_schema(schema_text: str) -> Dict[str, List[tuple]]:
+    """Parse the SQLGenerator schema format back into {table: [(column, type)]}."""
+    tables: Dict[str, List[tuple]] = {}
+    current = None
+    for line in schema_text.splitlines():
+        table_match = re.match(r"Table: (\S+)", line)
+        if table_match:
+            current = tables.setdefault(table_match.group(1), [])
+            continue
+        col_match = re.match(r"\s+- (\S+) \(([^)]*)\)", line)
+        if col_match and current is not None:
+            current.append((col_match.group(1), col_match.group(2)))
+    return tables
@@ -5,21 +5,36 @@ from app.core.config import settings
 from app.services.llm.base import LLMProvider
 
 class OpenAIService(LLMProvider):
-    """OpenAI implementation of LLMProvider."""
+    """
+    OpenAI implementation of LLMProvider.
+    
+    OpenAI caches long prompt prefixes automatically, so `cache_system_prompt`
+    needs no request changes here: the system message is always sent first.
+    """
 
-    def __init__(self):
-        """Initialize OpenAI client."""
+    def __init__(self, model: Optional[str] = None):
+        """
+        Initialize OpenAI client.
+        
+        Args:
+            model: Optional model override (defaults to OPENAI_MODEL)
+        """
         self.client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        self.model = settings.OPENAI_MODEL
+        self.model = model or settings.OPENAI_MODEL
         self.default_temperature = settings.OPENAI_TEMPERATURE
         self.default_max_tokens = settings.OPENAI_MAX_TOKENS
 
+    async def warm_up(self) -> None:
+        """List models once so the client pool holds an open TLS connection."""
+        await self.client.with_options(max_retries=0).models.list()
+
     async def generate_text(
         self, 
         prompt: str, 
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
     ) -> str:
         """Generate text using OpenAI."""
         messages = []
@@ -41,7 +56,8 @@ class OpenAIService(LLMProvider):
         prompt: str, 
         system_prompt: Optional[str] = None,
         temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
     ) -> Dict[str, Any]:
         """Generate JSON using OpenAI's json_object response format."""
         messages = []
@@ -0,0 +1,106 @@
+import asyncio
+import json
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.services.llm.base import LLMProvider
+
+
+class ReplayLLMError(RuntimeError):
+    """A recorded provider failure, or a call with no recorded response left."""
+
+
+class ReplayLLMService(LLMProvider):
+    """
+    LLMProvider that serves the responses recorded in an analysis trace.
+
+    A call gets the recorded response for the same method and prompts. When
+    the prompts no longer match, for example after a prompt template changed
+    or because the narrative prompt embeds a sample of replayed data, it gets
+    the next unused response recorded for the same method. Recorded failures
+    are raised again, and ValueError stays ValueError so the router still
+    escalates unparseable fast-tier responses.
+    """
+
+    def __init__(self, llm_calls: List[Dict[str, Any]], replay_latency: bool = False):
+        """
+        Args:
+            llm_calls: The trace's llm_calls, in the order they were made
+            replay_latency: Sleep for each call's recorded latency before answering
+        """
+        self.replay_latency = replay_latency
+        self._calls = list(llm_calls)
+        self._used = [False] * len(self._calls)
+        self._by_prompt: Dict[Tuple, Deque[int]] = defaultdict(deque)
+        for index, call in enumerate(self._calls):
+            self._by_prompt[_key(call["method"], call.get("request", {}))].append(index)
+        self.mismatches = 0
+
+    async def generate_text(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
+    ) -> str:
+        """Serve the recorded text response."""
+        response = await self._serve("generate_text", {"prompt": prompt, "system_prompt": system_prompt})
+        return response if isinstance(response, str) else json.dumps(response)
+
+    async def generate_json(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False
+    ) -> Dict[str, Any]:
+        """Serve the recorded JSON response."""
+        return await self._serve("generate_json", {"prompt": prompt, "system_prompt": system_prompt})
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Serve the recorded chat completion."""
+        return await self._serve("chat_completion", {"messages": messages})
+
+    async def _serve(self, method: str, request: Dict[str, Any]) -> Any:
+        index = self._take(method, request)
+        if index is None:
+            raise ReplayLLMError(f"No recorded {method} response left to replay")
+        call = self._calls[index]
+        if self.replay_latency and call.get("latency_ms"):
+            await asyncio.sleep(call["latency_ms"] / 1000)
+
+        error = call.get("error")
+        if error:
+            if error.get("type") == "ValueError":
+                raise ValueError(error.get("message"))
+            raise ReplayLLMError(f"{error.get('type')}: {error.get('message')}")
+        return call.get("response")
+
+    def _take(self, method: str, request: Dict[str, Any]) -> Optional[int]:
+        """Index of the recorded call to answer with, marked used."""
+        matches = self._by_prompt.get(_key(method, request))
+        while matches:
+            index = matches.popleft()
+            if not self._used[index]:
+                self._used[index] = True
+                return index
+
+        self.mismatches += 1
+        for index, call in enumerate(self._calls):
+            if not self._used[index] and call["method"] == method:
+                self._used[index] = True
+                return index
+        return None
+
+
+def _key(method: str, request: Dict[str, Any]) -> Tuple:
+    if method == "chat_completion":
+        return method, json.dumps(request.get("messages"), sort_keys=True)
+    return method, request.get("prompt"), request.get("system_prompt")
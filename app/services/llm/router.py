@@ -0,0 +1,267 @@
+"""
+Complexity-based routing between a fast and a strong model tier.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.core.tracing import current_trace
+from app.services.llm.base import LLMProvider
+
+logger = logging.getLogger(__name__)
+
+TIER_FAST = "fast"
+TIER_STRONG = "strong"
+
+# Routes used by the analysis pipeline
+ROUTE_INTENT = "intent"
+ROUTE_SQL = "sql"
+ROUTE_NARRATIVE = "narrative"
+ROUTE_DEFAULT = "default"
+
+# Routes that always use the fast tier (escalating only on failure)
+FAST_ROUTES = {ROUTE_INTENT}
+
+# Intents whose SQL and narratives need the strong model regardless of complexity
+STRONG_INTENTS = {"DIAGNOSTIC", "PREDICTIVE", "PRESCRIPTIVE"}
+
+
+class RouteStats:
+    """Thread-safe per-route, per-tier latency and success counters."""
+
+    LATENCY_WINDOW = 1000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "successes": 0, "failures": 0, "escalations": 0, "total_latency_ms": 0.0}
+        )
+        self._latencies: Dict[tuple, Deque[float]] = defaultdict(lambda: deque(maxlen=self.LATENCY_WINDOW))
+
+    def record(self, route: str, tier: str, latency_ms: float, success: bool, escalated: bool = False) -> None:
+        """Record the outcome of a single provider call."""
+        key = (route, tier)
+        with self._lock:
+            counters = self._counters[key]
+            counters["calls"] += 1
+            counters["successes" if success else "failures"] += 1
+            if escalated:
+                counters["escalations"] += 1
+            counters["total_latency_ms"] += latency_ms
+            self._latencies[key].append(latency_ms)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Get current statistics.
+
+        Returns:
+            Nested dict of route -> tier -> counters, success rate and latency percentiles.
+            `escalations` counts calls on the strong tier that were retries of a failed fast call.
+        """
+        import numpy as np
+        
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        with self._lock:
+            for (route, tier), counters in self._counters.items():
+                latencies = list(self._latencies[(route, tier)])
+                calls = counters["calls"]
+                result.setdefault(route, {})[tier] = {
+                    "calls": int(calls),
+                    "successes": int(counters["successes"]),
+                    "failures": int(counters["failures"]),
+                    "escalations": int(counters["escalations"]),
+                    "success_rate": counters["successes"] / calls if calls else None,
+                    "avg_latency_ms": counters["total_latency_ms"] / calls if calls else None,
+                    "p50_latency_ms": float(np.percentile(latencies, 50)) if latencies else None,
+                    "p95_latency_ms": float(np.percentile(latencies, 95)) if latencies else None,
+                }
+        return result
+
+    def reset(self) -> None:
+        """Clear all statistics."""
+        with self._lock:
+            self._counters.clear()
+            self._latencies.clear()
+
+
+# Process-wide statistics shared by every router instance
+route_stats = RouteStats()
+
+
+class ModelRouter(LLMProvider):
+    """
+    LLMProvider that dispatches each call to a fast or strong model.
+
+    Intent classification and simple descriptive questions go to the fast tier;
+    complex SQL and diagnostic narratives go to the strong tier. A fast-tier call
+    whose response fails to parse or fails the caller's validator (including
+    by raising, e.g. on JSON that is not an object) is retried once on the
+    strong tier.
+    """
+
+    def __init__(self, fast: LLMProvider, strong: LLMProvider, enabled: bool = True):
+        self.fast = fast
+        self.strong = strong
+        self.enabled = enabled
+
+    async def warm_up(self) -> None:
+        """Warm both tiers' clients."""
+        providers = [self.fast] if self.fast is self.strong else [self.fast, self.strong]
+        await asyncio.gather(*(provider.warm_up() for provider in providers))
+
+    def select_tier(self, route: str, complexity: Optional[str] = None, intent: Optional[str] = None) -> str:
+        """
+        Pick the model tier for a call.
+
+        Args:
+            route: Pipeline route (intent, sql, narrative)
+            complexity: QueryIntent.complexity (simple, moderate, complex)
+            intent: QueryIntent.intent (DESCRIPTIVE, DIAGNOSTIC, ...)
+
+        Returns:
+            TIER_FAST or TIER_STRONG
+        """
+        if not self.enabled:
+            return TIER_STRONG
+        if route in FAST_ROUTES:
+            return TIER_FAST
+        if isinstance(intent, str) and intent.upper() in STRONG_INTENTS:
+            return TIER_STRONG
+        if complexity == "simple":
+            return TIER_FAST
+        return TIER_STRONG
+
+    async def generate_text(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False,
+        route: str = ROUTE_DEFAULT,
+        complexity: Optional[str] = None,
+        intent: Optional[str] = None,
+        validator: Optional[Callable[[str], bool]] = None
+    ) -> str:
+        """Generate text on the tier selected for this route."""
+        return await self._dispatch(
+            "generate_text", route, complexity, intent, validator,
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            cache_system_prompt=cache_system_prompt
+        )
+
+    async def generate_json(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        cache_system_prompt: bool = False,
+        route: str = ROUTE_DEFAULT,
+        complexity: Optional[str] = None,
+        intent: Optional[str] = None,
+        validator: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate JSON on the tier selected for this route.
+
+        Args:
+            route: Pipeline route used for tier selection and statistics
+            complexity: Optional QueryIntent.complexity
+            intent: Optional QueryIntent.intent
+            validator: Optional check on the parsed response; a False result
+                on the fast tier escalates to the strong tier
+        """
+        return await self._dispatch(
+            "generate_json", route, complexity, intent, validator,
+            prompt=prompt,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            cache_system_prompt=cache_system_prompt
+        )
+
+    async def chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Generate chat completion on the strong tier."""
+        return await self._dispatch(
+            "chat_completion", ROUTE_DEFAULT, None, None, None,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+
+    async def _dispatch(
+        self,
+        method: str,
+        route: str,
+        complexity: Optional[str],
+        intent: Optional[str],
+        validator: Optional[Callable[[Any], bool]],
+        **kwargs
+    ) -> Any:
+        tier = self.select_tier(route, complexity, intent) if method != "chat_completion" else TIER_STRONG
+
+        if tier == TIER_FAST:
+            try:
+                result, valid = await self._call(TIER_FAST, route, method, validator, escalated=False, **kwargs)
+                if valid:
+                    return result
+                logger.info(f"Fast model response failed validation on route '{route}', escalating")
+            except ValueError as e:
+                # Providers raise ValueError when the response cannot be parsed
+                logger.info(f"Fast model response unparseable on route '{route}', escalating: {e}")
+            result, _ = await self._call(TIER_STRONG, route, method, validator, escalated=True, **kwargs)
+            return result
+
+        result, _ = await self._call(TIER_STRONG, route, method, validator, escalated=False, **kwargs)
+        return result
+
+    async def _call(
+        self,
+        tier: str,
+        route: str,
+        method: str,
+        validator: Optional[Callable[[Any], bool]],
+        escalated: bool,
+        **kwargs
+    ) -> Tuple[Any, bool]:
+        """Call one tier and record its latency; returns the result and whether it passed validation."""
+        provider = self.fast if tier == TIER_FAST else self.strong
+        trace = current_trace()
+        start = time.perf_counter()
+        try:
+            result = await getattr(provider, method)(**kwargs)
+        except Exception as e:
+            latency_ms = (time.perf_counter() - start) * 1000
+            route_stats.record(route, tier, latency_ms, success=False, escalated=escalated)
+            if trace is not None:
+                trace.record_llm_call(route, tier, method, kwargs, latency_ms=latency_ms, error=e)
+            raise
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        success = validator is None or _passes(validator, result, route)
+        route_stats.record(route, tier, latency_ms, success=success, escalated=escalated)
+        if trace is not None:
+            trace.record_llm_call(route, tier, method, kwargs, response=result, latency_ms=latency_ms)
+        return result, success
+
+
+def _passes(validator: Callable[[Any], bool], result: Any, route: str) -> bool:
+    """Run a caller's validator; one that raises on an unexpected response counts as a failure."""
+    try:
+        return bool(validator(result))
+    except Exception as e:
+        logger.info(f"Validator raised on route '{route}': {e}")
+        return False
@@ -0,0 +1,239 @@
+"""
+Deterministic SQL compilation from a QueryIntent and a semantic layer.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+
+from app.services.data.sql_validator import SQLValidator
+from app.services.semantic.layer import SemanticLayer
+
+# Intents that need reasoning beyond aggregation and cannot be compiled
+UNCOMPILABLE_INTENTS = {"DIAGNOSTIC", "PREDICTIVE", "PRESCRIPTIVE"}
+
+DEFAULT_ROW_LIMIT = 100
+
+# Spellings of QueryIntent.aggregation, by canonical name
+AGGREGATION_ALIASES = {"average": "avg", "mean": "avg", "total": "sum", "number": "count"}
+
+# A metric expression that is a single aggregate call, e.g. SUM(orders.amount)
+SIMPLE_AGGREGATE_PATTERN = re.compile(r"(SUM|AVG|COUNT|MIN|MAX)\s*\([^()]*\)", re.IGNORECASE)
+
+
+@dataclass
+class CompiledQuery:
+    """SQL compiled from the semantic layer."""
+    sql: str
+    explanation: str
+
+
+class SemanticCompiler:
+    """
+    Compiles intents that map fully onto declared metrics, dimensions and
+    filters. Returns None whenever any part of the intent is not covered, so
+    the caller can fall back to LLM SQL generation.
+    """
+
+    def compile(
+        self,
+        intent: Any,
+        semantic_model: Optional[Dict[str, Any]],
+        today: Optional[date] = None
+    ) -> Optional[CompiledQuery]:
+        """
+        Compile a QueryIntent into SQL.
+
+        Args:
+            intent: QueryIntent from the query processor
+            semantic_model: DataSource.semantic_model contents
+            today: Reference date for relative time ranges (defaults to today)
+
+        Returns:
+            CompiledQuery, or None if the intent is not fully covered
+        """
+        if not isinstance(semantic_model, dict) or not semantic_model.get("metrics"):
+            return None
+        if str(intent.intent).upper() in UNCOMPILABLE_INTENTS or not intent.metrics:
+            return None
+
+        try:
+            layer = SemanticLayer.from_dict(semantic_model)
+        except ValueError:
+            return None
+
+        metrics = [layer.find_metric(name) for name in intent.metrics]
+        if any(m is None for m in metrics):
+            return None
+        base_table = metrics[0].table
+        if any(m.table != base_table for m in metrics):
+            return None
+        # A metric is compiled only with the aggregation it declares
+        if any(not _aggregation_matches(intent, m.expression) for m in metrics):
+            return None
+
+        dimensions = [layer.find_dimension(name) for name in intent.dimensions]
+        if any(d is None for d in dimensions):
+            return None
+        if str(intent.intent).upper() == "TREND" and not dimensions:
+            return None
+
+        where: List[str] = []
+        filter_dimensions = []
+        for key, value in (intent.filters or {}).items():
+            dimension = layer.find_dimension(key)
+            literal = _literal(value)
+            if dimension is None or literal is None:
+                return None
+            filter_dimensions.append(dimension)
+            operator = "IN" if isinstance(value, (list, tuple)) else "="
+            where.append(f"{dimension.column} {operator} {literal}")
+
+        if intent.time_range:
+            time_columns = {m.time_column for m in metrics}
+            window = resolve_time_range(intent.time_range, today or date.today())
+            if window is None or len(time_columns) != 1 or None in time_columns:
+                return None
+            start, end = window
+            time_column = time_columns.pop()
+            where.append(f"{time_column} >= '{start.isoformat()}' AND {time_column} < '{end.isoformat()}'")
+
+        joins = []
+        seen_tables = {base_table}
+        for dimension in [*dimensions, *filter_dimensions]:
+            for join in dimension.joins:
+                if join.table not in seen_tables:
+                    seen_tables.add(join.table)
+                    joins.append(f"{join.type} JOIN {join.table} ON {join.on}")
+
+        select = [f"{d.column} AS {d.name}" for d in dimensions]
+        select += [f"{m.expression} AS {m.name}" for m in metrics]
+
+        sql = f"SELECT {', '.join(select)} FROM {base_table}"
+        if joins:
+            sql += " " + " ".join(joins)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if dimensions:
+            sql += " GROUP BY " + ", ".join(d.column for d in dimensions)
+            order = dimensions[0].name if str(intent.intent).upper() == "TREND" else f"{metrics[0].name} DESC"
+            sql += f" ORDER BY {order} LIMIT {DEFAULT_ROW_LIMIT}"
+
+        if not SQLValidator.validate_sql(sql):
+            return None
+
+        explanation = f"Compiled from semantic layer: {', '.join(m.name for m in metrics)}"
+        if dimensions:
+            explanation += f" by {', '.join(d.name for d in dimensions)}"
+        if intent.time_range:
+            explanation += f" for {intent.time_range}"
+        return CompiledQuery(sql=sql, explanation=explanation)
+
+
+def resolve_time_range(text: str, today: date) -> Optional[Tuple[date, date]]:
+    """
+    Resolve a relative time phrase to a half-open [start, end) date window.
+
+    Supports today, yesterday, ytd, 'last/this <unit>', 'last N <unit>s',
+    quarters ('q3', 'q3 2024') and years ('2023').
+
+    Returns:
+        (start, end) dates, or None if the phrase is not understood
+    """
+    phrase = re.sub(r"\s+", " ", str(text).strip().lower())
+    phrase = re.sub(r"^(?:in|for|during|over|from) ", "", phrase)
+    phrase = re.sub(r"^the ", "", phrase)
+    tomorrow = today + timedelta(days=1)
+
+    if phrase == "today":
+        return today, tomorrow
+    if phrase == "yesterday":
+        return today - timedelta(days=1), today
+    if phrase in ("ytd", "year to date"):
+        return date(today.year, 1, 1), tomorrow
+
+    match = re.fullmatch(r"q([1-4])(?: (\d{4}))?", phrase)
+    if match:
+        year = int(match.group(2) or today.year)
+        start = date(year, 3 * (int(match.group(1)) - 1) + 1, 1)
+        return start, start + relativedelta(months=3)
+
+    match = re.fullmatch(r"(\d{4})", phrase)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year + 1, 1, 1)
+
+    match = re.fullmatch(r"(last|past|previous|this|current) (?:(\d+) )?(day|week|month|quarter|year)s?", phrase)
+    if not match:
+        return None
+    which, count, unit = match.group(1), match.group(2), match.group(3)
+    period_start = _period_start(today, unit)
+
+    if which in ("this", "current"):
+        return period_start, tomorrow
+    if count:
+        # Rolling window of N units ending today
+        return today - _delta(unit, int(count)) + timedelta(days=1), tomorrow
+    # Previous complete calendar period
+    return period_start - _delta(unit, 1), period_start
+
+
+def _period_start(today: date, unit: str) -> date:
+    if unit == "day":
+        return today
+    if unit == "week":
+        return today - timedelta(days=today.weekday())
+    if unit == "month":
+        return today.replace(day=1)
+    if unit == "quarter":
+        return date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+    return date(today.year, 1, 1)
+
+
+def _delta(unit: str, count: int) -> relativedelta:
+    if unit == "day":
+        return relativedelta(days=count)
+    if unit == "week":
+        return relativedelta(weeks=count)
+    if unit == "month":
+        return relativedelta(months=count)
+    if unit == "quarter":
+        return relativedelta(months=3 * count)
+    return relativedelta(years=count)
+
+
+def _aggregation_matches(intent: Any, expression: str) -> bool:
+    """
+    Whether a metric expression computes the aggregation the intent asks for.
+
+    Intents naming no aggregation take the metric as declared; so do totals
+    of compound expressions (ratios and the like).
+    """
+    requested = getattr(intent, "aggregation", None)
+    if not requested:
+        return True
+    requested = str(requested).strip().lower()
+    requested = AGGREGATION_ALIASES.get(requested, requested)
+    match = SIMPLE_AGGREGATE_PATTERN.fullmatch(expression.strip())
+    if match is None:
+        return requested == "sum"
+    return match.group(1).lower() == requested
+
+
+def _literal(value: Any) -> Optional[str]:
+    """Render a filter value as a SQL literal, or None if unsupported."""
+    if isinstance(value, (list, tuple)):
+        items = [_literal(v) for v in value]
+        if not items or any(i is None or i.startswith("(") for i in items):
+            return None
+        return f"({', '.join(items)})"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return None
@@ -0,0 +1,134 @@
+"""
+Semantic layer definitions: business metrics and dimensions declared per data source.
+
+Stored in DataSource.semantic_model as:
+
+    {
+        "metrics": [
+            {"name": "revenue", "expression": "SUM(orders.amount)", "table": "orders",
+             "time_column": "orders.order_date", "synonyms": ["sales"]}
+        ],
+        "dimensions": [
+            {"name": "region", "column": "customers.region",
+             "joins": [{"table": "customers", "on": "customers.id = orders.customer_id"}]}
+        ]
+    }
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+@dataclass
+class Join:
+    """A join required to reach a dimension from a metric's base table."""
+    table: str
+    on: str
+    type: str = "LEFT"
+
+
+@dataclass
+class Metric:
+    """A business metric: an aggregate SQL expression over a base table."""
+    name: str
+    expression: str
+    table: str
+    time_column: Optional[str] = None
+    description: Optional[str] = None
+    synonyms: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Dimension:
+    """A grouping/filtering attribute and the joins needed to reach it."""
+    name: str
+    column: str
+    joins: List[Join] = field(default_factory=list)
+    description: Optional[str] = None
+    synonyms: List[str] = field(default_factory=list)
+
+
+class SemanticLayer:
+    """Parsed semantic model for one data source."""
+
+    def __init__(self, metrics: List[Metric], dimensions: List[Dimension]):
+        self.metrics = metrics
+        self.dimensions = dimensions
+        self._metric_lookup = _build_lookup(metrics)
+        self._dimension_lookup = _build_lookup(dimensions)
+
+    @classmethod
+    def from_dict(cls, model: Dict[str, Any]) -> "SemanticLayer":
+        """
+        Parse a semantic model dictionary.
+
+        Args:
+            model: DataSource.semantic_model contents
+
+        Returns:
+            SemanticLayer instance
+
+        Raises:
+            ValueError: If the model is malformed
+        """
+        if not isinstance(model, dict):
+            raise ValueError("Semantic model must be an object")
+
+        metrics = []
+        for item in model.get("metrics", []):
+            _require(item, ("name", "expression", "table"), "metric")
+            metrics.append(Metric(
+                name=item["name"],
+                expression=item["expression"],
+                table=item["table"],
+                time_column=item.get("time_column"),
+                description=item.get("description"),
+                synonyms=list(item.get("synonyms", []))
+            ))
+
+        dimensions = []
+        for item in model.get("dimensions", []):
+            _require(item, ("name", "column"), "dimension")
+            joins = []
+            for join in item.get("joins", []):
+                _require(join, ("table", "on"), "join")
+                joins.append(Join(table=join["table"], on=join["on"], type=join.get("type", "LEFT").upper()))
+            dimensions.append(Dimension(
+                name=item["name"],
+                column=item["column"],
+                joins=joins,
+                description=item.get("description"),
+                synonyms=list(item.get("synonyms", []))
+            ))
+
+        return cls(metrics, dimensions)
+
+    def find_metric(self, name: str) -> Optional[Metric]:
+        """Look up a metric by name or synonym (case-insensitive)."""
+        return self._metric_lookup.get(_key(name))
+
+    def find_dimension(self, name: str) -> Optional[Dimension]:
+        """Look up a dimension by name or synonym (case-insensitive)."""
+        return self._dimension_lookup.get(_key(name))
+
+
+def _key(name: str) -> str:
+    return str(name).strip().lower().replace(" ", "_")
+
+
+def _build_lookup(items: List[Any]) -> Dict[str, Any]:
+    lookup: Dict[str, Any] = {}
+    for item in items:
+        for name in [item.name, *item.synonyms]:
+            lookup.setdefault(_key(name), item)
+    return lookup
+
+
+def _require(item: Any, keys: tuple, kind: str) -> None:
+    if not isinstance(item, dict) or any(not item.get(k) for k in keys):
+        raise ValueError(f"Each {kind} requires: {', '.join(keys)}")
+    if kind in ("metric", "dimension") and not IDENTIFIER_PATTERN.match(item["name"]):
+        raise ValueError(f"Invalid {kind} name '{item['name']}': use letters, digits and underscores")
@@ -0,0 +1,186 @@
+"""
+Pluggable blob storage for large artifacts (offloaded query results).
+
+Blobs are written whole and read back through seekable file objects, so
+columnar readers can fetch only the byte ranges they need.
+"""
+
+import io
+import os
+from abc import ABC, abstractmethod
+from typing import Any, BinaryIO, Optional
+
+from app.core.config import settings
+
+# Minimum bytes fetched per S3 range request
+RANGE_READ_BUFFER_BYTES = 256 * 1024
+
+
+class BlobStore(ABC):
+    """Abstract key/value store for binary blobs."""
+
+    backend: str
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        """Write a blob, replacing any existing blob with the same key."""
+        pass
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """
+        Open a blob for reading.
+
+        Returns:
+            Seekable binary file object; the caller closes it
+
+        Raises:
+            FileNotFoundError: If the blob does not exist
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Delete a blob if it exists."""
+        pass
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs stored as files under a root directory."""
+
+    backend = "local"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+
+class S3BlobStore(BlobStore):
+    """
+    Blobs stored as S3 objects. Reads use HTTP range requests.
+
+    Works with any S3-compatible endpoint (MinIO, LocalStack) via endpoint_url.
+    """
+
+    backend = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", client: Optional[Any] = None, endpoint_url: Optional[str] = None):
+        """
+        Initialize the store.
+
+        Args:
+            bucket: Bucket name
+            prefix: Key prefix for every blob
+            client: Optional pre-built boto3 S3 client (or compatible object)
+            endpoint_url: Optional S3-compatible endpoint
+        """
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ImportError("boto3 is required for the S3 result store: pip install boto3")
+            client = boto3.client(
+                "s3",
+                endpoint_url=endpoint_url,
+                region_name=settings.AWS_REGION,
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
+            )
+        self.client = client
+
+    def put(self, key: str, data: bytes) -> None:
+        self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+    def open(self, key: str) -> BinaryIO:
+        full_key = self._key(key)
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=full_key)
+        except Exception as e:
+            raise FileNotFoundError(f"s3://{self.bucket}/{full_key}") from e
+        raw = S3RangeReader(self.client, self.bucket, full_key, head["ContentLength"])
+        return io.BufferedReader(raw, buffer_size=RANGE_READ_BUFFER_BYTES)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+
+class S3RangeReader(io.RawIOBase):
+    """Seekable read-only view of an S3 object, fetching byte ranges on demand."""
+
+    def __init__(self, client: Any, bucket: str, key: str, size: int):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        return self.position
+
+    def readinto(self, buffer) -> int:
+        if self.position >= self.size:
+            return 0
+        end = min(self.position + len(buffer), self.size) - 1
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={self.position}-{end}")
+        data = response["Body"].read()
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def get_blob_store() -> BlobStore:
+    """Build the result blob store configured in settings."""
+    if settings.RESULT_STORE_BACKEND == "s3":
+        return S3BlobStore(
+            bucket=settings.RESULT_STORE_S3_BUCKET or settings.AWS_S3_BUCKET,
+            prefix=settings.RESULT_STORE_S3_PREFIX,
+            endpoint_url=settings.RESULT_STORE_S3_ENDPOINT_URL
+        )
+    if settings.RESULT_STORE_BACKEND == "local":
+        return LocalBlobStore(settings.RESULT_STORE_PATH)
+    raise ValueError(f"Unsupported result store backend: {settings.RESULT_STORE_BACKEND}")
@@ -0,0 +1,688 @@
+"""
+Cached analysis results, in three tiers.
+
+An insight is everything a completed analyze run produced: intent and
+entities, the generated SQL, and Query.results (data or data_ref, stats,
+narrative, chart). It is keyed by generate_cache_key() over the question,
+the data source and its schema version. Editing a source therefore
+invalidates its insights.
+
+Lookups read through the tiers in order:
+
+1. An in-process LRU holding decoded insights, bounded by their
+   serialized size.
+2. Redis, shared by every worker.
+3. The insight_cache table, the durable copy.
+
+A hit in a lower tier is copied into the tiers above it. Every tier stores
+the same absolute expires_at (CACHE_TTL_SECONDS after the run), so a
+promoted entry never outlives the original.
+
+Writes go to memory and Redis at once. In the API, database writes and hit
+counts are queued and flushed in batches every
+INSIGHT_CACHE_WRITE_BEHIND_SECONDS by a background task. Popular insights
+are therefore served without touching the database. Where no flusher runs
+(Celery workers, scripts), they are written through on the caller's
+session. Database writes are Core upserts, never ORM objects, run in a
+savepoint, so a failed write never rolls back (or leaves failed) the
+session that owns the Query row being answered.
+
+Expensive insights are protected from stampedes in three ways:
+
+- Stale-while-revalidate: for INSIGHT_CACHE_STALE_SECONDS past expiry (or
+  the data source's cache_stale_seconds) an entry is still served, flagged
+  stale, while the caller refreshes it in the background.
+- Early refresh: a fresh hit triggers that refresh with a probability that
+  rises as expiry nears, scaled by how long the insight took to compute
+  (XFetch). Popular entries are usually replaced before they expire.
+- A per-key recompute lock, held in process and across workers through
+  Redis (SET NX). On a miss one request recomputes; the others wait for
+  its answer (wait_for) instead of repeating the LLM and warehouse calls.
+
+Redis fails open: errors are logged and Redis is skipped for
+INSIGHT_CACHE_REDIS_RETRY_SECONDS. Without Redis the lock only covers the
+current worker. Cached payloads are shared between requests and must be
+treated as read-only.
+"""
+
+import asyncio
+import inspect
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import orjson
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.models.insight_cache import InsightCache
+from app.utils.db_helpers import generate_cache_key, generate_query_hash
+from app.utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+TIER_MEMORY = "memory"
+TIER_REDIS = "redis"
+TIER_DATABASE = "database"
+TIERS = (TIER_MEMORY, TIER_REDIS, TIER_DATABASE)
+
+REDIS_KEY_PREFIX = "insight:"
+LOCK_KEY_PREFIX = "insight-lock:"
+
+# Deletes the recompute lock only if this process still holds it (KEYS[1] lock, ARGV[1] token)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# How often wait_for checks for the lock holder's answer
+LOCK_POLL_SECONDS = 0.05
+
+# insight_cache columns a refreshed entry keeps
+KEPT_ON_REFRESH = ("cache_key", "created_at", "hit_count")
+
+
+@dataclass
+class Insight:
+    """A cached analysis result."""
+    cache_key: str
+    payload: Dict[str, Any]
+    computation_time_ms: int
+    expires_at: datetime
+    size_bytes: int = 0
+    stale_until: Optional[datetime] = None  # Served (as stale) until then; defaults to expires_at
+
+    @property
+    def results(self) -> Dict[str, Any]:
+        return self.payload.get("results") or {}
+
+    @property
+    def retained_until(self) -> datetime:
+        return self.stale_until or self.expires_at
+
+    @property
+    def stale(self) -> bool:
+        """Past its TTL: still served, but should be refreshed."""
+        return self.expires_at <= datetime.utcnow()
+
+    @property
+    def expired(self) -> bool:
+        """Past its stale window too: no longer served."""
+        return self.retained_until <= datetime.utcnow()
+
+    def encode(self) -> bytes:
+        return dumps({
+            "payload": self.payload,
+            "computation_time_ms": self.computation_time_ms,
+            "expires_at": self.expires_at.isoformat(),
+            "stale_until": self.retained_until.isoformat()
+        })
+
+    @classmethod
+    def decode(cls, cache_key: str, data: bytes) -> "Insight":
+        entry = orjson.loads(data)
+        return cls(
+            cache_key,
+            entry["payload"],
+            entry["computation_time_ms"],
+            datetime.fromisoformat(entry["expires_at"]),
+            len(data),
+            datetime.fromisoformat(entry["stale_until"]) if entry.get("stale_until") else None
+        )
+
+
+class InsightCacheStats:
+    """Thread-safe lookup and hit counters per tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lookups = 0
+        self._hits: Counter = Counter()
+        self._writes = 0
+        self._stale_hits = 0
+        self._refreshes = 0
+        self._lock_waits = 0
+
+    def record_lookup(self, tier: Optional[str], stale: bool = False) -> None:
+        """Record a lookup answered by `tier`, or a miss (None)."""
+        with self._lock:
+            self._lookups += 1
+            if tier is not None:
+                self._hits[tier] += 1
+                self._stale_hits += stale
+
+    def record_write(self) -> None:
+        with self._lock:
+            self._writes += 1
+
+    def record_refresh(self) -> None:
+        with self._lock:
+            self._refreshes += 1
+
+    def record_lock_wait(self) -> None:
+        with self._lock:
+            self._lock_waits += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get current statistics.
+
+        Returns:
+            Overall hit ratio plus, per tier, its hits, its share of all
+            lookups (hit_ratio) and its ratio among the lookups that reached
+            it (local_hit_ratio); stale hits, background refreshes and
+            requests that waited on another's recompute
+        """
+        with self._lock:
+            lookups, hits, writes = self._lookups, dict(self._hits), self._writes
+            stale_hits, refreshes, lock_waits = self._stale_hits, self._refreshes, self._lock_waits
+        tiers = {}
+        reached = lookups
+        for tier in TIERS:
+            tier_hits = hits.get(tier, 0)
+            tiers[tier] = {
+                "hits": tier_hits,
+                "hit_ratio": tier_hits / lookups if lookups else None,
+                "local_hit_ratio": tier_hits / reached if reached else None
+            }
+            reached -= tier_hits
+        total_hits = sum(hits.values())
+        return {
+            "lookups": lookups,
+            "hits": total_hits,
+            "misses": lookups - total_hits,
+            "hit_ratio": total_hits / lookups if lookups else None,
+            "writes": writes,
+            "stale_hits": stale_hits,
+            "refreshes": refreshes,
+            "lock_waits": lock_waits,
+            "tiers": tiers
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._lookups = 0
+            self._hits.clear()
+            self._writes = 0
+            self._stale_hits = 0
+            self._refreshes = 0
+            self._lock_waits = 0
+
+
+# Process-wide statistics shared by every store
+insight_cache_stats = InsightCacheStats()
+
+
+class MemoryInsightTier:
+    """In-process LRU of insights, bounded by entry count and serialized bytes."""
+
+    def __init__(self, max_bytes: Optional[int] = None, max_entries: Optional[int] = None):
+        self.max_bytes = settings.INSIGHT_CACHE_MEMORY_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_entries = settings.INSIGHT_CACHE_MEMORY_MAX_ENTRIES if max_entries is None else max_entries
+        self._entries: "OrderedDict[str, Insight]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+
+    def get(self, cache_key: str) -> Optional[Insight]:
+        with self._lock:
+            insight = self._entries.get(cache_key)
+            if insight is None:
+                return None
+            if insight.expired:
+                self._remove(cache_key)
+                return None
+            self._entries.move_to_end(cache_key)
+            return insight
+
+    def put(self, insight: Insight) -> None:
+        # Entries that would take the whole budget are left to the lower tiers
+        if insight.size_bytes > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            if insight.cache_key in self._entries:
+                self._remove(insight.cache_key)
+            self._entries[insight.cache_key] = insight
+            self.size_bytes += insight.size_bytes
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, cache_key: str) -> None:
+        self.size_bytes -= self._entries.pop(cache_key).size_bytes
+
+
+class RedisInsightTier:
+    """Insights and recompute locks shared by every worker through Redis, expiring with the entry."""
+
+    def __init__(self, url: Optional[str] = None, client: Optional[Any] = None):
+        self.url = url or settings.REDIS_URL
+        self._client = client
+        self._disabled_until = 0.0
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            import redis.asyncio as redis
+            timeout = settings.INSIGHT_CACHE_REDIS_TIMEOUT_SECONDS
+            self._client = redis.from_url(self.url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._disabled_until
+
+    async def get(self, cache_key: str) -> Optional[Insight]:
+        if not self.available:
+            return None
+        try:
+            data = await self.client.get(REDIS_KEY_PREFIX + cache_key)
+        except Exception as e:
+            self._fail(e)
+            return None
+        if data is None:
+            return None
+        insight = Insight.decode(cache_key, data)
+        return None if insight.expired else insight
+
+    async def put(self, insight: Insight, data: Optional[bytes] = None) -> None:
+        remaining_ms = int((insight.retained_until - datetime.utcnow()).total_seconds() * 1000)
+        if remaining_ms <= 0 or not self.available:
+            return
+        try:
+            await self.client.set(REDIS_KEY_PREFIX + insight.cache_key, data or insight.encode(), px=remaining_ms)
+        except Exception as e:
+            self._fail(e)
+
+    async def acquire_lock(self, cache_key: str, token: str, ttl_ms: int) -> bool:
+        """Take the recompute lock for `cache_key`; also True when Redis is unavailable (fail open)."""
+        if not self.available:
+            return True
+        try:
+            return bool(await self.client.set(LOCK_KEY_PREFIX + cache_key, token, px=ttl_ms, nx=True))
+        except Exception as e:
+            self._fail(e)
+            return True
+
+    async def release_lock(self, cache_key: str, token: str) -> None:
+        if not self.available:
+            return
+        try:
+            await self.client.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY_PREFIX + cache_key, token)
+        except Exception as e:
+            self._fail(e)
+
+    async def locked(self, cache_key: str) -> bool:
+        if not self.available:
+            return False
+        try:
+            return bool(await self.client.exists(LOCK_KEY_PREFIX + cache_key))
+        except Exception as e:
+            self._fail(e)
+            return False
+
+    def _fail(self, error: Exception) -> None:
+        logger.warning(f"Insight cache Redis tier unavailable, skipping it: {error}")
+        self._disabled_until = time.monotonic() + settings.INSIGHT_CACHE_REDIS_RETRY_SECONDS
+
+
+class InsightStore:
+    """Looks up and stores insights across the memory, Redis and database tiers."""
+
+    # Queued database writes kept while the database is failing; beyond this, new failures are dropped
+    MAX_PENDING_WRITES = 1000
+
+    def __init__(
+        self,
+        ttl_seconds: Optional[int] = None,
+        enabled: Optional[bool] = None,
+        memory: Optional[MemoryInsightTier] = None,
+        redis: Optional[RedisInsightTier] = None,
+        stats: Optional[InsightCacheStats] = None,
+        stale_seconds: Optional[int] = None,
+        early_refresh_beta: Optional[float] = None,
+        lock_seconds: Optional[float] = None
+    ):
+        self.ttl_seconds = settings.CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.enabled = settings.INSIGHT_CACHE_ENABLED if enabled is None else enabled
+        self.stale_seconds = settings.INSIGHT_CACHE_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self.early_refresh_beta = (
+            settings.INSIGHT_CACHE_EARLY_REFRESH_BETA if early_refresh_beta is None else early_refresh_beta
+        )
+        self.lock_seconds = settings.INSIGHT_CACHE_LOCK_SECONDS if lock_seconds is None else lock_seconds
+        self.memory = memory or MemoryInsightTier()
+        if redis is None and settings.INSIGHT_CACHE_REDIS_ENABLED:
+            redis = RedisInsightTier()
+        self.redis = redis
+        self.stats = stats or insight_cache_stats
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._hits: Counter = Counter()
+        # Recompute locks held by this process: cache key -> monotonic deadline
+        self._recomputing: Dict[str, float] = {}
+        self._token = uuid.uuid4().hex
+        self.write_behind = False
+
+    @staticmethod
+    def cache_key(question: str, data_source: Any) -> str:
+        """Key for a question against a data source at its current schema version."""
+        return generate_cache_key(question, [data_source.id], {"schema_version": data_source.schema_version})
+
+    def stale_seconds_for(self, data_source: Any) -> int:
+        """The data source's stale-while-revalidate window, or INSIGHT_CACHE_STALE_SECONDS."""
+        if data_source.cache_stale_seconds is not None:
+            return data_source.cache_stale_seconds
+        return self.stale_seconds
+
+    async def get(self, db: Any, cache_key: str, stale_seconds: int = 0) -> Optional[Insight]:
+        """
+        The insight for `cache_key`, or None.
+
+        Entries past their TTL are returned within `stale_seconds` of it,
+        with Insight.stale set; by default only fresh entries are. Hits are
+        counted in memory and added to hit_count on the next flush.
+        """
+        insight, tier = await self._lookup(db, cache_key, stale_seconds)
+        if insight is not None and insight.stale and not stale_seconds:
+            insight, tier = None, None
+        self.stats.record_lookup(tier, stale=insight is not None and insight.stale)
+        if insight is not None:
+            with self._lock:
+                self._hits[cache_key] += 1
+        return insight
+
+    def should_refresh(self, insight: Insight) -> bool:
+        """
+        Whether a hit should also refresh the insight in the background.
+
+        Stale entries always should. Fresh ones should when
+        computation time * beta * -ln(U) reaches the time left, U uniform in
+        (0, 1]: rarely at first, almost surely just before expiry, and
+        earlier for insights that are slow to compute.
+        """
+        if insight.stale:
+            return True
+        if self.early_refresh_beta <= 0:
+            return False
+        remaining = (insight.expires_at - datetime.utcnow()).total_seconds()
+        gap = insight.computation_time_ms / 1000 * self.early_refresh_beta * -math.log(1.0 - random.random())
+        return gap >= remaining
+
+    async def acquire(self, cache_key: str) -> bool:
+        """
+        Take the recompute lock for `cache_key`, or return False if another request holds it.
+
+        The lock expires after INSIGHT_CACHE_LOCK_SECONDS in case its holder
+        dies. Holders must call release(), after storing the insight.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._recomputing.get(cache_key, 0.0) > now:
+                return False
+            self._recomputing[cache_key] = now + self.lock_seconds
+        if self.redis is not None and not await self.redis.acquire_lock(
+            cache_key, self._token, int(self.lock_seconds * 1000)
+        ):
+            with self._lock:
+                self._recomputing.pop(cache_key, None)
+            return False
+        return True
+
+    async def release(self, cache_key: str) -> None:
+        with self._lock:
+            self._recomputing.pop(cache_key, None)
+        if self.redis is not None:
+            await self.redis.release_lock(cache_key, self._token)
+
+    async def wait_for(self, db: Any, cache_key: str, timeout: Optional[float] = None) -> Optional[Insight]:
+        """
+        Wait for the request holding the recompute lock to store `cache_key`.
+
+        Returns:
+            The fresh insight, or None if the lock was released without one
+            (the recompute failed) or `timeout` (INSIGHT_CACHE_LOCK_SECONDS)
+            passed first
+        """
+        self.stats.record_lock_wait()
+        deadline = time.monotonic() + (self.lock_seconds if timeout is None else timeout)
+        while True:
+            # The holder stores the insight before releasing, so check the lock first
+            locked = await self._locked(cache_key)
+            if locked:
+                insight = self.memory.get(cache_key)
+                if insight is None and self.redis is not None:
+                    insight = await self.redis.get(cache_key)
+            else:
+                insight, _ = await self._lookup(db, cache_key, 0)
+            if insight is not None and not insight.stale:
+                self.memory.put(insight)
+                with self._lock:
+                    self._hits[cache_key] += 1
+                return insight
+            if not locked or time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(LOCK_POLL_SECONDS)
+
+    async def _locked(self, cache_key: str) -> bool:
+        with self._lock:
+            if self._recomputing.get(cache_key, 0.0) > time.monotonic():
+                return True
+        return self.redis is not None and await self.redis.locked(cache_key)
+
+    async def _lookup(self, db: Any, cache_key: str, stale_seconds: int = 0):
+        insight = self.memory.get(cache_key)
+        if insight is not None:
+            return insight, TIER_MEMORY
+
+        if self.redis is not None:
+            insight = await self.redis.get(cache_key)
+            if insight is not None:
+                self.memory.put(insight)
+                return insight, TIER_REDIS
+
+        stale_window = timedelta(seconds=stale_seconds)
+        result = await _resolve(db.execute(
+            select(InsightCache.result_data, InsightCache.computation_time_ms, InsightCache.expires_at)
+            .where(InsightCache.cache_key == cache_key, InsightCache.expires_at > datetime.utcnow() - stale_window)
+        ))
+        row = result.first()
+        if row is None:
+            return None, None
+        insight = Insight(
+            cache_key, row.result_data, row.computation_time_ms, row.expires_at,
+            stale_until=row.expires_at + stale_window
+        )
+        data = insight.encode()
+        insight.size_bytes = len(data)
+        self.memory.put(insight)
+        if self.redis is not None:
+            await self.redis.put(insight, data)
+        return insight, TIER_DATABASE
+
+    async def put(
+        self,
+        db: Any,
+        cache_key: str,
+        question: str,
+        data_source: Any,
+        payload: Dict[str, Any],
+        computation_time_ms: int,
+        stale_seconds: int = 0
+    ) -> Insight:
+        """
+        Store (or replace) an insight expiring CACHE_TTL_SECONDS from now.
+
+        Memory and Redis are written at once, and keep it `stale_seconds`
+        past expiry to be served stale. The database write is queued
+        when write-behind is on, and otherwise flushed on `db` before returning.
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        insight = Insight(
+            cache_key, payload, computation_time_ms, expires_at,
+            stale_until=expires_at + timedelta(seconds=stale_seconds)
+        )
+        data = insight.encode()
+        insight.size_bytes = len(data)
+        self.memory.put(insight)
+        if self.redis is not None:
+            await self.redis.put(insight, data)
+        self.stats.record_write()
+
+        with self._lock:
+            self._pending[cache_key] = {
+                "cache_key": cache_key,
+                "query_hash": generate_query_hash(question),
+                "data_source_ids": [str(data_source.id)],
+                "result_data": payload,
+                "computation_time_ms": computation_time_ms,
+                "hit_count": 0,
+                "expires_at": insight.expires_at,
+                "created_at": now,
+                "updated_at": now
+            }
+        if not self.write_behind:
+            await self.flush(db)
+        return insight
+
+    async def flush(self, db: Any) -> int:
+        """
+        Write queued insights and hit counts to the database, and commit.
+
+        Returns:
+            Number of rows written or updated
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            hits, self._hits = self._hits, Counter()
+        if not pending and not hits:
+            return 0
+
+        now = datetime.utcnow()
+        try:
+            savepoint = await _resolve(db.begin_nested())
+            try:
+                for values in pending.values():
+                    await _upsert(db, values)
+                for cache_key, count in hits.items():
+                    await _resolve(db.execute(
+                        update(InsightCache)
+                        .where(InsightCache.cache_key == cache_key)
+                        .values(hit_count=InsightCache.hit_count + count, updated_at=now)
+                    ))
+            except Exception:
+                # Undoes only these writes; the caller's session stays usable
+                await _resolve(savepoint.rollback())
+                raise
+            try:
+                await _resolve(db.commit())
+            except Exception:
+                await _resolve(db.rollback())
+                raise
+        except Exception:
+            # Requeue for the next flush, unless newer writes replaced them
+            with self._lock:
+                for cache_key, values in pending.items():
+                    if len(self._pending) < self.MAX_PENDING_WRITES:
+                        self._pending.setdefault(cache_key, values)
+                for cache_key, count in hits.items():
+                    self._hits[cache_key] += count
+            raise
+        return len(pending) + len(hits)
+
+    async def run_flusher(self, session_factory: Optional[Callable[[], Any]] = None) -> None:
+        """
+        Flush queued writes every INSIGHT_CACHE_WRITE_BEHIND_SECONDS until cancelled.
+
+        Write-behind is on while this runs. Cancelling it flushes what is
+        left, then turns write-behind off.
+
+        Args:
+            session_factory: Async session factory for the metadata database
+                (defaults to AsyncSessionLocal)
+        """
+        if session_factory is None:
+            from app.models.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+
+        self.write_behind = True
+        try:
+            while True:
+                await asyncio.sleep(settings.INSIGHT_CACHE_WRITE_BEHIND_SECONDS)
+                await self._flush_session(session_factory)
+        finally:
+            self.write_behind = False
+            await asyncio.shield(self._flush_session(session_factory))
+
+    async def _flush_session(self, session_factory: Callable[[], Any]) -> None:
+        try:
+            async with session_factory() as db:
+                await self.flush(db)
+        except Exception as e:
+            logger.warning(f"Insight cache write-behind flush failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Hit ratios per tier, memory tier usage, recomputes in progress and queued database writes."""
+        with self._lock:
+            pending_writes, pending_hits = len(self._pending), len(self._hits)
+            recomputing = len(self._recomputing)
+        return {
+            **self.stats.snapshot(),
+            "memory": {
+                "entries": len(self.memory),
+                "size_bytes": self.memory.size_bytes,
+                "max_bytes": self.memory.max_bytes
+            },
+            "redis": {"enabled": self.redis is not None, "available": self.redis is not None and self.redis.available},
+            "recomputing": recomputing,
+            "write_behind": {"enabled": self.write_behind, "pending_writes": pending_writes, "pending_hit_counts": pending_hits}
+        }
+
+
+async def _upsert(db: Any, values: Dict[str, Any]) -> None:
+    """
+    Insert or replace an insight_cache row.
+
+    PostgreSQL and SQLite use INSERT ... ON CONFLICT (cache_key) DO UPDATE.
+    Other dialects update the row and insert it if none matched; a
+    concurrent insert of the same key then fails this flush's savepoint,
+    and the write is retried on the next flush.
+    """
+    replaced = {name: value for name, value in values.items() if name not in KEPT_ON_REFRESH}
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = dialect_insert(InsightCache).values(**values)
+        await _resolve(db.execute(statement.on_conflict_do_update(
+            index_elements=[InsightCache.cache_key],
+            set_={name: statement.excluded[name] for name in replaced}
+        )))
+        return
+    result = await _resolve(db.execute(
+        update(InsightCache).where(InsightCache.cache_key == values["cache_key"]).values(**replaced)
+    ))
+    if result.rowcount == 0:
+        await _resolve(db.execute(insert(InsightCache).values(**values)))
+
+
+async def _resolve(result: Any) -> Any:
+    """Await results from an AsyncSession; pass through those of a Session."""
+    if inspect.isawaitable(result):
+        result = await result
+    return result
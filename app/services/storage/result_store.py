@@ -0,0 +1,122 @@
+"""
+Columnar storage for large query results.
+
+Results above RESULT_OFFLOAD_THRESHOLD_BYTES are written as Parquet to the
+blob store; Query.results then keeps only a pointer, the schema and the row
+count. Parquet row groups let a page of rows be read without loading the
+whole file.
+
+Stored results are written once and never deleted. A blob is keyed by the
+query that computed it, but queries answered from the insight cache point
+at the same blob, so removing it with its query would break every later
+answer. Old results may only be expired in bulk, by a storage lifecycle
+rule longer than query history is kept.
+"""
+
+import io
+import logging
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.core.config import settings
+from app.services.storage.blob_store import BlobStore, get_blob_store
+
+logger = logging.getLogger(__name__)
+
+RESULT_FORMAT = "parquet"
+
+
+class ResultStore:
+    """Writes query result frames to a blob store and reads back row ranges."""
+
+    def __init__(
+        self,
+        blob_store: Optional[BlobStore] = None,
+        threshold_bytes: Optional[int] = None,
+        row_group_size: Optional[int] = None
+    ):
+        self._blob_store = blob_store
+        self.threshold_bytes = settings.RESULT_OFFLOAD_THRESHOLD_BYTES if threshold_bytes is None else threshold_bytes
+        self.row_group_size = row_group_size or settings.RESULT_ROW_GROUP_SIZE
+
+    @property
+    def blob_store(self) -> BlobStore:
+        # Built on first use so importing the pipeline needs no storage configuration
+        if self._blob_store is None:
+            self._blob_store = get_blob_store()
+        return self._blob_store
+
+    def should_offload(self, df: pd.DataFrame) -> bool:
+        """Whether a result frame is large enough to keep out of the database."""
+        if self.threshold_bytes <= 0 or df.empty:
+            return False
+        return int(df.memory_usage(index=False, deep=True).sum()) > self.threshold_bytes
+
+    def save(self, query_id: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+        """
+        Write a result frame as Parquet.
+
+        Returns:
+            Pointer dict for Query.results, or None if the frame cannot be
+            represented in Arrow (the caller keeps it inline)
+        """
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            logger.warning(f"Result for query {query_id} not convertible to Arrow, storing inline: {e}")
+            return None
+
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, row_group_size=self.row_group_size, compression="zstd")
+        data = buffer.getvalue()
+
+        key = f"results/{query_id}.{RESULT_FORMAT}"
+        self.blob_store.put(key, data)
+        return {
+            "backend": self.blob_store.backend,
+            "key": key,
+            "format": RESULT_FORMAT,
+            "row_count": table.num_rows,
+            "size_bytes": len(data),
+            "schema": [{"name": field.name, "type": str(field.type)} for field in table.schema]
+        }
+
+    def read_rows(self, pointer: Dict[str, Any], offset: int, limit: int) -> List[Dict[str, Any]]:
+        """Read rows [offset, offset + limit) of a stored result as dicts."""
+        return self.read_table(pointer, offset, limit).to_pylist()
+
+    def read_table(self, pointer: Dict[str, Any], offset: int, limit: int) -> pa.Table:
+        """
+        Read rows [offset, offset + limit) of a stored result as an Arrow table.
+
+        Only the row groups overlapping the range are read.
+        """
+        with self.blob_store.open(pointer["key"]) as f:
+            parquet_file = pq.ParquetFile(f)
+            metadata = parquet_file.metadata
+            end = min(offset + limit, metadata.num_rows)
+            if offset >= end:
+                return parquet_file.schema_arrow.empty_table()
+
+            groups = []
+            first_row = None
+            group_start = 0
+            for i in range(metadata.num_row_groups):
+                group_rows = metadata.row_group(i).num_rows
+                group_end = group_start + group_rows
+                if group_end > offset and group_start < end:
+                    groups.append(i)
+                    if first_row is None:
+                        first_row = group_start
+                group_start = group_end
+
+            table = parquet_file.read_row_groups(groups)
+        return table.slice(offset - first_row, end - offset)
+
+    def read_frame(self, pointer: Dict[str, Any]) -> pd.DataFrame:
+        """Read a whole stored result back into a DataFrame."""
+        with self.blob_store.open(pointer["key"]) as f:
+            return pq.read_table(f).to_pandas()
@@ -1,6 +1,4 @@
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import json
 from typing import Dict, Any, Optional, List
 
@@ -32,6 +30,9 @@ class ChartGenerator:
         """
         if df.empty:
             return {}
+        
+        # Imported on first use; plotly is slow to import and most processes never chart
+        import plotly.express as px
             
         try:
             if chart_type == 'line':
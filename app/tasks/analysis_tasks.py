@@ -0,0 +1,50 @@
+import asyncio
+from celery import shared_task
+from app.models.database import SessionLocal
+from app.models.query import Query, QueryStatus
+from app.models.data_source import DataSource
+# Register every model so relationships resolve in the worker process
+from app.models import user, report, report_version, alert, alert_execution, insight_cache, audit_log  # noqa: F401
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def run_analysis(query_id: str):
+    """
+    Run the analysis pipeline for a query created by an asynchronous /queries/analyze call.
+    Progress and results are written to the Query row.
+    """
+    db = SessionLocal()
+    try:
+        db_query = db.query(Query).filter(Query.id == query_id).first()
+        if not db_query:
+            logger.error(f"Query {query_id} not found, skipping analysis.")
+            return
+        if db_query.status != QueryStatus.PENDING:
+            logger.info(f"Query {query_id} is already {db_query.status.value}, skipping analysis.")
+            return
+        
+        data_source_id = (db_query.data_sources_used or [None])[0]
+        data_source = db.query(DataSource).filter(DataSource.id == data_source_id).first()
+        if not data_source:
+            db_query.status = QueryStatus.FAILED
+            db_query.error_message = "Data source not found"
+            db.commit()
+            return
+        
+        # We need to run async code in this sync task
+        loop = asyncio.get_event_loop()
+        if loop.is_closed():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+        
+        # Services are built on the first task, not when the worker imports this module
+        from app.api.deps import get_worker_pipeline
+        loop.run_until_complete(get_worker_pipeline().run(db, db_query, data_source))
+        
+    except Exception as e:
+        # The pipeline has already marked the query as failed
+        logger.error(f"Error in run_analysis for query {query_id}: {e}")
+    finally:
+        db.close()
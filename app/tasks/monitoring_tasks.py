@@ -2,7 +2,6 @@ import asyncio
 from celery import shared_task
 from app.models.database import SessionLocal
 from app.models.alert import Alert
-from app.services.monitoring.alert_engine import AlertEngine
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,6 +18,8 @@ def check_all_alerts():
         alerts = db.query(Alert).filter(Alert.is_active == True).all()
         logger.info(f"Found {len(alerts)} active alerts.")
         
+        # Imported here so the worker starts without loading pandas and the executor
+        from app.services.monitoring.alert_engine import AlertEngine
         engine = AlertEngine(db)
         
         # Run evaluations
@@ -0,0 +1,64 @@
+"""
+Conditional GET support: content-hash ETags, 304 responses and Cache-Control
+hints derived from query status.
+"""
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.core.config import settings
+from app.models.query import QueryStatus
+
+# Finished queries never change; anything else must be revalidated
+IMMUTABLE_STATUSES = (QueryStatus.COMPLETED, QueryStatus.CACHED)
+REVALIDATE = "private, no-cache"
+
+
+def compute_etag(body: bytes) -> str:
+    """
+    Weak ETag from a hash of the response body.
+
+    Weak, so the same tag stays valid for the gzip-encoded representation.
+    """
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def query_cache_control(status: Optional[QueryStatus]) -> str:
+    """Cache-Control for a query response in the given status."""
+    if status in IMMUTABLE_STATUSES:
+        return f"private, max-age={settings.COMPLETED_QUERY_MAX_AGE_SECONDS}, immutable"
+    return REVALIDATE
+
+
+def conditional_response(
+    request: Request,
+    body: bytes,
+    media_type: str,
+    cache_control: str = REVALIDATE
+) -> Response:
+    """
+    Response for `body`, or an empty 304 if the client already holds it.
+
+    Args:
+        request: Incoming request (its If-None-Match header is checked)
+        body: Fully rendered response body
+        media_type: Content type of body
+        cache_control: Cache-Control header value
+    """
+    etag = compute_etag(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,162 @@
+"""
+Fast serialization of query result payloads.
+
+Results can be returned column-oriented ({"columns": [...], "data": [[...], ...]},
+one value array per column) serialized with orjson, or as an Arrow IPC stream.
+Both are built directly from DataFrames or Arrow tables, so numeric columns
+are written from their numpy buffers instead of row by row through Python
+dicts and Pydantic models.
+
+numpy, pandas and pyarrow are imported on first use so importing the API
+does not load them.
+"""
+
+import datetime
+import decimal
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+import orjson
+from fastapi.responses import Response
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    import pyarrow as pa
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Supported values for the `format` query parameter of result endpoints
+RESULT_FORMAT_ROWS = "rows"
+RESULT_FORMAT_COLUMNAR = "columnar"
+RESULT_FORMAT_PATTERN = f"^({RESULT_FORMAT_ROWS}|{RESULT_FORMAT_COLUMNAR})$"
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for types orjson does not serialize natively."""
+    import numpy as np
+    import pandas as pd
+
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, pd.Timestamp):
+        return None if pd.isna(obj) else obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime.timedelta, pd.Timedelta)):
+        return obj.total_seconds()
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to JSON bytes. NaN and infinities become null."""
+    return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+
+
+def _numpy_column(values: "np.ndarray") -> Any:
+    """Pass numeric arrays through to orjson; anything else becomes a list."""
+    import numpy as np
+    import pandas as pd
+
+    if values.dtype.kind in "biuf" and values.ndim == 1:
+        return np.ascontiguousarray(values)
+    if values.dtype.kind == "M":
+        # datetime64 columns: ISO strings with NaT as null
+        return [None if pd.isna(v) else v.isoformat() for v in pd.DatetimeIndex(values)]
+    return values.tolist()
+
+
+def dataframe_to_columnar(df: "pd.DataFrame") -> Dict[str, Any]:
+    """
+    Column-oriented payload for a DataFrame.
+
+    Returns:
+        {"columns": [...], "row_count": n, "data": [values per column]}
+    """
+    return {
+        "columns": [str(c) for c in df.columns],
+        "row_count": len(df),
+        "data": [_numpy_column(df[c].to_numpy()) for c in df.columns]
+    }
+
+
+def arrow_to_columnar(table: "pa.Table") -> Dict[str, Any]:
+    """Column-oriented payload for an Arrow table (same shape as dataframe_to_columnar)."""
+    import pyarrow as pa
+
+    data = []
+    for column in table.columns:
+        if (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)) and column.null_count == 0:
+            data.append(_numpy_column(column.to_numpy()))
+        elif pa.types.is_timestamp(column.type) or pa.types.is_date(column.type):
+            data.append([None if v is None else v.isoformat() for v in column.to_pylist()])
+        else:
+            data.append(column.to_pylist())
+    return {
+        "columns": list(table.column_names),
+        "row_count": table.num_rows,
+        "data": data
+    }
+
+
+def rows_to_columnar(rows: Sequence[Dict[str, Any]], columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Column-oriented payload for records already in row form (inline JSON results)."""
+    if columns is None:
+        columns = list(rows[0].keys()) if rows else []
+    return {
+        "columns": columns,
+        "row_count": len(rows),
+        "data": [[row.get(c) for row in rows] for c in columns]
+    }
+
+
+def rows_to_arrow(rows: Sequence[Dict[str, Any]]) -> "pa.Table":
+    """Arrow table for records in row form."""
+    import pyarrow as pa
+
+    return pa.Table.from_pylist(list(rows))
+
+
+def arrow_to_ipc(table: "pa.Table") -> bytes:
+    """Serialize an Arrow table as an IPC stream."""
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def accepts_arrow(accept: Optional[str]) -> bool:
+    """Whether an Accept header asks for an Arrow IPC stream."""
+    return bool(accept) and ARROW_STREAM_MEDIA_TYPE in accept
+
+
+class ORJSONResponse(Response):
+    """JSON response rendered with orjson; the content is not validated by Pydantic."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class ArrowResponse(Response):
+    """Arrow IPC stream response."""
+
+    media_type = ARROW_STREAM_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return content
+        return arrow_to_ipc(content)
@@ -0,0 +1,59 @@
+"""
+Stage timing for the analysis pipeline.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Iterator, TypeVar
+
+from app.core.metrics import analysis_stage_seconds, analysis_total_seconds
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """
+    Records wall-clock duration per named stage and exports each to Prometheus.
+
+    Example:
+        timer = StageTimer()
+        with timer.stage("intent"):
+            intent = await processor.analyze_query(question)
+        narrative = await timer.measure("narrative", generator.generate_narrative(...))
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - start)
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Await `awaitable`, timing it as stage `name` (usable with asyncio.create_task)."""
+        with self.stage(name):
+            return await awaitable
+
+    @property
+    def total_ms(self) -> int:
+        """Milliseconds since the timer was created."""
+        return int((time.perf_counter() - self.started_at) * 1000)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Stage durations in milliseconds, plus the running total."""
+        return {**self.timings, "total": self.total_ms}
+
+    def finish(self, status: str) -> None:
+        """Export the end-to-end duration."""
+        analysis_total_seconds.labels(status=status).observe(time.perf_counter() - self.started_at)
+
+    def _record(self, name: str, seconds: float) -> None:
+        # Stages that run more than once accumulate
+        self.timings[name] = round(self.timings.get(name, 0.0) + seconds * 1000, 2)
+        analysis_stage_seconds.labels(stage=name).observe(seconds)
@@ -0,0 +1,11 @@
+"""
+End-to-end load-test harness.
+
+Boots the API under uvicorn against a generated SQLite warehouse, with the
+fake LLM provider (LLM_PROVIDER=fake) standing in for the real one. It
+drives /queries/analyze, /alerts and /reports traffic at a fixed arrival
+rate, then reports latency percentiles, throughput, error rate and the
+per-stage breakdown of analyze calls. Configurations with different worker
+counts or settings can be run back to back and compared. Run
+`python -m loadtest --help` for options.
+"""
@@ -0,0 +1,131 @@
+"""
+Command line for the load-test harness.
+
+    python -m loadtest --rate 20 --duration 60 --llm-latency-ms 300 \\
+        --config baseline:WORKERS=1 \\
+        --config four-workers:WORKERS=4 \\
+        --config no-fast-path:WORKERS=4,INTENT_FAST_PATH_ENABLED=false \\
+        --output loadtest-results.json
+
+Each --config is NAME:KEY=VALUE,...; WORKERS sets the uvicorn worker count
+and every other key is passed to the server as a setting override.
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List
+
+from cryptography.fernet import Fernet
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """'analyze=6,alerts=2,reports=2' -> weights per request kind."""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def parse_configuration(text: str):
+    """'name:WORKERS=2,KEY=VALUE' -> Configuration."""
+    from loadtest.runner import Configuration
+
+    name, _, assignments = text.partition(":")
+    configuration = Configuration(name=name.strip())
+    for assignment in filter(None, assignments.split(",")):
+        key, _, value = assignment.partition("=")
+        if key.strip().upper() == "WORKERS":
+            configuration.workers = int(value)
+        else:
+            configuration.env[key.strip()] = value.strip()
+    return configuration
+
+
+def base_environment(args: argparse.Namespace) -> Dict[str, str]:
+    """Settings shared by every configuration: fake LLM, no rate limiting, no SQL echo."""
+    return {
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "loadtest-secret"),
+        "ENCRYPTION_KEY": os.environ.get("ENCRYPTION_KEY") or Fernet.generate_key().decode(),
+        "ENVIRONMENT": "loadtest",
+        "LOG_LEVEL": "WARNING",
+        "LLM_PROVIDER": "fake",
+        "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "FAKE_LLM_JITTER_MS": str(args.llm_jitter_ms),
+        "FAKE_LLM_FAILURE_RATE": str(args.llm_failure_rate),
+        "RATE_LIMIT_ENABLED": "false",
+        **({"DATABASE_URL": args.database_url} if args.database_url else {})
+    }
+
+
+def format_results(results: List[Dict]) -> str:
+    """Side-by-side table of the headline numbers per configuration and request kind."""
+    header = f"{'configuration':<20} {'kind':<8} {'reqs':>6} {'rps':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        name = result["configuration"]["name"]
+        rows = [("all", result.get("overall"))] + list(result["by_kind"].items())
+        for kind, stats in rows:
+            if not stats:
+                continue
+            latency = stats["latency_ms"]
+            lines.append(
+                f"{name:<20} {kind:<8} {stats['requests']:>6} {stats['throughput_rps']:>7.1f} "
+                f"{stats['error_rate'] * 100:>5.1f}% {_ms(latency['p50'])} {_ms(latency['p95'])} {_ms(latency['p99'])}"
+            )
+        stages = result["analyze_stages_ms"]
+        if stages:
+            breakdown = ", ".join(f"{stage} {values['p50']:.0f}/{values['p95']:.0f}" for stage, values in stages.items())
+            lines.append(f"{'':<20} stages p50/p95 ms: {breakdown}")
+    return "\n".join(lines)
+
+
+def _ms(value) -> str:
+    return f"{value:>8.1f}" if value is not None else f"{'-':>8}"
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest", description="Load test the analyze API against fixture data.")
+    parser.add_argument("--rate", type=float, default=10.0, help="Mean requests per second (Poisson arrivals)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of traffic per configuration")
+    parser.add_argument("--mix", type=parse_mix, default="analyze=6,alerts=2,reports=2",
+                        help="Relative weights of analyze, alerts and reports requests")
+    parser.add_argument("--config", dest="configurations", type=parse_configuration, action="append",
+                        help="NAME:WORKERS=n,SETTING=value (repeatable; configurations run one after another)")
+    parser.add_argument("--rows", type=int, default=50_000, help="Rows in the fixture sales table")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Fake LLM latency per call")
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0, help="Fake LLM uniform jitter per call")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0, help="Fake LLM injected failure probability")
+    parser.add_argument("--database-url", help="Metadata database (default: a fresh SQLite file per configuration)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the full results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    # Applied before any app module is imported, so fixture seeding uses the server's settings
+    env = base_environment(args)
+    os.environ.update(env)
+    # Settings require a database URL; seeding and the server use the per-configuration one
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    from loadtest.runner import Configuration, run_configuration
+
+    results = []
+    for configuration in args.configurations or [Configuration(name="default")]:
+        print(f"Running {configuration.name} ({configuration.workers} worker(s)) for {args.duration:.0f}s at {args.rate}/s...",
+              file=sys.stderr)
+        results.append(run_configuration(
+            configuration, args.rate, args.duration, args.mix, args.rows, env, args.port, args.seed
+        ))
+
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+SQLite fixture data for load tests.
+
+The warehouse holds a `sales` table with the columns of FAKE_FIXTURE_SCHEMA,
+so the fake LLM's rule-generated SQL runs against it unchanged. The metadata
+database gets one analyst and one data source pointing at the warehouse.
+"""
+
+import random
+import sqlite3
+import uuid
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+REGIONS = ["North", "South", "East", "West", "Central"]
+PRODUCTS = ["Widget", "Gadget", "Gizmo", "Doohickey", "Sprocket", "Flange", "Bracket", "Valve"]
+CHANNELS = ["online", "retail", "partner"]
+
+# Questions sent to /queries/analyze; all are answerable by the fake provider from the fixture schema
+QUESTIONS = [
+    "What is total revenue by region?",
+    "Show revenue by product",
+    "Total units by channel",
+    "Compare revenue by region vs channel",
+    "How is revenue trending over time by region?",
+    "Why did revenue drop in the West region last month?",
+    "Which product sold the most units?",
+    "What is total revenue?",
+    "Revenue by channel for the last quarter",
+    "Top products by revenue"
+]
+
+
+@dataclass
+class Fixture:
+    """Ids the load driver needs."""
+    user_id: str
+    data_source_id: str
+
+
+def build_warehouse(path: str, rows: int, seed: int = 0) -> None:
+    """Create the sales table with `rows` synthetic order lines."""
+    rng = random.Random(seed)
+    start = date(2023, 1, 1)
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "CREATE TABLE sales (order_date DATE, region TEXT, product TEXT, channel TEXT, revenue DECIMAL, units INTEGER)"
+        )
+        batch = []
+        for _ in range(rows):
+            units = rng.randint(1, 20)
+            batch.append((
+                (start + timedelta(days=rng.randrange(730))).isoformat(),
+                rng.choice(REGIONS),
+                rng.choice(PRODUCTS),
+                rng.choice(CHANNELS),
+                round(units * rng.uniform(5, 120), 2),
+                units
+            ))
+            if len(batch) == 10_000:
+                connection.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        connection.executemany("INSERT INTO sales VALUES (?, ?, ?, ?, ?, ?)", batch)
+        connection.execute("CREATE INDEX ix_sales_region ON sales (region)")
+
+
+def seed_metadata(database_url: str, warehouse_path: str) -> Fixture:
+    """
+    Create the application tables and register the warehouse as a data source.
+
+    Must run after the load-test environment is applied (ENCRYPTION_KEY in
+    particular), since credentials are encrypted with the app's settings.
+    """
+    from sqlalchemy import create_engine
+
+    from app.models.database import Base
+    from app.models import alert, alert_execution, audit_log, insight_cache, query, report, report_version  # noqa: F401
+    from app.models.data_source import DataSource, SourceType
+    from app.models.user import User, UserRole
+    from app.services.llm.fake_service import FAKE_FIXTURE_SCHEMA
+    from app.utils.encryption import EncryptionService
+
+    user_id = uuid.uuid4()
+    data_source_id = uuid.uuid4()
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert().values(
+            id=user_id, email=f"loadtest-{user_id.hex[:8]}@example.com", hashed_password="x", role=UserRole.ANALYST
+        ))
+        # The executor accepts an encrypted bare connection string; the declared type is not used
+        connection.execute(DataSource.__table__.insert().values(
+            id=data_source_id, name=f"Load test warehouse {data_source_id.hex[:8]}", source_type=SourceType.POSTGRESQL,
+            connection_config={"encrypted": EncryptionService().encrypt(f"sqlite:///{warehouse_path}")},
+            schema_metadata=FAKE_FIXTURE_SCHEMA, created_by=user_id
+        ))
+    engine.dispose()
+    return Fixture(user_id=str(user_id), data_source_id=str(data_source_id))
@@ -0,0 +1,270 @@
+"""
+Offline replay of recorded analyze traces (see app/core/tracing.py).
+
+    python -m loadtest.replay data/traces --repeat 5 --output before.json
+    # ...change the code...
+    python -m loadtest.replay data/traces --repeat 5 --compare before.json
+
+Each trace runs through the real AnalysisPipeline in-process:
+
+- LLM calls are answered by ReplayLLMService from the recorded responses.
+- The recorded data source (schema, semantic model) is re-created in a
+  scratch SQLite metadata database.
+- Execution reads a synthetic SQLite table with the recorded result's
+  columns, dtypes, null counts, cardinalities and row count.
+
+The recorded SQL still goes through validation. It is not run, because it
+targets the original warehouse, which replay does not have. Downstream
+stages see a result of the same shape, so their timings can be compared
+between runs.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import uuid
+from typing import Any, Dict, List, Optional
+
+from cryptography.fernet import Fernet
+
+RESULT_TABLE = "replay_result"
+
+
+def build_dataset(path: str, result: Dict[str, Any], seed: int = 0) -> None:
+    """Write a synthetic table shaped like a recorded result to a SQLite file."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    rows = result["row_count"]
+    frame = pd.DataFrame({
+        column["name"]: _synthetic_column(column, rows, rng) for column in result["columns"]
+    })
+    with sqlite3.connect(path) as connection:
+        frame.to_sql(RESULT_TABLE, connection, index=False)
+
+
+def _synthetic_column(column: Dict[str, Any], rows: int, rng) -> Any:
+    import pandas as pd
+
+    dtype = column["dtype"]
+    distinct = max(1, min(column.get("unique_count") or rows or 1, rows or 1))
+    codes = rng.integers(0, distinct, size=rows)
+    if dtype.startswith("datetime"):
+        values = pd.Series(pd.date_range("2024-01-01", periods=distinct, freq="D")[codes])
+    elif dtype.startswith(("int", "uint")):
+        values = pd.Series(codes, dtype="int64")
+    elif dtype.startswith("float"):
+        values = pd.Series(rng.normal(1000, 250, size=rows).round(2))
+    elif dtype == "bool":
+        values = pd.Series(codes % 2 == 0)
+    else:
+        values = pd.Series([f"{column['name']}_{code}" for code in codes], dtype="object")
+
+    nulls = min(column.get("null_count") or 0, rows)
+    if nulls:
+        values = values.astype("object") if dtype.startswith(("int", "bool")) else values
+        values.iloc[rng.choice(rows, size=nulls, replace=False)] = None
+    return values
+
+
+def _replay_executor_class():
+    from app.services.data.executor import QueryExecutor
+
+    class ReplayQueryExecutor(QueryExecutor):
+        """Reads the synthetic result table in place of the recorded SQL."""
+
+        async def execute_query(self, sql, data_source):
+            return await super().execute_query(f"SELECT * FROM {RESULT_TABLE}", data_source)
+
+    return ReplayQueryExecutor
+
+
+def replay_trace(trace: Dict[str, Any], workdir: str, repeat: int = 1, replay_latency: bool = False) -> Dict[str, Any]:
+    """
+    Run one trace `repeat` times and collect the stage timings of each run.
+
+    Repeats share services and caches, like consecutive requests on a warm worker.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.config import settings
+    from app.models import alert, alert_execution, audit_log, insight_cache, report, report_version  # noqa: F401
+    from app.models.data_source import DataSource, SourceType
+    from app.models.database import Base
+    from app.models.query import Query, QueryStatus
+    from app.models.user import User, UserRole
+    from app.services.analysis.narrative_generator import NarrativeGenerator
+    from app.services.analysis.pipeline import AnalysisPipeline
+    from app.services.analysis.query_processor import QueryProcessor
+    from app.services.data.sql_generator import SQLGenerator
+    from app.services.llm.replay_service import ReplayLLMService
+    from app.services.llm.router import ModelRouter
+    from app.services.storage.blob_store import LocalBlobStore
+    from app.services.storage.result_store import ResultStore
+    from app.utils.encryption import EncryptionService
+
+    trace_dir = os.path.join(workdir, trace["trace_id"])
+    os.makedirs(trace_dir, exist_ok=True)
+    warehouse_path = os.path.join(trace_dir, "warehouse.db")
+    if trace.get("result"):
+        build_dataset(warehouse_path, trace["result"])
+
+    engine = create_engine(f"sqlite:///{os.path.join(trace_dir, 'metadata.db')}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+    recorded = trace["data_source"]
+    user = User(id=uuid.uuid4(), email=f"replay-{trace['trace_id'][:8]}@example.com", hashed_password="x", role=UserRole.ANALYST)
+    data_source = DataSource(
+        id=uuid.UUID(recorded["id"]), name=f"Replay {trace['trace_id'][:8]}", source_type=SourceType.POSTGRESQL,
+        connection_config={"encrypted": EncryptionService().encrypt(f"sqlite:///{warehouse_path}")},
+        schema_metadata=recorded.get("schema_metadata"), semantic_model=recorded.get("semantic_model"),
+        created_by=user.id
+    )
+    with Session() as db:
+        db.add_all([user, data_source])
+        db.commit()
+
+    processor, sql_generator, narrative_generator = QueryProcessor(), SQLGenerator(), NarrativeGenerator()
+    pipeline = AnalysisPipeline(
+        query_processor=processor,
+        sql_generator=sql_generator,
+        narrative_generator=narrative_generator,
+        query_executor=_replay_executor_class()(),
+        result_store=ResultStore(blob_store=LocalBlobStore(os.path.join(trace_dir, "results")))
+    )
+
+    runs = []
+    for _ in range(repeat):
+        llm = ReplayLLMService(trace["llm_calls"], replay_latency=replay_latency)
+        router = ModelRouter(fast=llm, strong=llm, enabled=settings.LLM_ROUTING_ENABLED)
+        processor.llm = sql_generator.llm = narrative_generator.llm = router
+
+        with Session() as db:
+            db_query = Query(user_id=user.id, natural_language_query=trace["question"], status=QueryStatus.PENDING)
+            db.add(db_query)
+            db.commit()
+            error = None
+            try:
+                asyncio.run(pipeline.run(db, db_query, data_source))
+            except Exception as e:
+                error = str(e)
+            runs.append({
+                "status": db_query.status.value,
+                "error": error or db_query.error_message,
+                "stage_timings": db_query.stage_timings or {},
+                "llm_mismatches": llm.mismatches
+            })
+    engine.dispose()
+
+    return {
+        "trace_id": trace["trace_id"],
+        "question": trace["question"],
+        "recorded": {"status": trace.get("status"), "stage_timings": trace.get("stage_timings") or {}},
+        "runs": runs,
+        "stage_timings_ms": median_timings([run["stage_timings"] for run in runs])
+    }
+
+
+def median_timings(timings: List[Dict[str, float]]) -> Dict[str, float]:
+    """Per-stage median over runs; stages missing from a run are left out for that run."""
+    stages: Dict[str, List[float]] = {}
+    for run in timings:
+        for stage, ms in run.items():
+            stages.setdefault(stage, []).append(ms)
+    return {stage: round(statistics.median(values), 2) for stage, values in stages.items()}
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Median of each stage across traces, replayed and as recorded."""
+    return {
+        "traces": len(results),
+        "failed_runs": sum(run["status"] != "completed" for result in results for run in result["runs"]),
+        "stage_timings_ms": median_timings([result["stage_timings_ms"] for result in results]),
+        "recorded_stage_timings_ms": median_timings([result["recorded"]["stage_timings"] for result in results])
+    }
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Dict[str, Optional[float]]]:
+    """Per-stage change between two replay summaries."""
+    old, new = before["stage_timings_ms"], after["stage_timings_ms"]
+    changes = {}
+    for stage in list(old) + [stage for stage in new if stage not in old]:
+        a, b = old.get(stage), new.get(stage)
+        changes[stage] = {
+            "before_ms": a,
+            "after_ms": b,
+            "change_pct": round((b - a) / a * 100, 1) if a and b is not None else None
+        }
+    return changes
+
+
+def format_summary(summary: Dict[str, Any], changes: Optional[Dict[str, Dict[str, Optional[float]]]] = None) -> str:
+    lines = [f"{summary['traces']} trace(s), {summary['failed_runs']} failed run(s)"]
+    if changes:
+        lines.append(f"{'stage':<20} {'before':>10} {'after':>10} {'change':>8}")
+        for stage, change in changes.items():
+            pct = f"{change['change_pct']:+.1f}%" if change["change_pct"] is not None else "-"
+            lines.append(f"{stage:<20} {_ms(change['before_ms'])} {_ms(change['after_ms'])} {pct:>8}")
+    else:
+        lines.append(f"{'stage':<20} {'replayed':>10} {'recorded':>10}")
+        recorded = summary["recorded_stage_timings_ms"]
+        for stage, ms in summary["stage_timings_ms"].items():
+            lines.append(f"{stage:<20} {_ms(ms)} {_ms(recorded.get(stage))}")
+    return "\n".join(lines)
+
+
+def _ms(value) -> str:
+    return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m loadtest.replay", description="Replay recorded analyze traces offline.")
+    parser.add_argument("paths", nargs="+", help="Trace files (.jsonl) or directories of them")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per trace; stage timings are the median")
+    parser.add_argument("--limit", type=int, help="Replay at most this many traces")
+    parser.add_argument("--replay-latency", action="store_true", help="Wait for each LLM call's recorded latency")
+    parser.add_argument("--output", help="Write per-trace results and the summary as JSON to this file")
+    parser.add_argument("--compare", help="A previous --output file to compare stage timings against")
+    args = parser.parse_args(argv)
+
+    # Applied before any app module is imported; replays must not record traces of their own
+    os.environ.update({
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "replay-secret"),
+        "ENCRYPTION_KEY": os.environ.get("ENCRYPTION_KEY") or Fernet.generate_key().decode(),
+        "DATABASE_URL": os.environ.get("DATABASE_URL", "sqlite://"),
+        "LLM_PROVIDER": "fake",
+        "TRACE_RECORDING_ENABLED": "false"
+    })
+
+    from app.core.tracing import load_traces
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="replay-") as workdir:
+        for index, trace in enumerate(load_traces(args.paths)):
+            if args.limit is not None and index >= args.limit:
+                break
+            print(f"Replaying {trace['trace_id']}: {trace['question']}", file=sys.stderr)
+            results.append(replay_trace(trace, workdir, args.repeat, args.replay_latency))
+
+    summary = summarize(results)
+    changes = None
+    if args.compare:
+        with open(args.compare) as f:
+            changes = compare(json.load(f)["summary"], summary)
+    print(format_summary(summary, changes))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"summary": summary, "traces": results, **({"changes": changes} if changes else {})}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Boots the API under uvicorn and drives open-loop traffic against it.
+
+Requests arrive as a Poisson process at the configured rate, independent of
+how fast the server answers, so queueing shows up as latency instead of
+silently lowering the offered load.
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+from loadtest.fixtures import QUESTIONS, Fixture, build_warehouse, seed_metadata
+
+KIND_ANALYZE = "analyze"
+KIND_ALERTS = "alerts"
+KIND_REPORTS = "reports"
+KINDS = (KIND_ANALYZE, KIND_ALERTS, KIND_REPORTS)
+
+PERCENTILES = (50, 90, 95, 99)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass
+class Configuration:
+    """One server setup to measure."""
+    name: str
+    workers: int = 1
+    env: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class Sample:
+    """One completed (or failed) request."""
+    kind: str
+    latency_ms: float
+    status: int
+    stage_timings: Optional[Dict[str, float]] = None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 400
+
+
+@contextmanager
+def serve(configuration: Configuration, env: Dict[str, str], port: int, ready_timeout: float = 120.0) -> Iterator[str]:
+    """Run uvicorn with `configuration` until the block exits; yields the base URL once /ready is 200."""
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(configuration.workers), "--log-level", "warning", "--no-access-log"
+    ]
+    process = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env, **configuration.env})
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_ready(process, base_url, ready_timeout)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def _wait_until_ready(process: subprocess.Popen, base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} before becoming ready")
+        try:
+            # With several workers each answers for itself; a few consecutive 200s is close enough
+            if all(httpx.get(f"{base_url}/ready", timeout=2).status_code == 200 for _ in range(3)):
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+async def drive(
+    base_url: str,
+    fixture: Fixture,
+    rate: float,
+    duration: float,
+    mix: Dict[str, float],
+    seed: int = 0,
+    timeout: float = 120.0
+) -> List[Sample]:
+    """
+    Send requests at `rate` per second for `duration` seconds.
+
+    Args:
+        base_url: Server root
+        fixture: Seeded user and data source
+        rate: Mean arrivals per second
+        duration: Seconds during which new requests are started
+        mix: Relative weight of each request kind
+        seed: Seed for arrivals, kinds and questions
+        timeout: Per-request timeout in seconds
+
+    Returns:
+        One sample per request, after all of them have finished
+    """
+    rng = random.Random(seed)
+    kinds = [k for k in KINDS if mix.get(k, 0) > 0]
+    weights = [mix[k] for k in kinds]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        tasks = []
+        started = time.perf_counter()
+        next_arrival = rng.expovariate(rate)
+        while next_arrival < duration:
+            delay = started + next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = rng.choices(kinds, weights)[0]
+            tasks.append(asyncio.create_task(_request(client, kind, fixture, rng.choice(QUESTIONS))))
+            next_arrival += rng.expovariate(rate)
+        return list(await asyncio.gather(*tasks))
+
+
+async def _request(client: httpx.AsyncClient, kind: str, fixture: Fixture, question: str) -> Sample:
+    started = time.perf_counter()
+    stage_timings = None
+    try:
+        if kind == KIND_ANALYZE:
+            response = await client.post("/api/v1/queries/analyze", json={
+                "natural_language_query": question,
+                "data_source_id": fixture.data_source_id,
+                "user_id": fixture.user_id
+            })
+            if response.status_code == 200:
+                stage_timings = response.json().get("stage_timings")
+        elif kind == KIND_ALERTS:
+            response = await client.get("/api/v1/alerts/alerts", params={"limit": 50})
+        else:
+            response = await client.get("/api/v1/reports/loadtest/render")
+        status = response.status_code
+    except httpx.HTTPError:
+        status = 0
+    return Sample(kind=kind, latency_ms=(time.perf_counter() - started) * 1000, status=status, stage_timings=stage_timings)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p90/p95/p99 and max of `values` (None when empty)."""
+    if not values:
+        return {**{f"p{p}": None for p in PERCENTILES}, "max": None}
+    if len(values) == 1:
+        return {**{f"p{p}": round(values[0], 1) for p in PERCENTILES}, "max": round(values[0], 1)}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {**{f"p{p}": round(cuts[p - 1], 1) for p in PERCENTILES}, "max": round(max(values), 1)}
+
+
+def summarize(samples: List[Sample], duration: float) -> Dict[str, Any]:
+    """Latency percentiles, throughput and error rate per request kind, plus analyze stage breakdowns."""
+    summary: Dict[str, Any] = {"requests": len(samples), "by_kind": {}}
+    for kind in [None, *KINDS]:
+        group = [s for s in samples if kind is None or s.kind == kind]
+        if not group:
+            continue
+        ok = [s for s in group if s.ok]
+        stats = {
+            "requests": len(group),
+            "throughput_rps": round(len(ok) / duration, 2),
+            "error_rate": round(1 - len(ok) / len(group), 4),
+            "latency_ms": percentiles([s.latency_ms for s in ok])
+        }
+        if kind is None:
+            summary["overall"] = stats
+        else:
+            summary["by_kind"][kind] = stats
+
+    stages: Dict[str, List[float]] = {}
+    for sample in samples:
+        for stage, ms in (sample.stage_timings or {}).items():
+            stages.setdefault(stage, []).append(ms)
+    summary["analyze_stages_ms"] = {
+        stage: {"mean": round(statistics.fmean(values), 1), **percentiles(values)}
+        for stage, values in stages.items()
+    }
+    return summary
+
+
+def run_configuration(
+    configuration: Configuration,
+    rate: float,
+    duration: float,
+    mix: Dict[str, float],
+    warehouse_rows: int,
+    env: Dict[str, str],
+    port: int,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Seed fresh fixture data, boot the server with `configuration` and measure it."""
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        warehouse_path = os.path.join(workdir, "warehouse.db")
+        build_warehouse(warehouse_path, warehouse_rows, seed)
+        database_url = env.get("DATABASE_URL") or f"sqlite:///{os.path.join(workdir, 'metadata.db')}"
+        fixture = seed_metadata(database_url, warehouse_path)
+        server_env = {
+            **env,
+            "DATABASE_URL": database_url,
+            "RESULT_STORE_PATH": os.path.join(workdir, "results")
+        }
+        with serve(configuration, server_env, port) as base_url:
+            samples = asyncio.run(drive(base_url, fixture, rate, duration, mix, seed))
+    return {
+        "configuration": {"name": configuration.name, "workers": configuration.workers, "env": configuration.env},
+        "rate": rate,
+        "duration_s": duration,
+        **summarize(samples, duration)
+    }
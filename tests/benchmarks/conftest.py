@@ -0,0 +1,85 @@
+"""
+Microbenchmarks for the data and analysis hot paths (pytest-benchmark).
+
+Benchmarks are skipped in the regular test run. Record a baseline, then
+compare later runs against it (runs are saved as JSON under .benchmarks/):
+
+    pytest tests/benchmarks --benchmark-only --benchmark-save=baseline
+    pytest tests/benchmarks --benchmark-only --benchmark-compare --benchmark-compare-fail=mean:15%
+
+Frames have a date column, a region column and numeric metrics up to the
+requested width. BENCHMARK_SIZES=full adds the 1M-row shapes; the default
+shapes stop at 100k rows.
+"""
+
+import os
+import sqlite3
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    collect_ignore_glob = ["test_*.py"]
+
+BENCHMARK_DIR = Path(__file__).parent
+
+REGIONS = ["North", "South", "East", "West", "Central"]
+
+# (rows, columns)
+STANDARD_SHAPES: List[Tuple[int, int]] = [(1_000, 5), (1_000, 200), (100_000, 5), (100_000, 50)]
+# 1M-row frames are capped at 20 columns to stay within a few hundred MB
+FULL_SHAPES: List[Tuple[int, int]] = STANDARD_SHAPES + [(100_000, 200), (1_000_000, 5), (1_000_000, 20)]
+
+SHAPES = FULL_SHAPES if os.environ.get("BENCHMARK_SIZES") == "full" else STANDARD_SHAPES
+
+
+def shape_id(shape: Tuple[int, int]) -> str:
+    rows, columns = shape
+    size = f"{rows // 1_000_000}M" if rows >= 1_000_000 else f"{rows // 1000}k"
+    return f"{size}_rows-{columns}_cols"
+
+
+def make_frame(rows: int, columns: int, seed: int = 0) -> pd.DataFrame:
+    """A reproducible result-like frame: day, region, then numeric metrics."""
+    rng = np.random.default_rng(seed)
+    data = {
+        "day": pd.date_range("2020-01-01", periods=rows, freq="h"),
+        "region": rng.choice(REGIONS, rows)
+    }
+    for i in range(columns - 2):
+        if i % 3 == 2:
+            data[f"metric_{i}"] = rng.integers(0, 10_000, rows)
+        else:
+            data[f"metric_{i}"] = rng.normal(1_000, 250, rows)
+    return pd.DataFrame(data)
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("benchmark_only", False) or config.getoption("benchmark_enable", False):
+        return
+    skip = pytest.mark.skip(reason="benchmarks run with --benchmark-only")
+    for item in items:
+        if BENCHMARK_DIR in Path(str(item.fspath)).parents:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session", params=SHAPES, ids=shape_id)
+def frame(request) -> pd.DataFrame:
+    return make_frame(*request.param)
+
+
+@pytest.fixture(scope="session")
+def sqlite_source(frame, tmp_path_factory):
+    """SQLite warehouse holding `frame` as table facts; yields its engine."""
+    path = tmp_path_factory.mktemp("warehouse") / "facts.db"
+    with sqlite3.connect(path) as connection:
+        frame.to_sql("facts", connection, index=False, chunksize=50_000)
+    engine = create_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
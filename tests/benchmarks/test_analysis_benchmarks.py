@@ -0,0 +1,49 @@
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.api.v1.endpoints.queries import _format_response
+from app.models.query import Query, QueryStatus
+# Register every model so relationships resolve, as importing the API does
+from app.models import alert, alert_execution, audit_log, data_source, insight_cache, report, report_version, user  # noqa: F401
+from app.services.analysis.stats_engine import StatsEngine
+from app.services.visualization.chart_generator import ChartGenerator
+
+
+def test_summary_stats(benchmark, frame):
+    stats = benchmark(StatsEngine.calculate_summary_stats, frame)
+    assert "metric_0" in stats
+
+
+@pytest.mark.parametrize("method", ["zscore", "iqr"])
+def test_detect_anomalies(benchmark, frame, method):
+    anomalies = benchmark(StatsEngine.detect_anomalies, frame, "metric_0", method=method)
+    assert isinstance(anomalies, list)
+
+
+def test_calculate_trend(benchmark, frame):
+    trend = benchmark(StatsEngine.calculate_trend, frame, "day", "metric_0")
+    assert "error" not in trend
+
+
+@pytest.mark.parametrize("chart_type", ["line", "bar"])
+def test_generate_chart(benchmark, frame, chart_type):
+    chart = benchmark(ChartGenerator.generate_chart, frame, chart_type, "day", "metric_0")
+    assert "data" in chart
+
+
+def test_format_response(benchmark, frame):
+    records = frame.to_dict(orient="records")
+    query = Query(
+        id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        natural_language_query="Revenue by region",
+        generated_sql="SELECT * FROM facts",
+        results={"data": records, "narrative": {"summary": "Revenue is flat."}},
+        status=QueryStatus.COMPLETED,
+        execution_time_ms=120,
+        created_at=datetime(2024, 1, 1)
+    )
+    response = benchmark(_format_response, query)
+    assert response.row_count == len(frame)
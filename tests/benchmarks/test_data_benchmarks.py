@@ -0,0 +1,44 @@
+import pytest
+
+from app.services.data.executor import QueryExecutor
+from app.services.data.sql_validator import SQLValidator
+from app.utils.serialization import dataframe_to_columnar, dumps
+
+
+def _report_sql(columns: int) -> str:
+    """A generated-looking aggregate over `columns` metrics with a CTE and CASE buckets."""
+    metrics = [f"metric_{i}" for i in range(columns)]
+    sums = ",\n    ".join(f"SUM({m}) AS total_{m}" for m in metrics)
+    buckets = ",\n    ".join(
+        f"CASE WHEN {m} > 1000 THEN 'high' WHEN {m} > 500 THEN 'mid' ELSE 'low' END AS {m}_band"
+        for m in metrics[:20]
+    )
+    return (
+        "WITH recent AS (\n"
+        "  SELECT * FROM facts WHERE day >= '2024-01-01' AND region IN ('North', 'West')\n"
+        ")\n"
+        f"SELECT region,\n    {sums},\n    {buckets}\n"
+        "FROM recent\nGROUP BY region\nORDER BY region\nLIMIT 1000"
+    )
+
+
+@pytest.mark.parametrize("columns", [5, 50, 200])
+def test_validate_sql(benchmark, columns):
+    sql = _report_sql(columns)
+    assert benchmark(SQLValidator.validate_sql, sql)
+
+
+def test_read_sql_from_sqlite(benchmark, sqlite_source, frame):
+    df = benchmark(QueryExecutor._read_sql, sqlite_source, "SELECT * FROM facts")
+    assert df.shape == frame.shape
+
+
+def test_frame_to_records(benchmark, frame):
+    # How the pipeline stores inline results on Query.results
+    records = benchmark(frame.to_dict, orient="records")
+    assert len(records) == len(frame)
+
+
+def test_frame_to_columnar_json(benchmark, frame):
+    payload = benchmark(lambda: dumps(dataframe_to_columnar(frame)))
+    assert payload.startswith(b"{")
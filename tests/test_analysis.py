@@ -1,9 +1,25 @@
+import asyncio
+import uuid
 import pytest
 import pandas as pd
 import numpy as np
-from unittest.mock import AsyncMock, patch
+from datetime import date, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
 from app.services.analysis.stats_engine import StatsEngine
 from app.services.analysis.narrative_generator import NarrativeGenerator
+from app.services.analysis.query_processor import QueryProcessor, QueryIntent
+from app.services.analysis.intent_classifier import RuleBasedIntentClassifier, intent_stats
+from app.services.semantic.compiler import DEFAULT_ROW_LIMIT, SemanticCompiler, resolve_time_range
+from app.services.analysis.pipeline import AnalysisPipeline
+from app.services.analysis.follow_up import FollowUpEngine
+from app.models.query import Query, QueryStatus
+from app.models.data_source import DataSource, SourceType
+from app.models.database import Base
+from app.services.storage.insight_store import InsightCacheStats, InsightStore, MemoryInsightTier
+from app.models import user, report, report_version, alert, alert_execution, insight_cache, audit_log  # noqa: F401
 
 # --- Stats Engine Tests ---
 
@@ -87,3 +103,433 @@ async def test_generate_narrative():
         prompt = call_args.kwargs["prompt"]
         assert "increasing" in prompt
         assert "How are sales?" in prompt
+
+# --- Rule-Based Intent Classifier Tests ---
+
+SALES_SCHEMA = {
+    "sales": {
+        "columns": [
+            {"name": "order_date", "type": "DATE"},
+            {"name": "region", "type": "VARCHAR"},
+            {"name": "revenue", "type": "DECIMAL", "synonyms": ["sales"]},
+            {"name": "units", "type": "INTEGER"}
+        ]
+    }
+}
+
+def test_rule_classifier_common_patterns():
+    """Regular phrasings resolve to schema columns with high confidence."""
+    classifier = RuleBasedIntentClassifier()
+    
+    result = classifier.classify("What was total revenue last month?", SALES_SCHEMA)
+    assert result.confidence >= 0.9
+    assert result.fields["intent"] == "DESCRIPTIVE"
+    assert result.fields["metrics"] == ["revenue"]
+    assert result.fields["time_range"] == "last month"
+    
+    result = classifier.classify("Compare sales and units by region", SALES_SCHEMA)
+    assert result.confidence >= 0.9
+    assert result.fields["intent"] == "COMPARATIVE"
+    assert result.fields["metrics"] == ["revenue", "units"]
+    assert result.fields["dimensions"] == ["region"]
+
+def test_rule_classifier_defers_to_llm():
+    """Unknown vocabulary lowers confidence; reasoning questions are not matched."""
+    classifier = RuleBasedIntentClassifier()
+    
+    assert classifier.classify("Total churn by cohort", SALES_SCHEMA).confidence < 0.9
+    # Other aggregations change what the metric means; the LLM must see them
+    for question in ("Average revenue by region", "mean revenue", "Number of units by region"):
+        assert classifier.classify(question, SALES_SCHEMA).confidence < 0.9
+    assert classifier.classify("Why did revenue drop last month?", SALES_SCHEMA) is None
+
+@pytest.mark.asyncio
+async def test_query_processor_fast_path_and_fallback_stats():
+    """Confident matches skip the LLM; misses fall back and are counted."""
+    mock_llm = AsyncMock()
+    mock_llm.generate_json.return_value = {
+        "intent": "DIAGNOSTIC", "metrics": ["revenue"], "dimensions": [], "complexity": "complex"
+    }
+    intent_stats.reset()
+    
+    with patch("app.services.analysis.query_processor.LLMFactory.get_provider", return_value=mock_llm):
+        processor = QueryProcessor()
+        fast = await processor.analyze_query("Revenue by region", schema_context=SALES_SCHEMA)
+        slow = await processor.analyze_query("Why did revenue drop?", schema_context=SALES_SCHEMA)
+    
+    assert fast.intent == "DESCRIPTIVE" and fast.dimensions == ["region"]
+    assert slow.intent == "DIAGNOSTIC"
+    assert mock_llm.generate_json.call_count == 1
+    assert intent_stats.snapshot()["fallback_rate"] == 0.5
+
+# --- Semantic Layer Tests ---
+
+SEMANTIC_MODEL = {
+    "metrics": [
+        {"name": "revenue", "expression": "SUM(orders.amount)", "table": "orders",
+         "time_column": "orders.order_date", "synonyms": ["sales"]},
+        {"name": "order_count", "expression": "COUNT(orders.id)", "table": "orders",
+         "time_column": "orders.order_date"}
+    ],
+    "dimensions": [
+        {"name": "region", "column": "customers.region",
+         "joins": [{"table": "customers", "on": "customers.id = orders.customer_id"}]},
+        {"name": "month", "column": "DATE_TRUNC('month', orders.order_date)"}
+    ]
+}
+
+def test_semantic_compiler_builds_sql_from_declared_metrics():
+    """Covered intents compile to SQL with joins, filters and a date window."""
+    intent = QueryIntent(
+        intent="DESCRIPTIVE", metrics=["sales", "order_count"], dimensions=["region"],
+        time_range="last month", filters={"region": "EMEA"}, complexity="simple"
+    )
+    
+    compiled = SemanticCompiler().compile(intent, SEMANTIC_MODEL, today=date(2024, 3, 15))
+    
+    assert compiled.sql == (
+        "SELECT customers.region AS region, SUM(orders.amount) AS revenue, COUNT(orders.id) AS order_count "
+        "FROM orders LEFT JOIN customers ON customers.id = orders.customer_id "
+        "WHERE customers.region = 'EMEA' "
+        "AND orders.order_date >= '2024-02-01' AND orders.order_date < '2024-03-01' "
+        "GROUP BY customers.region ORDER BY revenue DESC LIMIT 100"
+    )
+
+def test_semantic_compiler_falls_back_when_not_covered():
+    """Unknown metrics, reasoning intents and missing models return None."""
+    compiler = SemanticCompiler()
+    unknown = QueryIntent(intent="DESCRIPTIVE", metrics=["churn"], dimensions=[], complexity="simple")
+    diagnostic = QueryIntent(intent="DIAGNOSTIC", metrics=["revenue"], dimensions=[], complexity="complex")
+    covered = QueryIntent(intent="DESCRIPTIVE", metrics=["revenue"], dimensions=[], complexity="simple")
+    
+    assert compiler.compile(unknown, SEMANTIC_MODEL) is None
+    assert compiler.compile(diagnostic, SEMANTIC_MODEL) is None
+    assert compiler.compile(covered, None) is None
+    assert compiler.compile(covered, SEMANTIC_MODEL).sql == "SELECT SUM(orders.amount) AS revenue FROM orders"
+
+def test_semantic_compiler_only_compiles_declared_aggregation():
+    """An average or count of a summed metric is not silently compiled as its sum."""
+    compiler = SemanticCompiler()
+    
+    for aggregation in ("avg", "mean", "count"):
+        intent = QueryIntent(intent="DESCRIPTIVE", metrics=["revenue"], dimensions=["region"],
+                             complexity="simple", aggregation=aggregation)
+        assert compiler.compile(intent, SEMANTIC_MODEL) is None
+    
+    total = QueryIntent(intent="DESCRIPTIVE", metrics=["revenue"], dimensions=[], complexity="simple", aggregation="sum")
+    assert compiler.compile(total, SEMANTIC_MODEL).sql == "SELECT SUM(orders.amount) AS revenue FROM orders"
+    count = QueryIntent(intent="DESCRIPTIVE", metrics=["order_count"], dimensions=[], complexity="simple", aggregation="count")
+    assert compiler.compile(count, SEMANTIC_MODEL).sql == "SELECT COUNT(orders.id) AS order_count FROM orders"
+    
+    # The fast path carries the aggregation it saw, so the question reaches the LLM uncompiled
+    result = RuleBasedIntentClassifier().classify("Average revenue by region", {}, semantic_model=SEMANTIC_MODEL)
+    assert result.fields["aggregation"] == "avg"
+    assert compiler.compile(QueryIntent(**result.fields), SEMANTIC_MODEL) is None
+
+def test_resolve_time_range():
+    """Relative phrases resolve to half-open date windows."""
+    today = date(2024, 5, 20)
+    
+    assert resolve_time_range("last quarter", today) == (date(2024, 1, 1), date(2024, 4, 1))
+    assert resolve_time_range("last 7 days", today) == (date(2024, 5, 14), date(2024, 5, 21))
+    assert resolve_time_range("q3 2023", today) == (date(2023, 7, 1), date(2023, 10, 1))
+    assert resolve_time_range("since the merger", today) is None
+
+def test_rule_classifier_uses_semantic_vocabulary():
+    """Semantic metric names and synonyms are recognised by the fast path."""
+    result = RuleBasedIntentClassifier().classify("Order count by region", {}, semantic_model=SEMANTIC_MODEL)
+    
+    assert result.confidence >= 0.9
+    assert result.fields["metrics"] == ["order_count"]
+
+# --- Analysis Pipeline Tests ---
+
+@pytest.mark.asyncio
+async def test_pipeline_records_stage_progress():
+    """Each stage is yielded in order and committed to the query row."""
+    processor = AsyncMock()
+    processor.analyze_query.return_value = QueryIntent(
+        intent="DESCRIPTIVE", metrics=["revenue"], dimensions=["region"], complexity="simple"
+    )
+    generator = AsyncMock()
+    generator.generate_sql.return_value = {"sql": "SELECT region, SUM(revenue) FROM sales GROUP BY region", "can_answer": True}
+    executor = AsyncMock()
+    executor.execute_query.return_value = pd.DataFrame({"region": ["East", "West"], "revenue": [100, 200]})
+    narrator = AsyncMock()
+    narrator.generate_narrative.return_value = {"summary": "West leads."}
+    
+    pipeline = AnalysisPipeline(
+        query_processor=processor, sql_generator=generator,
+        query_executor=executor, narrative_generator=narrator
+    )
+    db = MagicMock()
+    db_query = Query(natural_language_query="Revenue by region", status=QueryStatus.PENDING)
+    data_source = MagicMock(schema_metadata={}, semantic_model=None)
+    
+    stages = [event.stage async for event in pipeline.stream(db, db_query, data_source)]
+    
+    assert stages == ["intent", "sql", "data", "stats", "narrative"]
+    assert db_query.status == QueryStatus.COMPLETED
+    assert db_query.progress["completed"] == stages
+    assert db_query.results["narrative"] == {"summary": "West leads."}
+    assert db.commit.call_count == len(stages)
+    assert set(db_query.stage_timings) == {
+        "intent", "sql_generation", "sql_validation", "execution",
+        "result_conversion", "stats", "narrative", "total"
+    }
+    assert db_query.execution_time_ms == db_query.stage_timings["total"]
+
+@pytest.mark.asyncio
+async def test_pipeline_cancellation_skips_later_stages():
+    """Closing the stream after the first stage stops the pipeline and fails the row."""
+    processor = AsyncMock()
+    processor.analyze_query.return_value = QueryIntent(
+        intent="DESCRIPTIVE", metrics=["revenue"], dimensions=[], complexity="simple"
+    )
+    generator = AsyncMock()
+    pipeline = AnalysisPipeline(query_processor=processor, sql_generator=generator)
+    db_query = Query(natural_language_query="Total revenue", status=QueryStatus.PENDING)
+    
+    stream = pipeline.stream(MagicMock(), db_query, MagicMock(schema_metadata={}, semantic_model=None))
+    first = await stream.__anext__()
+    await stream.aclose()
+    
+    assert first.stage == "intent"
+    generator.generate_sql.assert_not_called()
+    assert db_query.status == QueryStatus.FAILED
+    assert db_query.progress["stage"] == "cancelled"
+
+@pytest.mark.asyncio
+async def test_pipeline_recomputes_once_and_revalidates_stale_insights(tmp_path):
+    """Concurrent misses share one recompute; a stale insight is served while a background task refreshes it."""
+    url = f"sqlite:///{tmp_path / 'metadata.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    data_source_id = uuid.uuid4()
+    with engine.begin() as conn:
+        conn.execute(DataSource.__table__.insert().values(
+            id=data_source_id, name="Sales DB", source_type=SourceType.POSTGRESQL, connection_config={},
+            schema_metadata={}, created_by=uuid.uuid4(), cache_stale_seconds=600
+        ))
+    engine.dispose()
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    
+    processor = AsyncMock()
+    processor.analyze_query.return_value = QueryIntent(
+        intent="DESCRIPTIVE", metrics=["revenue"], dimensions=["region"], complexity="simple"
+    )
+    async def generate_sql(*args, **kwargs):
+        await asyncio.sleep(0.1)
+        return {"sql": "SELECT region, SUM(revenue) FROM sales GROUP BY region", "can_answer": True}
+    generator = AsyncMock()
+    generator.generate_sql.side_effect = generate_sql
+    executor = AsyncMock()
+    executor.execute_query.return_value = pd.DataFrame({"region": ["East", "West"], "revenue": [100, 200]})
+    narrator = AsyncMock()
+    narrator.generate_narrative.return_value = {"summary": "West leads."}
+    store = InsightStore(ttl_seconds=3600, memory=MemoryInsightTier(), redis=None, stats=InsightCacheStats(),
+                         early_refresh_beta=0)
+    pipeline = AnalysisPipeline(
+        query_processor=processor, sql_generator=generator, query_executor=executor, narrative_generator=narrator,
+        result_store=MagicMock(should_offload=lambda df: False), insight_store=store, session_factory=session_factory
+    )
+    
+    async def ask():
+        async with session_factory() as db:
+            data_source = await db.get(DataSource, data_source_id)
+            db_query = Query(id=uuid.uuid4(), natural_language_query="Revenue by region", status=QueryStatus.PENDING)
+            await pipeline.run(db, db_query, data_source)
+            return db_query, data_source
+    
+    (first, data_source), (second, _) = await asyncio.gather(ask(), ask())
+    
+    assert generator.generate_sql.await_count == 1
+    waiter = second if second.status == QueryStatus.CACHED else first
+    assert {first.status, second.status} == {QueryStatus.COMPLETED, QueryStatus.CACHED}
+    assert "cache_wait" in waiter.stage_timings
+    
+    # Past its TTL, inside the data source's stale window
+    store.memory.get(store.cache_key("Revenue by region", data_source)).expires_at = datetime.utcnow() - timedelta(seconds=1)
+    narrator.generate_narrative.return_value = {"summary": "East caught up."}
+    stale, _ = await ask()
+    assert stale.status == QueryStatus.CACHED
+    assert stale.results["narrative"] == {"summary": "West leads."}
+    
+    await asyncio.gather(*pipeline._refreshes)
+    refreshed, _ = await ask()
+    assert generator.generate_sql.await_count == 2
+    assert refreshed.status == QueryStatus.CACHED
+    assert refreshed.results["narrative"] == {"summary": "East caught up."}
+    snapshot = store.stats.snapshot()
+    assert (snapshot["stale_hits"], snapshot["refreshes"], snapshot["lock_waits"]) == (1, 1, 1)
+    
+    # Worker pipelines recompute a stale insight inline rather than leaving a refresh task behind
+    pipeline = AnalysisPipeline(
+        query_processor=processor, sql_generator=generator, query_executor=executor, narrative_generator=narrator,
+        result_store=MagicMock(should_offload=lambda df: False), insight_store=store, session_factory=session_factory,
+        background_refresh=False
+    )
+    store.memory.get(store.cache_key("Revenue by region", data_source)).expires_at = datetime.utcnow() - timedelta(seconds=1)
+    narrator.generate_narrative.return_value = {"summary": "North entered."}
+    recomputed, _ = await ask()
+    assert recomputed.status == QueryStatus.COMPLETED
+    assert recomputed.results["narrative"] == {"summary": "North entered."}
+    assert generator.generate_sql.await_count == 3
+    assert not pipeline._refreshes
+    await async_engine.dispose()
+
+@pytest.mark.asyncio
+async def test_pipeline_completes_when_insight_write_fails(tmp_path, monkeypatch):
+    """A failed write-through leaves the request's session usable and the answer completed."""
+    url = f"sqlite:///{tmp_path / 'metadata.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    async def broken_upsert(db, values):
+        await db.execute(text("INSERT INTO missing VALUES (1)"))
+    monkeypatch.setattr("app.services.storage.insight_store._upsert", broken_upsert)
+    
+    # Like PostgreSQL, refuse statements after an error until the transaction or savepoint rolls back
+    @event.listens_for(async_engine.sync_engine, "handle_error")
+    def abort(context):
+        context.connection.info["aborted"] = True
+    
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def refuse(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("ROLLBACK TO SAVEPOINT"):
+            conn.info.pop("aborted", None)
+        elif conn.info.get("aborted"):
+            raise RuntimeError("current transaction is aborted")
+    
+    @event.listens_for(async_engine.sync_engine, "rollback")
+    def rolled_back(conn):
+        conn.info.pop("aborted", None)
+    
+    processor = AsyncMock()
+    processor.analyze_query.return_value = QueryIntent(
+        intent="DESCRIPTIVE", metrics=["revenue"], dimensions=["region"], complexity="simple"
+    )
+    generator = AsyncMock()
+    generator.generate_sql.return_value = {"sql": "SELECT region, SUM(revenue) FROM sales GROUP BY region", "can_answer": True}
+    executor = AsyncMock()
+    executor.execute_query.return_value = pd.DataFrame({"region": ["East", "West"], "revenue": [100, 200]})
+    narrator = AsyncMock()
+    narrator.generate_narrative.return_value = {"summary": "West leads."}
+    store = InsightStore(ttl_seconds=3600, memory=MemoryInsightTier(), redis=None, stats=InsightCacheStats())
+    pipeline = AnalysisPipeline(
+        query_processor=processor, sql_generator=generator, query_executor=executor, narrative_generator=narrator,
+        result_store=MagicMock(should_offload=lambda df: False), insight_store=store, session_factory=session_factory
+    )
+    
+    async with session_factory() as db:
+        data_source = DataSource(id=uuid.uuid4(), name="Sales DB", source_type=SourceType.POSTGRESQL,
+                                 connection_config={}, schema_metadata={}, created_by=uuid.uuid4())
+        db_query = Query(id=uuid.uuid4(), user_id=uuid.uuid4(), natural_language_query="Revenue by region",
+                         status=QueryStatus.PENDING)
+        db.add_all([data_source, db_query])
+        await db.commit()
+        
+        await pipeline.run(db, db_query, data_source)
+        db_query.stage_timings = {**db_query.stage_timings, "checked": 0}
+        await db.commit()
+        await db.refresh(db_query)
+    
+    assert db_query.status == QueryStatus.COMPLETED
+    assert db_query.results["narrative"] == {"summary": "West leads."}
+    # The write stays queued for the next flush
+    assert store.snapshot()["write_behind"]["pending_writes"] == 1
+    await async_engine.dispose()
+
+# --- Follow-up Engine Tests ---
+
+REGION_ROWS = [
+    {"region": "East", "product": "Widget", "revenue": 100, "margin": 0.2},
+    {"region": "West", "product": "Widget", "revenue": 300, "margin": 0.1},
+    {"region": "West", "product": "Gadget", "revenue": 200, "margin": 0.4},
+    {"region": "North", "product": "Gadget", "revenue": 50, "margin": 0.3}
+]
+
+def _parent(rows=REGION_ROWS):
+    return Query(natural_language_query="Revenue by region and product", status=QueryStatus.COMPLETED,
+                 results={"data": rows})
+
+def test_follow_up_filters_and_sorts_parent_rows():
+    result = FollowUpEngine(result_store=MagicMock()).answer("Now just the West region, sorted by margin", _parent())
+    
+    assert result.df.to_dict(orient="records") == [
+        {"region": "West", "product": "Gadget", "revenue": 200, "margin": 0.4},
+        {"region": "West", "product": "Widget", "revenue": 300, "margin": 0.1}
+    ]
+    assert [op.kind for op in result.operations] == ["filter", "sort"]
+
+def test_follow_up_top_n_and_comparisons():
+    engine = FollowUpEngine(result_store=MagicMock())
+    
+    top = engine.answer("top 2 by revenue", _parent())
+    assert top.df["revenue"].tolist() == [300, 200]
+    
+    excluded = engine.answer("exclude North", _parent())
+    assert "North" not in excluded.df["region"].tolist()
+    
+    above = engine.answer("revenue over 150", _parent())
+    assert above.df["revenue"].tolist() == [300, 200]
+
+def test_follow_up_defers_when_parent_data_cannot_answer():
+    engine = FollowUpEngine(result_store=MagicMock())
+    
+    # Unknown value, unknown column, and a question that is not a refinement
+    assert engine.answer("just the South region", _parent()) is None
+    assert engine.answer("sort by profit", _parent()) is None
+    assert engine.answer("why did revenue drop last quarter", _parent()) is None
+    # Parents that did not complete have nothing to refine
+    failed = _parent()
+    failed.status = QueryStatus.FAILED
+    assert engine.answer("just West", failed) is None
+
+def test_follow_up_defers_when_parent_rows_may_be_truncated():
+    engine = FollowUpEngine(result_store=MagicMock())
+    
+    # The parent hit the compiler's row limit: rows past it were never fetched
+    capped_rows = [{"region": f"Region {i}", "revenue": 1000 - i} for i in range(DEFAULT_ROW_LIMIT)]
+    assert engine.answer("top 5 by revenue", _parent(capped_rows)) is None
+    # Or its SQL carried its own row cap
+    limited = _parent()
+    limited.generated_sql = "SELECT region, product, revenue, margin FROM sales ORDER BY revenue DESC LIMIT 4"
+    assert engine.answer("just West", limited) is None
+    top = _parent()
+    top.generated_sql = "SELECT TOP 4 region, product, revenue, margin FROM sales"
+    assert engine.answer("just West", top) is None
+    # Uncapped SQL is answered locally
+    complete = _parent()
+    complete.generated_sql = "SELECT region, product, revenue, margin FROM sales"
+    assert engine.answer("just West", complete) is not None
+
+@pytest.mark.asyncio
+async def test_pipeline_answers_follow_up_without_llm_or_warehouse():
+    parent = _parent()
+    parent.id = "parent-id"
+    processor, generator, executor, narrator = AsyncMock(), AsyncMock(), AsyncMock(), AsyncMock()
+    pipeline = AnalysisPipeline(
+        query_processor=processor, sql_generator=generator,
+        query_executor=executor, narrative_generator=narrator, result_store=MagicMock(should_offload=lambda df: False)
+    )
+    data_source = MagicMock(id="source-a", schema_metadata={}, semantic_model=None)
+    parent.data_sources_used = ["source-a"]
+    db = MagicMock()
+    db.get.return_value = parent
+    db_query = Query(natural_language_query="only Widget", status=QueryStatus.PENDING, parent_query_id="parent-id")
+    
+    stages = [event.stage async for event in pipeline.stream(db, db_query, data_source)]
+    
+    assert stages == ["intent", "data", "stats", "narrative"]
+    processor.analyze_query.assert_not_called()
+    generator.generate_sql.assert_not_called()
+    executor.execute_query.assert_not_called()
+    narrator.generate_narrative.assert_not_called()
+    assert db_query.status == QueryStatus.COMPLETED
+    assert db_query.intent == "FOLLOW_UP"
+    assert [row["region"] for row in db_query.results["data"]] == ["East", "West"]
+    assert "follow_up" in db_query.stage_timings
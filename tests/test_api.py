@@ -1,6 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
+from app.core.config import settings
 from app.main import app
 from app.models.database import get_db
 from app.models.user import User, UserRole
@@ -43,7 +44,8 @@ app.dependency_overrides[get_db] = override_get_db
 
 @pytest.fixture(scope="module")
 def client():
-    with TestClient(app) as c:
+    # No background warm-up (it would reach the configured LLM provider)
+    with patch.object(settings, "WARMUP_ENABLED", False), TestClient(app) as c:
         yield c
 
 def test_health_check(client):
@@ -122,10 +124,277 @@ def test_list_data_sources(client):
     mock_ds.last_refreshed_at = None
     mock_ds.created_at = "2023-01-01T00:00:00"
     
-    mock_session.query.return_value.offset.return_value.limit.return_value.all.return_value = [mock_ds]
+    session = MagicMock()
+    session.query.return_value.options.return_value.order_by.return_value.limit.return_value.all.return_value = [mock_ds]
     
-    response = client.get("/api/v1/data_sources/")
+    def override():
+        yield session
+    
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override
+    try:
+        response = client.get("/api/v1/data_sources/")
+    finally:
+        app.dependency_overrides[get_db] = previous
     assert response.status_code == 200
     data = response.json()
     assert len(data) == 1
     assert data[0]["name"] == "Test DB"
+    assert "X-Next-Cursor" not in response.headers
+
+def test_stage_latency_percentiles(client):
+    # Two recent queries with stage breakdowns
+    session = MagicMock()
+    session.query.return_value.filter.return_value.order_by.return_value.limit.return_value.all.return_value = [
+        ({"intent": 10.0, "narrative": 900.0, "total": 1000},),
+        ({"intent": 30.0, "total": 40},)
+    ]
+    
+    def override():
+        yield session
+    
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override
+    try:
+        response = client.get("/api/v1/admin/stages?window_minutes=30")
+    finally:
+        app.dependency_overrides[get_db] = previous
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["queries"] == 2
+    assert data["stages"]["intent"]["count"] == 2
+    assert data["stages"]["intent"]["p50_ms"] == 20.0
+    assert data["stages"]["narrative"]["p99_ms"] == 900.0
+
+def test_list_queries_keyset_pagination(client, tmp_path):
+    # Real SQLite session so the (created_at, id) cursor predicate is exercised
+    import uuid
+    from datetime import datetime, timedelta
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.models.database import Base
+    from app.models.query import QueryStatus
+    
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2024, 1, 1)
+    for i in range(5):
+        session.add(Query(
+            id=uuid.uuid4(), user_id=uuid.uuid4(), natural_language_query=f"question {i}",
+            status=QueryStatus.COMPLETED, results={"data": [{"x": i}]}, created_at=start + timedelta(minutes=i)
+        ))
+    session.commit()
+    
+    def override():
+        yield session
+    
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override
+    try:
+        pages = []
+        cursor = None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            response = client.get("/api/v1/queries/", params=params)
+            assert response.status_code == 200
+            pages.append([q["natural_language_query"] for q in response.json()])
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        bad_cursor = client.get("/api/v1/queries/", params={"cursor": "not-a-cursor"})
+    finally:
+        app.dependency_overrides[get_db] = previous
+        session.close()
+    
+    assert pages == [["question 4", "question 3"], ["question 2", "question 1"], ["question 0"]]
+    assert "results" not in response.json()[0]
+    assert bad_cursor.status_code == 400
+
+def test_get_query_conditional_requests(client):
+    from app.models.query import QueryStatus
+    
+    session = MagicMock()
+    query = MagicMock(
+        id="q-1", natural_language_query="Total sales", generated_sql="SELECT 1", intent="DESCRIPTIVE",
+        results={"data": [{"region": "North", "sales": i} for i in range(200)], "narrative": {"summary": "ok"}},
+        status=QueryStatus.COMPLETED, execution_time_ms=12, error_message=None, progress=None, stage_timings=None,
+        parent_query_id=None
+    )
+    session.query.return_value.filter.return_value.first.return_value = query
+    
+    def override():
+        yield session
+    
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override
+    try:
+        first = client.get("/api/v1/queries/q-1", headers={"Accept-Encoding": "gzip"})
+        etag = first.headers["etag"]
+        not_modified = client.get("/api/v1/queries/q-1", headers={"If-None-Match": etag})
+        query.status = QueryStatus.PENDING
+        pending = client.get("/api/v1/queries/q-1", headers={"If-None-Match": etag})
+    finally:
+        app.dependency_overrides[get_db] = previous
+    
+    assert first.status_code == 200
+    assert first.headers["content-encoding"] == "gzip"
+    assert "immutable" in first.headers["cache-control"]
+    assert len(first.json()["results"]) == 200
+    
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    
+    # Status is part of the payload, so the old tag no longer matches
+    assert pending.status_code == 200
+    assert pending.headers["etag"] != etag
+    assert pending.headers["cache-control"] == "private, no-cache"
+
+def test_rendered_report_etag(client):
+    first = client.get("/api/v1/reports/r-1/render")
+    again = client.get("/api/v1/reports/r-1/render", headers={"If-None-Match": first.headers["etag"]})
+    
+    assert first.status_code == 200
+    assert first.headers["content-type"].startswith("text/html")
+    assert again.status_code == 304
+
+def test_rate_limit_buckets_and_headers(client):
+    from app.core.rate_limit import MemoryTokenBucketBackend, rate_limiter
+    
+    previous = rate_limiter._backend
+    rate_limiter.backend = MemoryTokenBucketBackend()
+    try:
+        with patch.object(settings, "RATE_LIMIT_PER_MINUTE", 6), \
+             patch.object(settings, "RATE_LIMIT_ANALYZE_PER_MINUTE", 60), \
+             patch.object(settings, "RATE_LIMIT_COST_ANALYZE", 5):
+            headers = {"Authorization": "Bearer token-a"}
+            first = client.get("/api/v1/reports/r-1/render", headers=headers)
+            # Analyze costs 5 of the remaining 5 tokens; rejected before the body is validated
+            analyze = client.post("/api/v1/queries/analyze", headers=headers, json={})
+            limited = client.get("/api/v1/reports/r-1/render", headers=headers)
+            other_token = client.get("/api/v1/reports/r-1/render", headers={"Authorization": "Bearer token-b"})
+            unlimited = client.get("/health", headers=headers)
+    finally:
+        rate_limiter.backend = previous
+    
+    assert first.status_code == 200
+    assert first.headers["x-ratelimit-limit"] == "6"
+    assert first.headers["x-ratelimit-remaining"] == "5"
+    assert analyze.status_code == 422
+    assert analyze.headers["x-ratelimit-remaining"] == "0"
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+    # Tokens are not verified yet, so a new one does not get the client a fresh bucket
+    assert other_token.status_code == 429
+    assert unlimited.status_code == 200
+
+def test_rate_limit_per_source_and_fail_open(client):
+    from unittest.mock import AsyncMock
+    from app.core.rate_limit import MemoryTokenBucketBackend, RateLimiter, _identity, rate_limiter
+    
+    limiter = RateLimiter(MemoryTokenBucketBackend())
+    with patch.object(settings, "RATE_LIMIT_COST_ANALYZE", 5), patch.object(settings, "RATE_LIMIT_PER_MINUTE", 100), \
+         patch.object(settings, "RATE_LIMIT_ANALYZE_PER_MINUTE", 60):
+        buckets = limiter.buckets("ip:a", "batch", ["ds-1", "ds-2", "ds-1"])
+        full_batch = limiter.buckets("ip:a", "batch", ["ds-1"] * 12)
+    assert [(b.key, b.cost) for b in buckets] == [
+        ("ratelimit:user:ip:a", 15), ("ratelimit:analyze:ip:a", 15),
+        ("ratelimit:source:ds-1", 10), ("ratelimit:source:ds-2", 5)
+    ]
+    # Batches pay per question, in full
+    assert [b.cost for b in full_batch] == [60, 60, 60]
+    
+    # Clients are told apart by address, not by the identity they claim
+    scope = {"type": "http", "headers": [(b"authorization", b"Bearer token-a")], "client": ("10.0.0.1", 5000)}
+    assert _identity(scope) == "ip:10.0.0.1"
+    assert _identity({**scope, "client": ("10.0.0.2", 5000)}) == "ip:10.0.0.2"
+    
+    previous = rate_limiter._backend
+    broken = AsyncMock()
+    broken.take.side_effect = ConnectionError("redis down")
+    rate_limiter.backend = broken
+    try:
+        first = client.get("/api/v1/reports/r-1/render")
+        second = client.get("/api/v1/reports/r-1/render")
+    finally:
+        rate_limiter.backend = previous
+    
+    assert first.status_code == 200 and second.status_code == 200
+    assert "x-ratelimit-limit" not in first.headers
+    # The failing backend is not retried on every request
+    assert broken.take.call_count == 1
+
+def test_rate_limit_batches_pay_as_much_as_single_calls(client):
+    from app.core.rate_limit import MemoryTokenBucketBackend, rate_limiter
+    
+    def batch(size):
+        # Rejected by validation after the limiter has charged it
+        return client.post("/api/v1/queries/analyze/batch", json={"queries": [{"data_source_id": "ds-1"}] * size})
+    
+    previous = rate_limiter._backend
+    with patch.object(settings, "RATE_LIMIT_COST_ANALYZE", 5), patch.object(settings, "RATE_LIMIT_PER_MINUTE", 100), \
+         patch.object(settings, "RATE_LIMIT_ANALYZE_PER_MINUTE", 60), \
+         patch.object(settings, "RATE_LIMIT_SOURCE_PER_MINUTE", 300):
+        try:
+            rate_limiter.backend = MemoryTokenBucketBackend()
+            oversized = batch(13)
+            first, second = batch(12), batch(12)
+            # The same 24 questions asked one at a time
+            rate_limiter.backend = MemoryTokenBucketBackend()
+            singles = [
+                client.post("/api/v1/queries/analyze", json={"data_source_id": "ds-1"}).status_code for _ in range(24)
+            ]
+        finally:
+            rate_limiter.backend = previous
+    
+    # 12 questions at 5 tokens fill the 60-token analyze bucket
+    assert oversized.status_code == 400
+    assert oversized.json()["detail"] == "At most 12 queries per batch"
+    assert first.status_code == 422
+    assert second.status_code == 429
+    assert singles.index(429) == 12
+
+def test_readiness_reported_separately_from_health(client):
+    from app.core.warmup import readiness
+    
+    previous = readiness.ready
+    try:
+        readiness.ready = False
+        warming = client.get("/ready")
+        assert warming.status_code == 503
+        assert warming.json()["status"] == "warming_up"
+        assert client.get("/health").status_code == 200
+        
+        readiness.mark_ready(12.0)
+        ready = client.get("/ready")
+        assert ready.status_code == 200
+        assert ready.json()["status"] == "ready"
+    finally:
+        readiness.ready = previous
+
+def test_profiling_only_with_admin_token(client, tmp_path):
+    import json
+    from app.core.profiling import PROFILE_ID_HEADER, profile_path
+    
+    with patch.object(settings, "PROFILING_TOKEN", "admin-secret"), \
+         patch.object(settings, "PROFILING_OUTPUT_DIR", str(tmp_path)):
+        plain = client.get("/api/v1/admin/intent/fast-path")
+        wrong = client.get("/api/v1/admin/intent/fast-path", headers={"X-Profile-Token": "guess"})
+        assert PROFILE_ID_HEADER not in plain.headers
+        assert PROFILE_ID_HEADER not in wrong.headers
+        
+        html = client.get("/api/v1/admin/intent/fast-path", headers={"X-Profile-Token": "admin-secret"})
+        assert html.status_code == 200
+        with open(profile_path(html.headers[PROFILE_ID_HEADER])) as f:
+            assert "<html" in f.read().lower()
+        
+        speedscope = client.get(
+            "/api/v1/admin/intent/fast-path",
+            params={"profile_token": "admin-secret", "profile_format": "speedscope"}
+        )
+        with open(profile_path(speedscope.headers[PROFILE_ID_HEADER], "speedscope")) as f:
+            assert "speedscope" in json.load(f)["$schema"]
+    
+    assert len(list(tmp_path.iterdir())) == 2
@@ -1,12 +1,19 @@
+import asyncio
 import pytest
+import uuid
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.core.config import settings
 from app.main import app
-from app.models.database import get_db
+from app.models.database import Base, get_db, get_async_db
 from app.models.user import User, UserRole
 from app.models.query import Query, QueryStatus
 from app.models.report import Report
-from app.models.data_source import DataSource
+from app.models.audit_log import AuditLog  # noqa: F401
+from app.models.data_source import DataSource, SourceType
 from app.models.report import Report
 
 # Mock DB Session
@@ -22,16 +29,64 @@ app.dependency_overrides[get_db] = override_get_db
 
 @pytest.fixture(scope="module")
 def client():
-    with TestClient(app) as c:
+    # No background warm-up (it would reach the configured LLM provider), and insight
+    # cache writes go through on each test's database instead of the default one
+    with patch.object(settings, "WARMUP_ENABLED", False), \
+         patch.object(settings, "INSIGHT_CACHE_WRITE_BEHIND_SECONDS", 0), TestClient(app) as c:
         yield c
 
-def test_full_query_flow(client):
+USER_ID = str(uuid.uuid4())
+
+@pytest.fixture
+def metadata_db(tmp_path):
+    """
+    SQLite metadata database served through the async session dependency.
+    Yields (async session factory, data source id).
+    """
+    url = f"sqlite:///{tmp_path / 'metadata.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(sync_engine)
+    data_source_id = uuid.uuid4()
+    with sync_engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(
+            id=uuid.UUID(USER_ID), email="analyst@example.com", hashed_password="x", role=UserRole.ANALYST
+        ))
+        conn.execute(DataSource.__table__.insert().values(
+            id=data_source_id, name="Sales DB", source_type=SourceType.POSTGRESQL,
+            connection_config={}, schema_metadata={}, created_by=uuid.UUID(USER_ID)
+        ))
+    sync_engine.dispose()
+    
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    
+    async def override():
+        async with session_factory() as db:
+            yield db
+    
+    app.dependency_overrides[get_async_db] = override
+    try:
+        yield session_factory, str(data_source_id)
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
+
+def _add_data_source(session_factory, name):
+    """Add another data source to the metadata database and return its id."""
+    async def add():
+        async with session_factory() as db:
+            data_source = DataSource(name=name, source_type=SourceType.POSTGRESQL, connection_config={},
+                                     schema_metadata={}, created_by=uuid.UUID(USER_ID))
+            db.add(data_source)
+            await db.commit()
+            return str(data_source.id)
+    return asyncio.run(add())
+
+def test_full_query_flow(client, metadata_db):
     """
     Scenario 1: Full Query Flow
     User logs in -> Submits Query -> SQL Generated -> Executed -> Narrative Created -> Result Returned.
     """
-    # 1. Mock Login (skip actual auth call, assume we have token or endpoint is open/mocked)
-    # For this test, we'll hit the analyze endpoint directly.
+    _, data_source_id = metadata_db
     
     # Mock dependencies
     with patch("app.services.analysis.query_processor.QueryProcessor.analyze_query") as mock_analyze, \
@@ -45,7 +100,9 @@ def test_full_query_flow(client):
             intent="DIAGNOSTIC",
             metrics=["sales"],
             dimensions=["region"],
-            filters={}
+            time_range=None,
+            filters={},
+            complexity="complex"
         )
         
         mock_gen_sql.return_value = {
@@ -65,32 +122,23 @@ def test_full_query_flow(client):
             "recommendations": ["Focus on West."]
         }
         
-        # Mock DB Query creation
-        mock_query = MagicMock()
-        mock_query.id = "query-123"
-        mock_query.status = QueryStatus.COMPLETED
-        mock_session.add.return_value = None
-        mock_session.commit.return_value = None
-        mock_session.refresh.return_value = None
-
-        # Mock DataSource retrieval
-        mock_data_source = MagicMock()
-        mock_data_source.id = "datasource-123"
-        mock_data_source.schema_metadata = {}
-        mock_session.query.return_value.filter.return_value.first.side_effect = lambda *args, **kwargs: mock_data_source if args and isinstance(args[0], type) and args[0].__name__ == "DataSource" else None
-        
         # Execute Request
         response = client.post(
             "/api/v1/queries/analyze",
-            json={"natural_language_query": "Compare sales by region", "data_source_id": "datasource-123"}
+            json={
+                "natural_language_query": "Compare sales by region",
+                "data_source_id": data_source_id,
+                "user_id": USER_ID
+            }
         )
         # Verify Response
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "completed"
         assert data["narrative"]["summary"] == "Sales are higher in the West."
-        # Ensure results contain expected keys
-        assert "data" in data["results"]
+        # Ensure results contain the returned rows
+        assert data["results"] == [{"region": "East", "sales": 100}, {"region": "West", "sales": 200}]
+        assert data["execution_time_ms"] is not None
 
 def test_report_generation_flow(client):
     """
@@ -122,3 +170,255 @@ def test_report_generation_flow(client):
         assert response.status_code == 200
         # Note: In a real async flow, we'd check status first, but here we mocked the generator to return immediately or we are testing the render endpoint which might just return the stored HTML. 
         # The mock implementation in reports.py might be simple.
+
+def test_async_query_flow(client, metadata_db):
+    """
+    Scenario 3: Asynchronous Query
+    User submits query -> Query queued as PENDING -> 202 returned before the pipeline runs.
+    """
+    _, data_source_id = metadata_db
+    
+    with patch("app.tasks.analysis_tasks.run_analysis.delay") as mock_delay, \
+         patch("app.services.analysis.pipeline.AnalysisPipeline.run") as mock_run:
+        response = client.post(
+            "/api/v1/queries/analyze",
+            json={
+                "natural_language_query": "Revenue by region",
+                "data_source_id": data_source_id,
+                "user_id": USER_ID,
+                "asynchronous": True
+            }
+        )
+    
+    assert response.status_code == 202
+    assert response.json()["status"] == "pending"
+    mock_delay.assert_called_once_with(response.json()["query_id"])
+    mock_run.assert_not_called()
+
+def test_streaming_query_flow(client, metadata_db):
+    """
+    Scenario 4: Streaming Query
+    User submits query -> Each pipeline stage is streamed as a server-sent event.
+    """
+    session_factory, data_source_id = metadata_db
+    
+    import pandas as pd
+    with patch("app.api.v1.endpoints.queries.AsyncSessionLocal", session_factory), \
+         patch("app.services.analysis.query_processor.QueryProcessor.analyze_query") as mock_analyze, \
+         patch("app.services.data.sql_generator.SQLGenerator.generate_sql") as mock_gen_sql, \
+         patch("app.services.data.executor.QueryExecutor.execute_query") as mock_exec, \
+         patch("app.services.analysis.narrative_generator.NarrativeGenerator.generate_narrative") as mock_narrative:
+        mock_analyze.return_value = MagicMock(intent="DESCRIPTIVE", metrics=["sales"], dimensions=["region"],
+                                              time_range=None, filters={}, complexity="simple")
+        mock_gen_sql.return_value = {"sql": "SELECT region, SUM(sales) FROM sales GROUP BY region", "can_answer": True}
+        mock_exec.return_value = pd.DataFrame({"region": ["East", "West"], "sales": [100, 200]})
+        mock_narrative.return_value = {"summary": "Sales are higher in the West."}
+        
+        response = client.post(
+            "/api/v1/queries/analyze/stream",
+            json={"natural_language_query": "Sales by region", "data_source_id": data_source_id, "user_id": USER_ID}
+        )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in response.headers
+    events = [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events == ["query", "intent", "sql", "data", "stats", "chart", "narrative", "complete"]
+
+def test_follow_up_answered_from_parent_results(client, metadata_db):
+    """
+    Scenario 6: Follow-up
+    Parent query completes -> follow-up refines its rows -> no second LLM or warehouse call.
+    """
+    session_factory, data_source_id = metadata_db
+    
+    import pandas as pd
+    with patch("app.services.analysis.query_processor.QueryProcessor.analyze_query") as mock_analyze, \
+         patch("app.services.data.sql_generator.SQLGenerator.generate_sql") as mock_gen_sql, \
+         patch("app.services.data.executor.QueryExecutor.execute_query") as mock_exec, \
+         patch("app.services.analysis.narrative_generator.NarrativeGenerator.generate_narrative") as mock_narrative:
+        mock_analyze.return_value = MagicMock(intent="COMPARATIVE", metrics=["sales"], dimensions=["region"],
+                                              time_range=None, filters={}, complexity="simple")
+        mock_gen_sql.return_value = {"sql": "SELECT region, SUM(sales) AS sales FROM sales GROUP BY region", "can_answer": True}
+        mock_exec.return_value = pd.DataFrame({"region": ["East", "West", "North"], "sales": [100, 200, 50]})
+        mock_narrative.return_value = {"summary": "West leads."}
+        
+        parent = client.post(
+            "/api/v1/queries/analyze",
+            json={"natural_language_query": "Sales by region", "data_source_id": data_source_id, "user_id": USER_ID}
+        ).json()
+        follow_up = client.post(
+            "/api/v1/queries/analyze",
+            json={"natural_language_query": "Exclude North, sort by sales", "data_source_id": data_source_id,
+                  "user_id": USER_ID, "parent_query_id": parent["query_id"]}
+        )
+        missing_parent = client.post(
+            "/api/v1/queries/analyze",
+            json={"natural_language_query": "Just West", "data_source_id": data_source_id,
+                  "user_id": USER_ID, "parent_query_id": str(uuid.uuid4())}
+        )
+        other_source = client.post(
+            "/api/v1/queries/analyze",
+            json={"natural_language_query": "Just West", "data_source_id": _add_data_source(session_factory, "Other DB"),
+                  "user_id": USER_ID, "parent_query_id": parent["query_id"]}
+        )
+    
+    assert follow_up.status_code == 200
+    data = follow_up.json()
+    assert data["status"] == "completed"
+    assert data["parent_query_id"] == parent["query_id"]
+    assert data["results"] == [{"region": "West", "sales": 200}, {"region": "East", "sales": 100}]
+    assert mock_analyze.call_count == 1
+    assert mock_exec.call_count == 1
+    assert mock_narrative.call_count == 1
+    assert missing_parent.status_code == 404
+    # The parent's rows came from another source; they cannot answer this one
+    assert other_source.status_code == 400
+
+def test_batch_query_flow(client, metadata_db):
+    """
+    Scenario 7: Batch
+    Several questions in one request -> identical SQL executed once -> per-item results in order.
+    """
+    _, data_source_id = metadata_db
+    
+    import pandas as pd
+    
+    def generate_sql(user_query, *args, **kwargs):
+        if "broken" in user_query:
+            raise RuntimeError("LLM unavailable")
+        return {"sql": "SELECT region, SUM(sales) AS sales FROM sales GROUP BY region", "can_answer": True}
+    
+    with patch("app.services.analysis.query_processor.QueryProcessor.analyze_query") as mock_analyze, \
+         patch("app.services.data.sql_generator.SQLGenerator.generate_sql", side_effect=generate_sql), \
+         patch("app.services.data.executor.QueryExecutor.execute_query") as mock_exec, \
+         patch("app.services.analysis.narrative_generator.NarrativeGenerator.generate_narrative") as mock_narrative:
+        mock_analyze.return_value = MagicMock(intent="COMPARATIVE", metrics=["sales"], dimensions=["region"],
+                                              time_range=None, filters={}, complexity="simple")
+        mock_exec.return_value = pd.DataFrame({"region": ["East", "West"], "sales": [100, 200]})
+        mock_narrative.return_value = {"summary": "West leads."}
+        
+        response = client.post("/api/v1/queries/analyze/batch", json={
+            "user_id": USER_ID,
+            "queries": [
+                {"natural_language_query": "Sales by region", "data_source_id": data_source_id},
+                {"natural_language_query": "Compare sales across regions", "data_source_id": data_source_id},
+                {"natural_language_query": "Sales by region", "data_source_id": str(uuid.uuid4())},
+                {"natural_language_query": "A broken question", "data_source_id": data_source_id}
+            ]
+        })
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["index"] for item in data["results"]] == [0, 1, 2, 3]
+    first, second, missing, broken = data["results"]
+    assert first["query"]["status"] == "completed" and first["error"] is None
+    assert second["query"]["results"] == [{"region": "East", "sales": 100}, {"region": "West", "sales": 200}]
+    assert missing == {"index": 2, "query": None, "error": "Data source not found"}
+    assert broken["query"]["status"] == "failed"
+    assert broken["error"] == "LLM unavailable"
+    assert mock_exec.call_count == 1
+    assert data["sql_executions"] == 1
+
+def test_large_results_are_paged_from_result_store(client, metadata_db, tmp_path):
+    """
+    Scenario 5: Large Results
+    Results above the threshold are offloaded -> response carries a results URL -> rows are paged.
+    """
+    _, data_source_id = metadata_db
+    
+    import pandas as pd
+    from app.api.deps import get_result_store
+    result_store = get_result_store()
+    from app.services.storage.blob_store import LocalBlobStore
+    
+    with patch.object(result_store, "_blob_store", LocalBlobStore(str(tmp_path / "results"))), \
+         patch.object(result_store, "threshold_bytes", 1), \
+         patch("app.services.analysis.query_processor.QueryProcessor.analyze_query") as mock_analyze, \
+         patch("app.services.data.sql_generator.SQLGenerator.generate_sql") as mock_gen_sql, \
+         patch("app.services.data.executor.QueryExecutor.execute_query") as mock_exec, \
+         patch("app.services.analysis.narrative_generator.NarrativeGenerator.generate_narrative") as mock_narrative:
+        mock_analyze.return_value = MagicMock(intent="DESCRIPTIVE", metrics=["sales"], dimensions=["order_id"],
+                                              time_range=None, filters={}, complexity="simple")
+        mock_gen_sql.return_value = {"sql": "SELECT order_id, sales FROM sales", "can_answer": True}
+        mock_exec.return_value = pd.DataFrame({"order_id": range(500), "sales": [i * 2 for i in range(500)]})
+        mock_narrative.return_value = {"summary": "Many orders."}
+        
+        response = client.post(
+            "/api/v1/queries/analyze",
+            json={"natural_language_query": "All orders", "data_source_id": data_source_id, "user_id": USER_ID}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["results"] is None
+        assert data["row_count"] == 500
+        
+        page = client.get(f"{data['results_url']}?offset=100&limit=3")
+        columnar = client.get(f"{data['results_url']}?offset=100&limit=3&format=columnar")
+        arrow = client.get(
+            f"{data['results_url']}?offset=100&limit=3",
+            headers={"Accept": "application/vnd.apache.arrow.stream"}
+        )
+    
+    assert page.status_code == 200
+    assert page.json()["rows"] == [{"order_id": i, "sales": i * 2} for i in range(100, 103)]
+    assert page.json()["row_count"] == 500
+    
+    assert columnar.status_code == 200
+    assert columnar.json()["columns"] == ["order_id", "sales"]
+    assert columnar.json()["data"] == [[100, 101, 102], [200, 202, 204]]
+    
+    import pyarrow as pa
+    assert arrow.status_code == 200
+    assert arrow.headers["x-row-count"] == "500"
+    table = pa.ipc.open_stream(arrow.content).read_all()
+    assert table.to_pydict() == {"order_id": [100, 101, 102], "sales": [200, 202, 204]}
+
+def test_repeated_question_served_from_insight_cache(client, metadata_db):
+    """
+    Scenario 8: Insight Cache
+    Question answered -> insight stored -> same question again is CACHED without LLM or warehouse calls.
+    """
+    session_factory, data_source_id = metadata_db
+    
+    import asyncio
+    from datetime import datetime, timedelta
+    import pandas as pd
+    from sqlalchemy import select
+    from app.api.deps import get_insight_store
+    from app.models.insight_cache import InsightCache
+    
+    with patch("app.services.analysis.query_processor.QueryProcessor.analyze_query") as mock_analyze, \
+         patch("app.services.data.sql_generator.SQLGenerator.generate_sql") as mock_gen_sql, \
+         patch("app.services.data.executor.QueryExecutor.execute_query") as mock_exec, \
+         patch("app.services.analysis.narrative_generator.NarrativeGenerator.generate_narrative") as mock_narrative:
+        mock_analyze.return_value = MagicMock(intent="DESCRIPTIVE", metrics=["sales"], dimensions=["region"],
+                                              time_range=None, filters={}, complexity="simple")
+        mock_gen_sql.return_value = {"sql": "SELECT region, SUM(sales) AS sales FROM sales GROUP BY region", "can_answer": True}
+        mock_exec.return_value = pd.DataFrame({"region": ["East", "West"], "sales": [100, 200]})
+        mock_narrative.return_value = {"summary": "West leads."}
+        
+        body = {"natural_language_query": "Sales by region", "data_source_id": data_source_id, "user_id": USER_ID}
+        first = client.post("/api/v1/queries/analyze", json=body).json()
+        # Normalized like the cache key: case and surrounding whitespace do not matter
+        second = client.post("/api/v1/queries/analyze", json={**body, "natural_language_query": " sales BY region "}).json()
+    
+    assert first["status"] == "completed"
+    assert second["status"] == "cached"
+    assert second["query_id"] != first["query_id"]
+    assert second["results"] == first["results"]
+    assert second["narrative"] == first["narrative"]
+    assert second["generated_sql"] == first["generated_sql"]
+    assert set(second["stage_timings"]) == {"cache_lookup", "total"}
+    assert mock_analyze.call_count == mock_exec.call_count == mock_narrative.call_count == 1
+    
+    async def load_entry():
+        async with session_factory() as db:
+            # The hit was answered from memory; its count reaches the table on the next flush
+            assert await get_insight_store().flush(db) == 1
+            return (await db.execute(select(InsightCache))).scalar_one()
+    entry = asyncio.run(load_entry())
+    assert entry.hit_count == 1
+    assert entry.computation_time_ms >= 0
+    expected_expiry = datetime.utcnow() + timedelta(seconds=settings.CACHE_TTL_SECONDS)
+    assert abs(entry.expires_at - expected_expiry) < timedelta(minutes=1)
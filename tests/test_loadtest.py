@@ -0,0 +1,25 @@
+from loadtest.runner import Sample, percentiles, summarize
+
+
+def test_summarize_reports_percentiles_errors_and_stages():
+    samples = [
+        Sample(kind="analyze", latency_ms=float(ms), status=200, stage_timings={"sql_generation": ms / 2, "total": ms})
+        for ms in range(100, 200)
+    ]
+    samples += [Sample(kind="alerts", latency_ms=5.0, status=200), Sample(kind="alerts", latency_ms=30_000.0, status=0)]
+
+    summary = summarize(samples, duration=10.0)
+
+    assert summary["requests"] == 102
+    analyze = summary["by_kind"]["analyze"]
+    assert analyze["throughput_rps"] == 10.0
+    assert analyze["error_rate"] == 0
+    assert analyze["latency_ms"]["p50"] == 149.5
+    assert analyze["latency_ms"]["max"] == 199.0
+    # Failed requests count as errors and are left out of latency
+    alerts = summary["by_kind"]["alerts"]
+    assert alerts["error_rate"] == 0.5
+    assert alerts["latency_ms"]["max"] == 5.0
+    assert "reports" not in summary["by_kind"]
+    assert summary["analyze_stages_ms"]["sql_generation"]["mean"] == 74.8
+    assert percentiles([]) == {"p50": None, "p90": None, "p95": None, "p99": None, "max": None}
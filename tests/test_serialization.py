@@ -0,0 +1,59 @@
+import datetime
+import decimal
+
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+
+from app.utils.serialization import (
+    arrow_to_columnar, arrow_to_ipc, dataframe_to_columnar, dumps, rows_to_columnar
+)
+
+
+def test_dataframe_to_columnar_handles_numpy_timestamps_and_decimals():
+    df = pd.DataFrame({
+        "region": ["North", "South"],
+        "units": np.array([3, 4], dtype=np.int64),
+        "revenue": [1.5, np.nan],
+        "day": pd.to_datetime(["2024-01-01", None]),
+        "price": [decimal.Decimal("9.99"), decimal.Decimal("1.25")]
+    })
+
+    payload = orjson.loads(dumps(dataframe_to_columnar(df)))
+
+    assert payload["columns"] == ["region", "units", "revenue", "day", "price"]
+    assert payload["row_count"] == 2
+    assert payload["data"] == [
+        ["North", "South"],
+        [3, 4],
+        [1.5, None],
+        ["2024-01-01T00:00:00", None],
+        [9.99, 1.25]
+    ]
+
+
+def test_arrow_and_dataframe_payloads_match():
+    df = pd.DataFrame({"id": range(5), "score": [0.5 * i for i in range(5)], "day": [datetime.date(2024, 1, i + 1) for i in range(5)]})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    from_arrow = orjson.loads(dumps(arrow_to_columnar(table)))
+
+    assert from_arrow["columns"] == ["id", "score", "day"]
+    assert from_arrow["data"][:2] == [list(range(5)), [0.5 * i for i in range(5)]]
+    assert from_arrow["data"][2][0] == "2024-01-01"
+    assert pa.ipc.open_stream(arrow_to_ipc(table)).read_all().equals(table)
+
+
+def test_columnar_payload_is_smaller_than_rows_for_large_results():
+    df = pd.DataFrame({
+        "order_id": np.arange(10_000),
+        "region": np.where(np.arange(10_000) % 2, "North", "South"),
+        "revenue": np.arange(10_000) * 1.25
+    })
+    rows = df.to_dict(orient="records")
+
+    columnar = dumps(dataframe_to_columnar(df))
+
+    assert len(columnar) < len(dumps(rows)) * 0.6
+    assert orjson.loads(columnar) == orjson.loads(dumps(rows_to_columnar(rows)))
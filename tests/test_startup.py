@@ -0,0 +1,129 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import uuid
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.warmup import STEP_OK, readiness, warm_up
+from app.models.database import Base
+# Register every model so relationships resolve, as importing the API does
+from app.models import alert, alert_execution, audit_log, insight_cache, query, report, report_version  # noqa: F401
+from app.models.data_source import DataSource, SourceType
+from app.models.user import User, UserRole
+from app.services.data.executor import QueryExecutor
+from app.services.data.sql_generator import SQLGenerator
+from app.services.llm.router import ModelRouter
+from app.utils.encryption import EncryptionService
+
+# Cumulative import time budget for app.main, measured with `python -X importtime`
+IMPORT_TIME_BUDGET_SECONDS = 4.0
+
+# Modules that must only be loaded when a request or task first needs them
+DEFERRED_MODULES = ("pandas", "numpy", "scipy", "plotly", "pyarrow", "openai", "anthropic", "celery", "pyinstrument")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_in_subprocess(module: str):
+    """Import a module in a fresh interpreter; return (cumulative microseconds, deferred modules loaded)."""
+    script = (
+        f"import sys, json, {module}; "
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    cumulative = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        # "import time: self [us] | cumulative | imported package"
+        _, cumulative_us, name = line.split("|")
+        if name.strip() == module:
+            cumulative = int(cumulative_us)
+    return cumulative, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_api_import_defers_heavy_modules_and_stays_within_budget():
+    cumulative_us, loaded = _import_in_subprocess("app.main")
+
+    assert loaded == []
+    assert cumulative_us is not None
+    assert cumulative_us / 1e6 < IMPORT_TIME_BUDGET_SECONDS
+
+
+def test_api_import_registers_every_model():
+    # Test modules import all models themselves, which would hide a missing registration
+    script = "import app.main; from sqlalchemy.orm import configure_mappers; configure_mappers()"
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, env=os.environ.copy(), capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+def test_worker_tasks_import_without_analysis_stack():
+    _, loaded = _import_in_subprocess("app.tasks.analysis_tasks")
+
+    # The worker needs Celery itself, but nothing from the analysis stack until a task runs
+    assert [m for m in loaded if m != "celery"] == []
+
+
+@pytest.mark.asyncio
+async def test_warm_up_prepares_sources_and_marks_ready(tmp_path):
+    warehouse = tmp_path / "warehouse.db"
+    sqlite3.connect(warehouse).close()
+
+    url = f"sqlite:///{tmp_path / 'metadata.db'}"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(sync_engine)
+    user_id = uuid.uuid4()
+    with sync_engine.begin() as conn:
+        conn.execute(User.__table__.insert().values(
+            id=user_id, email="ops@example.com", hashed_password="x", role=UserRole.ADMIN
+        ))
+        conn.execute(DataSource.__table__.insert().values(
+            id=uuid.uuid4(), name="Warehouse", source_type=SourceType.POSTGRESQL,
+            connection_config={"encrypted": EncryptionService().encrypt(f"sqlite:///{warehouse}")},
+            schema_metadata={"sales": {"columns": [{"name": "revenue", "type": "float"}]}},
+            created_by=user_id
+        ))
+        conn.execute(DataSource.__table__.insert().values(
+            id=uuid.uuid4(), name="Uploads", source_type=SourceType.CSV,
+            connection_config={}, schema_metadata={}, created_by=user_id
+        ))
+    sync_engine.dispose()
+
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"), poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    readiness.reset()
+    try:
+        with patch.object(ModelRouter, "warm_up", new_callable=AsyncMock) as llm_warm_up:
+            await warm_up(session_factory)
+
+        assert readiness.ready
+        steps = readiness.snapshot()["steps"]
+        assert {name: step["status"] for name, step in steps.items()} == {
+            "services": STEP_OK, "templates": STEP_OK, "metadata_db": STEP_OK,
+            "schema_prompts": STEP_OK, "engines": STEP_OK, "llm": STEP_OK
+        }
+        # Only the SQL source gets an engine; the CSV source has no schema to format
+        assert steps["engines"]["detail"] == "1 prepared"
+        assert steps["schema_prompts"]["detail"] == "1 prepared"
+        assert f"sqlite:///{warehouse}" in QueryExecutor._engines
+        assert any("Table: sales" in prompt for prompt in SQLGenerator._schema_cache.values())
+        llm_warm_up.assert_awaited()
+    finally:
+        readiness.reset()
+        QueryExecutor.dispose_engines()
+        await async_engine.dispose()
@@ -0,0 +1,290 @@
+import asyncio
+import io
+import uuid
+from datetime import datetime, timedelta
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from app.models.insight_cache import InsightCache
+from app.services.storage.blob_store import LocalBlobStore, S3BlobStore
+from app.services.storage.insight_store import (
+    Insight, InsightCacheStats, InsightStore, MemoryInsightTier, RedisInsightTier
+)
+from app.services.storage.result_store import ResultStore
+
+
+class LocalS3Client:
+    """In-memory stand-in for a boto3 S3 client (put/head/get with Range/delete)."""
+    
+    def __init__(self):
+        self.objects = {}
+        self.bytes_served = 0
+    
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = bytes(Body)
+    
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+    
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[(Bucket, Key)]
+        if Range:
+            start, end = Range[len("bytes="):].split("-")
+            data = data[int(start):int(end) + 1]
+        self.bytes_served += len(data)
+        return {"Body": io.BytesIO(data)}
+    
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+class LocalRedisClient:
+    """In-memory stand-in for a redis.asyncio client (get/set with px and nx, exists, lock release script)."""
+    
+    def __init__(self):
+        self.values = {}
+        self.ttls_ms = {}
+    
+    async def get(self, key):
+        return self.values.get(key)
+    
+    async def set(self, key, value, px=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        self.ttls_ms[key] = px
+        return True
+    
+    async def exists(self, key):
+        return int(key in self.values)
+    
+    async def eval(self, script, numkeys, key, token):
+        # Only RELEASE_LOCK_SCRIPT is evaluated: delete the key if it holds the token
+        if self.values.get(key) != token:
+            return 0
+        del self.values[key]
+        return 1
+
+
+class BrokenRedisClient:
+    async def get(self, key):
+        raise ConnectionError("redis is down")
+    
+    async def set(self, key, value, px=None):
+        raise ConnectionError("redis is down")
+
+
+def make_results(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "order_id": range(rows),
+        "region": [f"region-{i % 7}" for i in range(rows)],
+        "revenue": [i * 1.5 for i in range(rows)]
+    })
+
+def test_local_result_store_reads_row_ranges(tmp_path):
+    """Pages that span row groups come back in order with the right rows."""
+    store = ResultStore(blob_store=LocalBlobStore(str(tmp_path)), threshold_bytes=1, row_group_size=100)
+    df = make_results(1000)
+    
+    assert store.should_offload(df)
+    pointer = store.save("query-1", df)
+    
+    assert pointer["row_count"] == 1000
+    assert pointer["format"] == "parquet"
+    assert [c["name"] for c in pointer["schema"]] == ["order_id", "region", "revenue"]
+    
+    rows = store.read_rows(pointer, offset=250, limit=100)
+    assert [r["order_id"] for r in rows] == list(range(250, 350))
+    assert rows[0] == {"order_id": 250, "region": "region-5", "revenue": 375.0}
+    assert store.read_rows(pointer, offset=990, limit=100)[-1]["order_id"] == 999
+    assert store.read_rows(pointer, offset=1000, limit=10) == []
+
+def test_small_results_stay_inline(tmp_path):
+    store = ResultStore(blob_store=LocalBlobStore(str(tmp_path)), threshold_bytes=1_000_000)
+    
+    assert not store.should_offload(make_results(10))
+
+def test_s3_result_store_uses_range_reads():
+    """Reading one page from S3 fetches only part of the object."""
+    client = LocalS3Client()
+    store = ResultStore(blob_store=S3BlobStore("results", prefix="test", client=client), threshold_bytes=1, row_group_size=10000)
+    pointer = store.save("query-2", make_results(200000))
+    total_size = pointer["size_bytes"]
+    
+    rows = store.read_rows(pointer, offset=150000, limit=10)
+    
+    assert [r["order_id"] for r in rows] == list(range(150000, 150010))
+    assert client.bytes_served < total_size / 2
+    assert ("results", "test/results/query-2.parquet") in client.objects
+
+def test_local_blob_store_rejects_escaping_keys(tmp_path):
+    with pytest.raises(ValueError):
+        LocalBlobStore(str(tmp_path)).put("../outside.bin", b"data")
+
+
+@pytest.fixture
+def insight_db(tmp_path):
+    """Synchronous session factory on a SQLite insight_cache table."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'insights.db'}")
+    InsightCache.__table__.create(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def _put(store, db, key, summary="West leads.", stale_seconds=0):
+    return asyncio.run(_put_async(store, db, key, summary, stale_seconds))
+
+async def _put_async(store, db, key, summary="West leads.", stale_seconds=0):
+    data_source = type("Source", (), {"id": uuid.uuid4()})()
+    payload = {"generated_sql": "SELECT 1", "results": {"narrative": {"summary": summary}}}
+    return await store.put(db, key, "Sales by region", data_source, payload, computation_time_ms=1200,
+                           stale_seconds=stale_seconds)
+
+def test_insight_store_reads_through_tiers(insight_db):
+    redis = RedisInsightTier(client=LocalRedisClient())
+    stats = InsightCacheStats()
+    with insight_db() as db:
+        writer = InsightStore(ttl_seconds=600, memory=MemoryInsightTier(), redis=redis, stats=stats)
+        insight = _put(writer, db, "key-1")
+        
+        # Another worker: empty memory, shared Redis
+        worker = InsightStore(ttl_seconds=600, memory=MemoryInsightTier(), redis=redis, stats=stats)
+        assert asyncio.run(worker.get(db, "key-1")).payload == insight.payload
+        assert worker.memory.get("key-1") is not None
+        asyncio.run(worker.get(db, "key-1"))
+        # Redis unavailable to this one: read from the table and promoted to memory
+        cold = InsightStore(ttl_seconds=600, memory=MemoryInsightTier(), redis=None, stats=stats)
+        assert asyncio.run(cold.get(db, "key-1")).results == insight.results
+        assert cold.memory.get("key-1") is not None
+        assert asyncio.run(cold.get(db, "missing")) is None
+        
+        for store in (worker, cold):
+            asyncio.run(store.flush(db))
+        row = db.execute(select(InsightCache)).scalar_one()
+    
+    # Every tier carries the expiry of the original write
+    remaining_ms = redis.client.ttls_ms["insight:key-1"]
+    assert 590_000 < remaining_ms <= 600_000
+    assert row.expires_at == insight.expires_at
+    assert row.computation_time_ms == 1200
+    assert row.hit_count == 3
+    snapshot = stats.snapshot()
+    assert (snapshot["lookups"], snapshot["hits"], snapshot["misses"], snapshot["writes"]) == (4, 3, 1, 1)
+    assert {tier: counts["hits"] for tier, counts in snapshot["tiers"].items()} == {"memory": 1, "redis": 1, "database": 1}
+    assert snapshot["tiers"]["database"]["local_hit_ratio"] == 0.5
+
+def test_insight_store_write_behind_and_redis_fail_open(insight_db):
+    store = InsightStore(ttl_seconds=600, memory=MemoryInsightTier(), redis=RedisInsightTier(client=BrokenRedisClient()),
+                         stats=InsightCacheStats())
+    store.write_behind = True
+    with insight_db() as db:
+        _put(store, db, "key-1", "first")
+        _put(store, db, "key-1", "second")
+        assert db.execute(select(InsightCache)).first() is None
+        assert asyncio.run(store.get(db, "key-1")).results["narrative"]["summary"] == "second"
+        
+        # One upsert for the two writes, one hit count update
+        assert asyncio.run(store.flush(db)) == 2
+        row = db.execute(select(InsightCache)).scalar_one()
+    
+    assert row.result_data["results"]["narrative"]["summary"] == "second"
+    assert row.hit_count == 1
+    assert not store.redis.available
+    assert store.snapshot()["write_behind"] == {"enabled": True, "pending_writes": 0, "pending_hit_counts": 0}
+
+def test_insight_store_upserts_on_other_dialects(insight_db, monkeypatch):
+    """Dialects without ON CONFLICT update the row, or insert it when there is none."""
+    store = InsightStore(ttl_seconds=600, memory=MemoryInsightTier(), redis=None, stats=InsightCacheStats())
+    with insight_db() as db:
+        monkeypatch.setattr(db.get_bind().dialect, "name", "mssql")
+        first = _put(store, db, "key-1", "first")
+        asyncio.run(store.get(db, "key-1"))
+        _put(store, db, "key-1", "second")
+        row = db.execute(select(InsightCache)).scalar_one()
+    
+    assert row.result_data["results"]["narrative"]["summary"] == "second"
+    assert row.created_at == first.expires_at - timedelta(seconds=600)
+    assert row.hit_count == 1
+
+def test_memory_insight_tier_evicts_by_size_and_expiry():
+    tier = MemoryInsightTier(max_bytes=250, max_entries=10)
+    future = datetime.utcnow() + timedelta(minutes=5)
+    for key in ("a", "b", "c"):
+        tier.put(Insight(key, {}, 0, future, size_bytes=100))
+    
+    assert tier.get("a") is None
+    assert tier.get("b") is not None
+    tier.put(Insight("d", {}, 0, future, size_bytes=100))
+    # "b" was read more recently than "c"
+    assert tier.get("c") is None and tier.get("b") is not None
+    assert tier.size_bytes == 200
+    
+    tier.put(Insight("huge", {}, 0, future, size_bytes=1000))
+    tier.put(Insight("stale", {}, 0, datetime.utcnow() - timedelta(seconds=1), size_bytes=10))
+    assert tier.get("huge") is None and tier.get("stale") is None
+    assert len(tier) == 2
+
+def test_insight_store_serves_stale_entries_and_refreshes_early(insight_db, monkeypatch):
+    redis = RedisInsightTier(client=LocalRedisClient())
+    stats = InsightCacheStats()
+    with insight_db() as db:
+        # Expires as soon as it is written; served stale for 300s more
+        store = InsightStore(ttl_seconds=0, memory=MemoryInsightTier(), redis=redis, stats=stats)
+        insight = _put(store, db, "key-1", stale_seconds=300)
+        
+        assert asyncio.run(store.get(db, "key-1")) is None
+        stale = asyncio.run(store.get(db, "key-1", stale_seconds=300))
+        assert stale.stale and not stale.expired
+        assert store.should_refresh(stale)
+        
+        # The table keeps the TTL; the stale window is applied when it is read
+        cold = InsightStore(ttl_seconds=0, memory=MemoryInsightTier(), redis=None, stats=stats)
+        from_table = asyncio.run(cold.get(db, "key-1", stale_seconds=300))
+        assert from_table.stale and from_table.stale_until == insight.expires_at + timedelta(seconds=300)
+        assert asyncio.run(cold.get(db, "key-1")) is None
+    
+    assert 290_000 < redis.client.ttls_ms["insight:key-1"] <= 300_000
+    snapshot = stats.snapshot()
+    assert (snapshot["lookups"], snapshot["hits"], snapshot["stale_hits"]) == (4, 2, 2)
+    
+    # Fresh entries: the slower to compute, the earlier they are refreshed
+    monkeypatch.setattr("app.services.storage.insight_store.random.random", lambda: 0.5)
+    expires_at = datetime.utcnow() + timedelta(seconds=10)
+    assert store.should_refresh(Insight("slow", {}, 60_000, expires_at))
+    assert not store.should_refresh(Insight("fast", {}, 1_000, expires_at))
+    store.early_refresh_beta = 0
+    assert not store.should_refresh(Insight("slow", {}, 60_000, expires_at))
+
+def test_insight_store_recompute_lock_is_single_flight(insight_db):
+    client = LocalRedisClient()
+    with insight_db() as db:
+        worker_a, worker_b = (
+            InsightStore(ttl_seconds=600, memory=MemoryInsightTier(), redis=RedisInsightTier(client=client),
+                         stats=InsightCacheStats(), lock_seconds=5)
+            for _ in range(2)
+        )
+        
+        async def scenario():
+            assert await worker_a.acquire("key-1")
+            assert not await worker_a.acquire("key-1")
+            assert not await worker_b.acquire("key-1")
+            waiter = asyncio.create_task(worker_b.wait_for(db, "key-1"))
+            await asyncio.sleep(0.1)
+            assert not waiter.done()
+            
+            insight = await _put_async(worker_a, db, "key-1")
+            await worker_a.release("key-1")
+            assert (await waiter).payload == insight.payload
+            
+            # Released: the next recompute can start, and only its holder can release it
+            assert await worker_b.acquire("key-1")
+            await worker_a.release("key-1")
+            assert "insight-lock:key-1" in client.values
+            await worker_b.release("key-1")
+            assert "insight-lock:key-1" not in client.values
+            # Nobody recomputing: waiters give up at once
+            assert await worker_b.wait_for(db, "key-2") is None
+        
+        asyncio.run(scenario())
+    
+    assert worker_b.stats.snapshot()["lock_waits"] == 2
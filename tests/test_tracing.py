@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.core.tracing import load_traces
+from app.models import alert, alert_execution, audit_log, insight_cache, report, report_version  # noqa: F401
+from app.models.data_source import DataSource, SourceType
+from app.models.database import Base
+from app.models.query import Query, QueryStatus
+from app.models.user import User, UserRole
+from app.services.analysis.narrative_generator import NarrativeGenerator
+from app.services.analysis.pipeline import AnalysisPipeline
+from app.services.analysis.query_processor import QueryProcessor
+from app.services.data.executor import QueryExecutor
+from app.services.data.sql_generator import SQLGenerator
+from app.services.llm.fake_service import FAKE_FIXTURE_SCHEMA, FakeLLMService
+from app.services.llm.router import ModelRouter
+from app.utils.encryption import EncryptionService
+from loadtest.fixtures import build_warehouse
+from loadtest.replay import replay_trace
+
+
+def _record(tmp_path, question):
+    """Run one analyze with recording on and return the trace it wrote."""
+    warehouse = tmp_path / "warehouse.db"
+    build_warehouse(str(warehouse), rows=500)
+    engine = create_engine(f"sqlite:///{tmp_path / 'metadata.db'}")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+    user = User(id=uuid.uuid4(), email="trace@example.com", hashed_password="x", role=UserRole.ANALYST)
+    data_source = DataSource(
+        id=uuid.uuid4(), name="Traced warehouse", source_type=SourceType.POSTGRESQL,
+        connection_config={"encrypted": EncryptionService().encrypt(f"sqlite:///{warehouse}")},
+        schema_metadata=FAKE_FIXTURE_SCHEMA, created_by=user.id
+    )
+    llm = FakeLLMService()
+    services = [QueryProcessor(), SQLGenerator(), NarrativeGenerator()]
+    for service in services:
+        service.llm = ModelRouter(fast=llm, strong=llm)
+    pipeline = AnalysisPipeline(*services[:2], query_executor=QueryExecutor(), narrative_generator=services[2])
+
+    with Session() as db:
+        db.add_all([user, data_source])
+        db_query = Query(user_id=user.id, natural_language_query=question, status=QueryStatus.PENDING)
+        db.add(db_query)
+        db.commit()
+        with patch.object(settings, "TRACE_RECORDING_ENABLED", True), \
+                patch.object(settings, "TRACE_DIR", str(tmp_path / "traces")):
+            asyncio.run(pipeline.run(db, db_query, data_source))
+    engine.dispose()
+
+    traces = list(load_traces([str(tmp_path / "traces")]))
+    assert len(traces) == 1
+    return traces[0]
+
+
+def test_recorded_trace_replays_offline(tmp_path):
+    trace = _record(tmp_path, "Why did revenue drop by region?")
+
+    assert trace["status"] == "completed"
+    assert "FROM sales" in trace["sql"]
+    assert trace["result"]["row_count"] == 5
+    assert {c["name"] for c in trace["result"]["columns"]} == {"region", "total_revenue"}
+    assert [call["route"] for call in trace["llm_calls"]] == ["intent", "sql", "narrative"]
+    assert trace["llm_calls"][1]["response"]["sql"] == trace["sql"]
+    assert "execution" in trace["stage_timings"]
+
+    result = replay_trace(trace, str(tmp_path / "replay"), repeat=2)
+
+    assert [run["status"] for run in result["runs"]] == ["completed", "completed"]
+    # Intent and SQL prompts match exactly; the narrative prompt embeds replayed data
+    assert [run["llm_mismatches"] for run in result["runs"]] == [1, 1]
+    assert {"sql_generation", "execution", "narrative", "total"} <= set(result["stage_timings_ms"])